@@ -0,0 +1,297 @@
+import os
+import threading
+import time
+
+from .database import get_pool
+from .query import in_list
+from .user import User
+from . import upload_store
+
+
+# Background runner for admin bulk deletes.
+#
+# Deleting all posts or a busy user used to run every DELETE in the admin's
+# request, holding the SQLite write lock (and stalling every other writer)
+# for as long as the cascade took. Here the request only records a job in
+# `admin_jobs`; a runner thread deletes in chunks of ADMIN_JOB_CHUNK rows,
+# each in its own short transaction that also updates the job's progress,
+# and collects the uploads the chunk released, so the files go with the rows.
+#
+# Jobs are claimed with a lease like the news feeds: if the process running
+# one dies, another runner takes it over once the lease expires. Every step
+# deletes "whatever still matches", so a job resumed halfway just carries on.
+CHUNK = int(os.environ.get("ADMIN_JOB_CHUNK") or 500)
+LEASE_SECONDS = 120
+POLL_SECONDS = 30
+
+ADMIN_JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS admin_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    target_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'done', 'error')),
+    step TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    files_removed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT (datetime('now')),
+    finished_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_admin_jobs_open ON admin_jobs(status, id) WHERE status IN ('queued', 'running');
+"""
+
+KINDS = ("delete_all_posts", "delete_user")
+
+
+class _Job:
+    """A claimed job: chunked deletes that report progress and keep the lease alive."""
+
+    def __init__(self, db, static_folder, row):
+        self.db = db
+        self.static_folder = static_folder
+        self.id = row["id"]
+        self.target_id = row["target_id"]
+
+    def _begin(self):
+        if self.db.in_transaction:
+            self.db.commit()
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def _progress(self, step, rows):
+        self.db.execute(
+            "UPDATE admin_jobs SET step = ?, done = done + ?, lease_until = ? WHERE id = ?",
+            (step, rows, time.time() + LEASE_SECONDS, self.id),
+        )
+
+    def transaction(self, step, fn):
+        """Run fn() -> rows deleted in one short write transaction that also records progress."""
+        self._begin()
+        try:
+            rows = fn()
+            self._progress(step, rows)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return rows
+
+    def delete_rows(self, step, table, where, params=()):
+        """DELETE FROM table WHERE where, CHUNK rows per transaction."""
+        sql = f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)"
+        while self.transaction(step, lambda: self.db.execute(sql, (*params, CHUNK)).rowcount):
+            pass
+
+    def delete_posts(self, where, params=()):
+        """Delete matching posts a chunk at a time, their likes and comments first, then their files."""
+        while True:
+            ids = [r[0] for r in self.db.execute(
+                f"SELECT id FROM posts WHERE {where} ORDER BY id LIMIT ?", (*params, CHUNK)
+            ).fetchall()]
+            if self.db.in_transaction:
+                self.db.commit()
+            if not ids:
+                return
+            chunk = in_list(ids)
+            self.delete_rows("likes", "likes", "post_id IN (SELECT value FROM json_each(?))", (chunk,))
+            self.delete_rows("comments", "comments", "post_id IN (SELECT value FROM json_each(?))", (chunk,))
+            self.transaction("posts", lambda: self.db.execute(
+                "DELETE FROM posts WHERE id IN (SELECT value FROM json_each(?))", (chunk,)
+            ).rowcount)
+            self.collect()
+
+    def collect(self):
+        removed = upload_store.collect(self.db, self.static_folder)
+        if removed:
+            self.db.execute("UPDATE admin_jobs SET files_removed = files_removed + ? WHERE id = ?", (removed, self.id))
+            self.db.commit()
+
+    def set_total(self, total):
+        self.db.execute("UPDATE admin_jobs SET total = MAX(total, ?) WHERE id = ?", (total, self.id))
+        self.db.commit()
+
+    def _count(self, sql, *params):
+        return self.db.execute(sql, params).fetchone()[0]
+
+    def run_delete_all_posts(self):
+        self.set_total(
+            self._count("SELECT COUNT(*) FROM posts")
+            + self._count("SELECT COUNT(*) FROM likes")
+            + self._count("SELECT COUNT(*) FROM comments")
+        )
+        self.delete_posts("1")
+        # Rows left without a post by earlier versions of this route
+        self.delete_rows("comments", "comments", "post_id NOT IN (SELECT id FROM posts)")
+        self.delete_rows("likes", "likes", "post_id NOT IN (SELECT id FROM posts)")
+
+    def run_delete_user(self):
+        uid = self.target_id
+        self.set_total(
+            self._count("SELECT COUNT(*) FROM comments WHERE author_id = ?", uid)
+            + self._count("SELECT COUNT(*) FROM likes WHERE user_id = ?", uid)
+            + self._count("SELECT COUNT(*) FROM follows WHERE follower_id = ? OR followed_id = ?", uid, uid)
+            + self._count("SELECT COUNT(*) FROM chat_messages WHERE user_id = ?", uid)
+            + self._count("SELECT COUNT(*) FROM posts WHERE author_id = ?", uid)
+            + self._count(
+                "SELECT COUNT(*) FROM likes WHERE post_id IN (SELECT id FROM posts WHERE author_id = ?)", uid)
+            + self._count(
+                "SELECT COUNT(*) FROM comments WHERE post_id IN (SELECT id FROM posts WHERE author_id = ?)", uid)
+            + 1
+        )
+        # Rows the users foreign keys would otherwise cascade (or null out) in one go
+        self.delete_rows("comments", "comments", "author_id = ?", (uid,))
+        self.delete_rows("likes", "likes", "user_id = ?", (uid,))
+        self.delete_rows("follows", "follows", "follower_id = ?", (uid,))
+        self.delete_rows("follows", "follows", "followed_id = ?", (uid,))
+        self.delete_rows("chat", "chat_messages", "user_id = ?", (uid,))
+        self.delete_rows("chat", "chat_archive", "user_id = ?", (uid,))
+        # posts.author_id has no foreign key: the user row is what lets a failed
+        # job be submitted again, so it goes last
+        self.delete_posts("author_id = ?", (uid,))
+
+        def delete_user():
+            # Anything created since the passes above is small; take it with the user row
+            self.db.execute("DELETE FROM posts WHERE author_id = ?", (uid,))
+            self.db.execute("DELETE FROM comments WHERE author_id = ?", (uid,))
+            return self.db.execute("DELETE FROM users WHERE id = ?", (uid,)).rowcount
+        self.transaction("user", delete_user)
+        User.invalidate(uid)
+        self.collect()
+
+    def run(self, kind):
+        getattr(self, f"run_{kind}")()
+
+
+def submit(db, kind, target_id=None):
+    """Queue a job, or return the unfinished one for the same kind and target. Returns its record."""
+    if kind not in KINDS:
+        raise ValueError(f"unknown job kind {kind!r}")
+    row = db.execute(
+        """
+        SELECT id FROM admin_jobs
+        WHERE kind = ? AND target_id IS ? AND status IN ('queued', 'running')
+        """,
+        (kind, target_id),
+    ).fetchone()
+    if row is None:
+        job_id = db.execute("INSERT INTO admin_jobs(kind, target_id) VALUES (?, ?)", (kind, target_id)).lastrowid
+        db.commit()
+    else:
+        job_id = row[0]
+    _wake.set()
+    return get(db, job_id)
+
+
+def retry(db, job_id):
+    """Queue a failed job again; it resumes where it stopped. Returns its record, or None if it did not fail."""
+    cur = db.execute(
+        "UPDATE admin_jobs SET status = 'queued', error = NULL, finished_at = NULL WHERE id = ? AND status = 'error'",
+        (job_id,),
+    )
+    db.commit()
+    if not cur.rowcount:
+        return None
+    _wake.set()
+    return get(db, job_id)
+
+
+def retry_failed(db):
+    """Queue every failed job again. Returns how many."""
+    cur = db.execute("UPDATE admin_jobs SET status = 'queued', error = NULL, finished_at = NULL WHERE status = 'error'")
+    db.commit()
+    return cur.rowcount
+
+
+def get(db, job_id):
+    row = db.execute(
+        """
+        SELECT id, kind, target_id, status, step, total, done, files_removed, error, created_at, finished_at
+        FROM admin_jobs WHERE id = ?
+        """,
+        (job_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def recent(db, limit=10):
+    rows = db.execute("SELECT id FROM admin_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [get(db, r[0]) for r in rows]
+
+
+def _claim(db):
+    """Lease the oldest queued job, or a running one whose runner stopped renewing it."""
+    now = time.time()
+    row = db.execute(
+        """
+        UPDATE admin_jobs SET status = 'running', lease_until = ?
+        WHERE id = (
+            SELECT id FROM admin_jobs
+            WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+            ORDER BY id LIMIT 1
+        )
+        RETURNING id, kind, target_id
+        """,
+        (now + LEASE_SECONDS, now),
+    ).fetchall()
+    db.commit()
+    return row[0] if row else None
+
+
+def _finish(db, job_id, error=None):
+    if db.in_transaction:
+        db.rollback()
+    db.execute(
+        """
+        UPDATE admin_jobs SET status = ?, error = ?, step = NULL, lease_until = 0, finished_at = datetime('now')
+        WHERE id = ?
+        """,
+        ("error" if error else "done", error, job_id),
+    )
+    db.commit()
+
+
+def run_pending(db, static_folder):
+    """Run claimable jobs until none is left. Returns the number run."""
+    ran = 0
+    while True:
+        row = _claim(db)
+        if row is None:
+            return ran
+        try:
+            _Job(db, static_folder, row).run(row["kind"])
+        except Exception as e:
+            _finish(db, row["id"], str(e)[:500])
+        else:
+            _finish(db, row["id"])
+        ran += 1
+
+
+_runner = {"thread": None, "pid": None}
+_runner_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def _run_loop(static_folder):
+    while True:
+        db = get_pool().acquire()
+        try:
+            run_pending(db, static_folder)
+        except Exception as e:
+            print(f"Admin job runner failed: {e}")
+        finally:
+            get_pool().release(db)
+        # Wake up regularly: a job leased by a dead worker may need taking over
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+
+def start_runner(static_folder):
+    """Start this process's job runner thread (idempotent, fork-aware)."""
+    pid = os.getpid()
+    with _runner_lock:
+        if _runner["pid"] == pid and _runner["thread"].is_alive():
+            return
+        thread = threading.Thread(target=_run_loop, args=(static_folder,), name="admin-jobs", daemon=True)
+        thread.start()
+        _runner.update(thread=thread, pid=pid)
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+import time
+
+from .cache import make_cache
+
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    genai = None
+    GEMINI_AVAILABLE = False
+
+
+# Shared Gemini client.
+#
+# The API is configured once per process (and again only if the key or
+# endpoint changes) and each GenerativeModel is built once and reused.
+# Models are tried in the configured order, except that a model which just
+# failed is put on a cooldown and tried after the healthy ones until it
+# expires, so a broken primary model no longer costs a timeout per request.
+#
+# GEMINI_API_ENDPOINT points the client at another host (e.g. a local
+# stand-in speaking the REST API) and GEMINI_MODELS overrides the model list.
+DEFAULT_MODELS = (
+    "gemini-2.5-flash",
+    "gemini-2.5-pro-preview-05-06",
+    "gemini-2.5-flash-preview-05-20",
+    "gemini-2.5-pro-preview-03-25",
+    "gemini-pro",
+)
+REQUEST_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT") or 30)
+# First cooldown after a failure; doubles with each further failure in a row, up to 8x
+MODEL_COOLDOWN = float(os.environ.get("GEMINI_MODEL_COOLDOWN") or 120)
+ANSWER_CACHE_TTL = float(os.environ.get("AI_ANSWER_CACHE_TTL") or 24 * 3600)
+
+# Auto-answers per (post, content hash, length); get_or_set also makes
+# concurrent requests for the same answer wait for a single generation.
+_answers = make_cache("ai_answers", maxsize=512, ttl=ANSWER_CACHE_TTL)
+
+_lock = threading.Lock()
+_configured = None  # (api key, endpoint) the SDK was configured with
+_models = {}
+_health = {}
+
+
+class AIError(Exception):
+    """Generation failed; the message is meant for the user."""
+
+
+class AINotConfigured(AIError):
+    pass
+
+
+def api_key():
+    return os.getenv("GOOGLE_AI_STUDIO_API_KEY")
+
+
+def model_names():
+    configured = os.environ.get("GEMINI_MODELS")
+    if configured:
+        return [name.strip() for name in configured.split(",") if name.strip()]
+    return list(DEFAULT_MODELS)
+
+
+def _configure():
+    """Configure the SDK if needed. Caller holds _lock."""
+    global _configured
+    key = api_key()
+    if not key:
+        raise AINotConfigured("AI nie je nastavená. Skontroluj API kľúč.")
+    if not GEMINI_AVAILABLE:
+        raise AINotConfigured("Chýba balíček google-generativeai.")
+    endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+    if _configured != (key, endpoint):
+        options = {"api_key": key}
+        if endpoint:
+            options.update(transport="rest", client_options={"api_endpoint": endpoint})
+        genai.configure(**options)
+        _configured = (key, endpoint)
+        _models.clear()
+
+
+def _model(name):
+    with _lock:
+        _configure()
+        model = _models.get(name)
+        if model is None:
+            model = _models[name] = genai.GenerativeModel(name)
+        return model
+
+
+def _state(name):
+    return _health.setdefault(name, {
+        "ok": 0, "failures": 0, "failures_in_row": 0,
+        "cooldown_until": 0.0, "last_error": None, "last_ms": None,
+    })
+
+
+def _ordered_models():
+    """Healthy models in configured order, then cooling-down ones by how soon they recover."""
+    now = time.monotonic()
+    with _lock:
+        names = model_names()
+        healthy = [n for n in names if _state(n)["cooldown_until"] <= now]
+        cooling = sorted((n for n in names if n not in healthy), key=lambda n: _state(n)["cooldown_until"])
+    return healthy + cooling
+
+
+def _mark(name, started, error=None):
+    with _lock:
+        state = _state(name)
+        state["last_ms"] = round((time.monotonic() - started) * 1000, 1)
+        if error is None:
+            state["ok"] += 1
+            state["failures_in_row"] = 0
+            state["cooldown_until"] = 0.0
+        else:
+            state["failures"] += 1
+            state["failures_in_row"] += 1
+            state["last_error"] = str(error)[:300]
+            factor = min(2 ** (state["failures_in_row"] - 1), 8)
+            state["cooldown_until"] = time.monotonic() + MODEL_COOLDOWN * factor
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
+
+def generate(prompt):
+    """Generate a reply with the first model that works. Returns (text, model name).
+
+    The text is "" when the model answered without usable content. Raises
+    AINotConfigured without a key or SDK, AIError when every model failed.
+    """
+    last_error = None
+    for name in _ordered_models():
+        model = _model(name)
+        started = time.monotonic()
+        try:
+            response = model.generate_content(prompt, request_options={"timeout": REQUEST_TIMEOUT})
+        except Exception as e:
+            _mark(name, started, e)
+            last_error = e
+            continue
+        _mark(name, started)
+        # A blocked or empty candidate is the prompt's fault, not the model's
+        return _chunk_text(response).strip(), name
+    raise AIError(str(last_error) if last_error else "neznáma chyba")
+
+
+def stream(prompt):
+    """Yield the reply in pieces as the model produces them.
+
+    Falls back to the next model only while nothing has been yielded yet; a
+    failure mid-stream raises AIError. Raises like generate() otherwise.
+    """
+    last_error = None
+    for name in _ordered_models():
+        model = _model(name)
+        started = time.monotonic()
+        sent = False
+        try:
+            for chunk in model.generate_content(prompt, stream=True, request_options={"timeout": REQUEST_TIMEOUT}):
+                text = _chunk_text(chunk)
+                if text:
+                    sent = True
+                    yield text
+        except GeneratorExit:
+            raise  # the client went away; not the model's fault
+        except Exception as e:
+            _mark(name, started, e)
+            if sent:
+                raise AIError(str(e))
+            last_error = e
+            continue
+        _mark(name, started)
+        return
+    raise AIError(str(last_error) if last_error else "neznáma chyba")
+
+
+def _answer_key(post_id, content, length):
+    return ("answer", post_id, hashlib.sha256(content.encode("utf-8")).hexdigest()[:16], length)
+
+
+def cached_answer(post_id, content, length):
+    """The cached auto-answer, or None without generating one."""
+    return _answers.get(_answer_key(post_id, content, length))
+
+
+def post_answer(post_id, content, length, prompt):
+    """Cached auto-answer for a post (None if the model gave no text); regenerated when the content changes."""
+    return _answers.get_or_set(_answer_key(post_id, content, length), lambda: generate(prompt)[0] or None)
+
+
+def available_models():
+    """Names of the models this key may call generateContent on (for error messages)."""
+    with _lock:
+        _configure()
+    return [m.name for m in genai.list_models() if "generateContent" in m.supported_generation_methods]
+
+
+def stats():
+    now = time.monotonic()
+    with _lock:
+        models = {
+            name: {
+                **{k: v for k, v in _state(name).items() if k != "cooldown_until"},
+                "cooldown_s": max(0, round(_state(name)["cooldown_until"] - now, 1)),
+            }
+            for name in model_names()
+        }
+    return {"available": GEMINI_AVAILABLE, "models": models, "answers": _answers.stats()}
@@ -0,0 +1,219 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from .cache import make_cache
+
+
+# Bounded executor for AI generation.
+#
+# Model calls take seconds; run on request threads, a burst of chatbot use
+# would occupy every WSGI worker and stall the rest of the site. Here they
+# run on AI_WORKERS threads, and at most AI_QUEUE_LIMIT jobs (running or
+# waiting) and AI_USER_LIMIT per user are admitted per process. Anything
+# beyond that is refused at once with Saturated, which the routes turn into
+# a 429, instead of queueing without bound.
+#
+# Job records live in the shared cache, so a poll for a job id may be
+# answered by any worker process.
+WORKERS = int(os.environ.get("AI_WORKERS") or 4)
+QUEUE_LIMIT = int(os.environ.get("AI_QUEUE_LIMIT") or 16)
+USER_LIMIT = int(os.environ.get("AI_USER_LIMIT") or 2)
+# How long a synchronous request waits for its job before answering 202, and
+# how many request threads per process may be waiting at once: keep this well
+# below the worker's threads, the rest get their 202 immediately.
+SYNC_WAIT = float(os.environ.get("AI_SYNC_WAIT") or 5)
+SYNC_WAITERS = int(os.environ.get("AI_SYNC_WAITERS") or 2)
+JOB_TTL = 600  # seconds a finished job can still be polled
+RETRY_AFTER = 5
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="ai")
+_jobs = make_cache("ai_jobs", maxsize=2048, ttl=JOB_TTL, shared=True)
+
+_sync_slots = threading.BoundedSemaphore(SYNC_WAITERS)
+_lock = threading.Lock()
+_active = Counter()  # user id -> admitted jobs not finished yet
+_running = 0
+_stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "wait_s": 0.0, "run_s": 0.0, "not_waited": 0}
+
+
+class Saturated(Exception):
+    """No capacity for another AI job; the message is meant for the user."""
+
+    retry_after = RETRY_AFTER
+
+
+def _admit(user_id):
+    with _lock:
+        if sum(_active.values()) >= QUEUE_LIMIT:
+            _stats["rejected"] += 1
+            raise Saturated("AI asistent je práve preťažený, skús to o chvíľu.")
+        if _active[user_id] >= USER_LIMIT:
+            _stats["rejected"] += 1
+            raise Saturated("Počkaj, kým AI dokončí tvoje predchádzajúce požiadavky.")
+        _active[user_id] += 1
+        _stats["submitted"] += 1
+
+
+def _release(user_id):
+    with _lock:
+        _active[user_id] -= 1
+        if _active[user_id] <= 0:
+            del _active[user_id]
+
+
+class _Timer:
+    """Tracks queue wait and run time of one job for the stats."""
+
+    def __init__(self):
+        self.queued_at = time.monotonic()
+        self.started_at = None
+
+    def start(self):
+        global _running
+        self.started_at = time.monotonic()
+        with _lock:
+            _running += 1
+            _stats["wait_s"] += self.started_at - self.queued_at
+
+    def finish(self, ok):
+        global _running
+        with _lock:
+            _running -= 1
+            _stats["run_s"] += time.monotonic() - self.started_at
+            _stats["done" if ok else "failed"] += 1
+
+
+def submit(user_id, kind, fn, *args):
+    """Run fn(*args) on the AI pool. Returns (job id, future).
+
+    The job record (see get()) follows the job through queued/running to
+    done with `result` or error with `error`. Raises Saturated when full.
+    """
+    _admit(user_id)
+    job_id = uuid.uuid4().hex
+    record = {"id": job_id, "kind": kind, "user_id": user_id, "status": "queued", "created_at": time.time()}
+    _jobs.set(job_id, record)
+    timer = _Timer()
+
+    def run():
+        timer.start()
+        _jobs.set(job_id, dict(record, status="running"))
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            _jobs.set(job_id, dict(record, status="done", result=result))
+            return result
+        except Exception as e:
+            _jobs.set(job_id, dict(record, status="error", error=str(e)))
+            raise
+        finally:
+            timer.finish(ok)
+            _release(user_id)
+
+    try:
+        return job_id, _executor.submit(run)
+    except RuntimeError:
+        _release(user_id)  # interpreter shutting down
+        raise
+
+
+def wait(future):
+    """The job's result if it finishes within SYNC_WAIT and a waiter slot is free.
+
+    Raises FutureTimeout otherwise (the caller answers 202), or the job's error.
+    """
+    if not _sync_slots.acquire(blocking=False):
+        with _lock:
+            _stats["not_waited"] += 1
+        raise FutureTimeout()
+    try:
+        return future.result(timeout=SYNC_WAIT)
+    finally:
+        _sync_slots.release()
+
+
+def stream(user_id, make_pieces):
+    """Iterate make_pieces() on the AI pool and yield its items here.
+
+    Takes a slot like submit(); errors raised by the generator are re-raised
+    to the caller. Closing the returned iterator stops the pool thread at the
+    next piece.
+    """
+    _admit(user_id)
+    pieces = queue.Queue()
+    cancelled = threading.Event()
+    timer = _Timer()
+    done = object()
+
+    def pump():
+        timer.start()
+        outcome = done
+        try:
+            for piece in make_pieces():
+                if cancelled.is_set():
+                    break
+                pieces.put(piece)
+        except Exception as e:
+            outcome = e
+        finally:
+            # Free the slot before the consumer sees the end, so the user's next request fits
+            timer.finish(outcome is done)
+            _release(user_id)
+            pieces.put(outcome)
+
+    try:
+        _executor.submit(pump)
+    except RuntimeError:
+        _release(user_id)
+        raise
+
+    def consume():
+        try:
+            while True:
+                item = pieces.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    return consume()
+
+
+def get(job_id, user_id):
+    """The job's record if it belongs to user_id, else None."""
+    record = _jobs.get(job_id)
+    if record is None or record["user_id"] != user_id:
+        return None
+    return record
+
+
+def stats():
+    with _lock:
+        active = sum(_active.values())
+        finished = _stats["done"] + _stats["failed"]
+        started = finished + _running
+        return {
+            "workers": WORKERS,
+            "queue_limit": QUEUE_LIMIT,
+            "user_limit": USER_LIMIT,
+            "sync_waiters": SYNC_WAITERS,
+            "not_waited": _stats["not_waited"],
+            "running": _running,
+            "queued": active - _running,
+            "users_active": len(_active),
+            "submitted": _stats["submitted"],
+            "rejected": _stats["rejected"],
+            "done": _stats["done"],
+            "failed": _stats["failed"],
+            "avg_wait_ms": round(_stats["wait_s"] / started * 1000, 1) if started else None,
+            "avg_run_ms": round(_stats["run_s"] / finished * 1000, 1) if finished else None,
+        }
@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Minification needs a tokenizer that knows JS regex literals and CSS strings;
+# without these packages the files are only fingerprinted and precompressed.
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+
+# Fingerprinted static assets.
+#
+# `flask build-assets` copies css/, js/ and img/ into static/dist/ under
+# content-hashed names (style.css -> style.3f2a9c1d.css), minifying CSS/JS
+# when rcssmin/rjsmin are installed and writing .gz/.br siblings for text files. manifest.json maps source
+# names to built ones; templates call asset_url('css/style.css') and fall
+# back to the plain file when no build exists (e.g. during development).
+# Built files never change under the same URL, so they are cached forever.
+SOURCE_DIRS = ("img", "css", "js")  # img first: CSS references are rewritten to hashed images
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+COMPRESSIBLE = (".css", ".js", ".svg")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+# (manifest dict, manifest mtime) for the running process
+_manifest = ({}, None)
+
+
+def _minify_css(text):
+    return rcssmin.cssmin(text) if rcssmin else text
+
+
+def _minify_js(text):
+    return rjsmin.jsmin(text) if rjsmin else text
+
+
+def _rewrite_css_urls(text, manifest):
+    """Point /static/... url() references at their fingerprinted copies."""
+    def swap(match):
+        name = match.group(2)
+        built = manifest.get(name)
+        return f"url({match.group(1)}/static/{built}{match.group(1)})" if built else match.group(0)
+    return re.sub(r"url\((['\"]?)/static/([^'\")?#]+)\1\)", swap, text)
+
+
+def _hashed_name(relative_path, data):
+    stem, ext = os.path.splitext(relative_path)
+    return f"{DIST_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as fh:
+        fh.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def build(static_folder, echo=None):
+    """Build static/dist and its manifest. Returns the manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    manifest = {}
+    for source_dir in SOURCE_DIRS:
+        root = os.path.join(static_folder, source_dir)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(".md"):
+                    continue
+                full = os.path.join(dirpath, filename)
+                relative_path = os.path.relpath(full, static_folder).replace(os.sep, "/")
+                with open(full, "rb") as fh:
+                    data = fh.read()
+                if filename.endswith(".css"):
+                    data = _minify_css(_rewrite_css_urls(data.decode("utf-8"), manifest)).encode("utf-8")
+                elif filename.endswith(".js"):
+                    data = _minify_js(data.decode("utf-8")).encode("utf-8")
+                built = _hashed_name(relative_path, data)
+                target = os.path.join(static_folder, built)
+                _write(target, data)
+                sizes = [f"{len(data)} B"]
+                if filename.endswith(COMPRESSIBLE):
+                    gz = gzip.compress(data, compresslevel=9, mtime=0)
+                    _write(target + ".gz", gz)
+                    sizes.append(f"gz {len(gz)} B")
+                    if BROTLI_AVAILABLE:
+                        br = brotli.compress(data, quality=11)
+                        _write(target + ".br", br)
+                        sizes.append(f"br {len(br)} B")
+                manifest[relative_path] = built
+                if echo:
+                    echo(f"{relative_path} -> {built} ({', '.join(sizes)})")
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return manifest
+
+
+def load_manifest(static_folder):
+    """The current manifest ({} without a build); re-read when the file changes."""
+    global _manifest
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        _manifest = ({}, None)
+        return _manifest[0]
+    if mtime != _manifest[1]:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                _manifest = (json.load(fh), mtime)
+        except (OSError, ValueError):
+            return _manifest[0]
+    return _manifest[0]
+
+
+def build_stamp(static_folder):
+    """Identifies the current build (None without one); changes when build-assets runs."""
+    load_manifest(static_folder)
+    return _manifest[1]
+
+
+def pick_encoding(path, accept_encoding):
+    """Best precompressed sibling of a built file for the client: (path, encoding or None)."""
+    accept = (accept_encoding or "").lower()
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in accept and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
@@ -0,0 +1,393 @@
+import abc
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Pluggable caches.
+#
+# make_cache(name, ...) returns a cache for one kind of data; CACHE_BACKEND
+# picks the implementation for all of them:
+#   memory  (default) per-process LRU; a hit costs no I/O at all
+#   sqlite  one SQLite file shared by every worker process, so a value
+#           computed by one gunicorn worker serves the others
+# A memory cache is private to its process: delete() and clear() only reach
+# the worker that calls them, so an entry invalidated on write (users) can
+# stay stale on the other workers until its TTL runs out, and each worker
+# fills its own copy. CACHE_BACKEND=sqlite shares entries and invalidation.
+# Caches created with shared=True hold state other processes must see (e.g.
+# AI job records polled on any worker) and use SQLite unless CACHE_BACKEND
+# is explicitly "memory".
+# Both expire entries after a TTL, evict beyond `maxsize`, coalesce
+# concurrent misses for the same key (get_or_set) and report hit rates.
+
+_MISSING = object()
+
+
+class _Call:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Cache(abc.ABC):
+    """Shared behaviour: single-flight get_or_set and counters."""
+
+    backend = None
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._calls_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _bump(self, counter, n=1):
+        # Request threads update these concurrently; += alone loses counts
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    @abc.abstractmethod
+    def get(self, key, default=None):
+        """The cached value, or `default` if it is missing or expired."""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl=None):
+        """Store value for `ttl` seconds (the cache's default when None)."""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Drop one key if present."""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Drop every entry."""
+
+    @abc.abstractmethod
+    def _size(self):
+        """Number of entries stored."""
+
+    def _load(self, key, loader, ttl):
+        value = loader()
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Return the cached value or compute it with loader() and store it.
+
+        Concurrent misses for one key run loader() once; the other callers
+        wait for its result. None results are returned but not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._calls_lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            self._bump("coalesced")
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = self._load(key, loader, ttl)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._calls_lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses, evictions, coalesced = self.hits, self.misses, self.evictions, self.coalesced
+        lookups = hits + misses
+        return {
+            "backend": self.backend,
+            "size": self._size(),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "coalesced": coalesced,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TTLCache(Cache):
+    """Bounded in-process LRU cache whose entries also expire after `ttl` seconds."""
+
+    backend = "memory"
+
+    def __init__(self, maxsize=1024, ttl=60.0, name=None):
+        super().__init__(name, maxsize, ttl)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _size(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteCache(Cache):
+    """Cache stored in a SQLite file that every worker process opens.
+
+    Values are pickled. Reads only SELECT: hits are remembered in memory and
+    written to `used_at` in one batch at the next eviction pass, which is
+    enough for approximate LRU; expired rows are removed there too.
+    Besides the in-process single flight, a miss takes a short lease row so
+    that other processes wait for the value instead of computing it too.
+    """
+
+    backend = "sqlite"
+    EVICT_EVERY = 64  # sets between size checks
+    FILL_TIMEOUT = 5.0  # longest wait for another process's loader
+    BUSY_TIMEOUT = 0.25  # a locked cache file is a miss, not a stalled request
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        ns TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        used_at REAL NOT NULL,
+        PRIMARY KEY (ns, key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_cache_entries_used ON cache_entries(ns, used_at);
+    CREATE TABLE IF NOT EXISTS cache_fills (
+        ns TEXT NOT NULL,
+        key TEXT NOT NULL,
+        until REAL NOT NULL,
+        PRIMARY KEY (ns, key)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60.0, path=None):
+        super().__init__(name, maxsize, ttl)
+        self._path = path
+        self._local = threading.local()
+        self._sets = 0
+        self._touched = {}  # key -> last hit time, flushed by _evict
+        self._touched_lock = threading.Lock()
+
+    @property
+    def path(self):
+        if self._path:
+            return self._path
+        from . import database
+        return os.environ.get("CACHE_DB") or os.path.splitext(database.DB_PATH)[0] + "-cache.db"
+
+    def _conn(self):
+        # One connection per thread, reopened after fork() or a path change
+        conn = getattr(self._local, "conn", None)
+        path = self.path
+        if conn is None or self._local.pid != os.getpid() or self._local.path != path:
+            conn = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(self._SCHEMA)
+            self._local.conn, self._local.pid, self._local.path = conn, os.getpid(), path
+        return conn
+
+    @staticmethod
+    def _key(key):
+        return key if isinstance(key, str) else repr(key)
+
+    def _read(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, used_at FROM cache_entries WHERE ns = ? AND key = ?",
+            (self.name, self._key(key)),
+        ).fetchone()
+        if row is None:
+            return _MISSING
+        value, expires_at, used_at = row
+        if expires_at <= now:
+            return _MISSING  # deleted by the next _evict
+        if now - used_at > self.ttl * 0.1:
+            with self._touched_lock:
+                self._touched[self._key(key)] = now
+        try:
+            return pickle.loads(value)
+        except Exception:
+            return _MISSING
+
+    def get(self, key, default=None):
+        try:
+            value = self._read(key)
+        except sqlite3.Error:
+            value = _MISSING
+        if value is _MISSING:
+            self._bump("misses")
+            return default
+        self._bump("hits")
+        return value
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries(ns, key, value, expires_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (self.name, self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 now + (self.ttl if ttl is None else ttl), now),
+            )
+            self._sets += 1
+            if self._sets % self.EVICT_EVERY == 0:
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass  # a cache that cannot write just misses
+
+    def _evict(self, conn, now):
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE cache_entries SET used_at = MAX(used_at, ?) WHERE ns = ? AND key = ?",
+                [(used_at, self.name, key) for key, used_at in touched.items()],
+            )
+            conn.execute("DELETE FROM cache_entries WHERE ns = ? AND expires_at <= ?", (self.name, now))
+            size = conn.execute("SELECT COUNT(*) FROM cache_entries WHERE ns = ?", (self.name,)).fetchone()[0]
+            if size > self.maxsize:
+                cur = conn.execute(
+                    """
+                    DELETE FROM cache_entries WHERE ns = ? AND key IN (
+                        SELECT key FROM cache_entries WHERE ns = ? ORDER BY used_at LIMIT ?
+                    )
+                    """,
+                    (self.name, self.name, size - self.maxsize),
+                )
+                self._bump("evictions", cur.rowcount)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+
+    def delete(self, key):
+        try:
+            self._conn().execute("DELETE FROM cache_entries WHERE ns = ? AND key = ?", (self.name, self._key(key)))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        try:
+            self._conn().execute("DELETE FROM cache_entries WHERE ns = ?", (self.name,))
+        except sqlite3.Error:
+            pass
+
+    def _size(self):
+        try:
+            return self._conn().execute("SELECT COUNT(*) FROM cache_entries WHERE ns = ?", (self.name,)).fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def _load(self, key, loader, ttl):
+        skey = self._key(key)
+        try:
+            conn = self._conn()
+            now = time.time()
+            claimed = conn.execute(
+                """
+                INSERT INTO cache_fills(ns, key, until) VALUES (?, ?, ?)
+                ON CONFLICT(ns, key) DO UPDATE SET until = excluded.until WHERE cache_fills.until <= ?
+                """,
+                (self.name, skey, now + self.FILL_TIMEOUT, now),
+            ).rowcount
+            if not claimed:
+                # Another process is computing this value: wait for it, then fall back to computing
+                deadline = time.monotonic() + self.FILL_TIMEOUT
+                while time.monotonic() < deadline:
+                    time.sleep(0.02)
+                    value = self._read(key)
+                    if value is not _MISSING:
+                        self._bump("coalesced")
+                        return value
+        except sqlite3.Error:
+            # Cache file locked or broken: compute without cross-process coalescing
+            return super()._load(key, loader, ttl)
+        try:
+            return super()._load(key, loader, ttl)
+        finally:
+            if claimed:
+                try:
+                    conn.execute("DELETE FROM cache_fills WHERE ns = ? AND key = ?", (self.name, skey))
+                except sqlite3.Error:
+                    pass  # the lease expires after FILL_TIMEOUT anyway
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def make_cache(name, maxsize=1024, ttl=60.0, shared=False):
+    """The cache called `name`, created with the backend chosen by CACHE_BACKEND.
+
+    shared=True asks for the cross-process backend unless CACHE_BACKEND=memory is set.
+    """
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            backend = (os.environ.get("CACHE_BACKEND") or ("sqlite" if shared else "memory")).lower()
+            if backend == "memory":
+                cache = TTLCache(maxsize=maxsize, ttl=ttl, name=name)
+            else:
+                cache = SQLiteCache(name, maxsize=maxsize, ttl=ttl)
+            _registry[name] = cache
+        return cache
+
+
+def cache_stats():
+    """Stats of every cache created through make_cache()."""
+    with _registry_lock:
+        caches = dict(_registry)
+    return {name: cache.stats() for name, cache in caches.items()}
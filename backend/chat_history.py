@@ -0,0 +1,212 @@
+import os
+
+from .pagination import decode_token, encode_token
+
+
+# Chatbot history: paging, context window and compaction.
+#
+# History is read newest-first by (user_id, id) keyset, so a page costs one
+# index range scan however long the conversation is. The model gets a
+# bounded window of recent turns that fits a token budget, instead of
+# either nothing or everything.
+#
+# `flask compact-chat` keeps the newest KEEP_MESSAGES per user in
+# chat_messages, moves older turns to chat_archive and folds them into a
+# per-user summary (chat_summaries) that is sent ahead of the window.
+# Archived turns older than ARCHIVE_DAYS are deleted.
+KEEP_MESSAGES = int(os.environ.get("CHAT_KEEP_MESSAGES") or 200)
+ARCHIVE_DAYS = int(os.environ.get("CHAT_ARCHIVE_DAYS") or 365)
+# Rough prompt budget for summary + history; about 4 characters per token
+CONTEXT_TOKENS = int(os.environ.get("CHAT_CONTEXT_TOKENS") or 2000)
+CONTEXT_MAX_MESSAGES = 40
+SUMMARY_MAX_CHARS = 1500
+
+CHAT_SCHEMA = """
+-- Pages and context windows read one user's rows by id
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user_msg ON chat_messages(user_id, id);
+DROP INDEX IF EXISTS idx_chat_messages_user_id;
+DROP INDEX IF EXISTS idx_chat_messages_created_at;
+
+CREATE TABLE IF NOT EXISTS chat_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_archive_user ON chat_archive(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_chat_archive_created ON chat_archive(created_at);
+
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    user_id INTEGER PRIMARY KEY,
+    summary TEXT NOT NULL,
+    through_id INTEGER NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_chat_user_delete AFTER DELETE ON users BEGIN
+    DELETE FROM chat_messages WHERE user_id = old.id;
+    DELETE FROM chat_archive WHERE user_id = old.id;
+    DELETE FROM chat_summaries WHERE user_id = old.id;
+END;
+"""
+
+
+def estimate_tokens(text):
+    return len(text or "") // 4 + 4
+
+
+def history_page(db, user_id, cursor_token=None, limit=50):
+    """The `limit` messages before the cursor, oldest first. Returns (messages, next_cursor).
+
+    Without a cursor this is the newest page; next_cursor points at older messages.
+    """
+    values = decode_token(cursor_token)
+    try:
+        before_id = int(values[0]) if values else None
+    except (TypeError, ValueError):
+        before_id = None
+    seek = " AND id < ?" if before_id is not None else ""
+    params = [user_id] + ([before_id] if before_id is not None else []) + [limit + 1]
+    rows = db.execute(
+        f"""
+        SELECT id, role, message, created_at FROM chat_messages
+        WHERE user_id = ?{seek}
+        ORDER BY id DESC LIMIT ?
+        """,
+        params,
+    ).fetchall()
+    next_cursor = encode_token([rows[limit - 1]["id"]]) if len(rows) > limit else None
+    return [dict(r) for r in reversed(rows[:limit])], next_cursor
+
+
+def summary_for(db, user_id):
+    row = db.execute("SELECT summary FROM chat_summaries WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def context_window(db, user_id, budget=None):
+    """Summary and recent turns to send with the next question. Returns (summary, [(role, message)]).
+
+    The summary (if any) is capped at a quarter of the budget; the newest
+    turns fill the rest, oldest first, stopping at the first that does not fit.
+    """
+    budget = CONTEXT_TOKENS if budget is None else budget
+    summary = summary_for(db, user_id)
+    if summary:
+        summary = summary[:budget]  # budget / 4 tokens, ~4 characters each
+        budget -= estimate_tokens(summary)
+    turns = []
+    rows = db.execute(
+        "SELECT role, message FROM chat_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+        (user_id, CONTEXT_MAX_MESSAGES),
+    ).fetchall()
+    for role, message in rows:
+        cost = estimate_tokens(message)
+        if cost > budget:
+            break
+        budget -= cost
+        turns.append((role, message))
+    turns.reverse()
+    return summary, turns
+
+
+def _fallback_summary(previous, rows):
+    questions = [message.strip().replace("\n", " ")[:120] for role, message in rows if role == "user"]
+    text = "; ".join(filter(None, [previous] + questions))
+    return text[-SUMMARY_MAX_CHARS:]
+
+
+def _summarize(previous, rows, summarize):
+    if summarize is not None:
+        try:
+            text = summarize(previous, rows)
+            if text:
+                return text.strip()[:SUMMARY_MAX_CHARS]
+        except Exception:
+            pass
+    return _fallback_summary(previous, rows)
+
+
+def model_summary(previous, rows):
+    """Summarize archived turns with the chatbot model (for compact_user's `summarize`)."""
+    from . import ai_client
+    lines = [f"{'User' if role == 'user' else 'Assistant'}: {message}" for role, message in rows]
+    prompt = (
+        "Zhrň stručne po slovensky (max. 5 viet), o čom sa používateľ s asistentom rozprával, "
+        "aby sa na to dalo nadviazať. Uveď rastliny, miesta a problémy, ktoré spomenul.\n\n"
+        + (f"Doterajšie zhrnutie: {previous}\n\n" if previous else "")
+        + "\n".join(lines)[-12000:]
+    )
+    return ai_client.generate(prompt)[0]
+
+
+def compact_user(db, user_id, keep=None, summarize=None):
+    """Archive all but the newest `keep` messages of one user and fold them into the summary.
+
+    `summarize(previous_summary, [(role, message)])` may produce the new
+    summary (e.g. with the model); without it, or if it fails, the earlier
+    questions are listed instead. Returns the number of messages archived.
+    """
+    keep = KEEP_MESSAGES if keep is None else keep
+    row = db.execute(
+        "SELECT id FROM chat_messages WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+        (user_id, keep),
+    ).fetchone()
+    if row is None:
+        return 0
+    through_id = row[0]
+    rows = db.execute(
+        "SELECT role, message FROM chat_messages WHERE user_id = ? AND id <= ? ORDER BY id",
+        (user_id, through_id),
+    ).fetchall()
+    # Summarize before taking the write lock: it may call the model
+    summary = _summarize(summary_for(db, user_id), [tuple(r) for r in rows], summarize)
+    db.execute(
+        """
+        INSERT OR IGNORE INTO chat_archive(id, user_id, role, message, created_at)
+        SELECT id, user_id, role, message, created_at FROM chat_messages WHERE user_id = ? AND id <= ?
+        """,
+        (user_id, through_id),
+    )
+    archived = db.execute("DELETE FROM chat_messages WHERE user_id = ? AND id <= ?", (user_id, through_id)).rowcount
+    db.execute(
+        """
+        INSERT INTO chat_summaries(user_id, summary, through_id) VALUES (?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            summary = excluded.summary, through_id = excluded.through_id, updated_at = datetime('now')
+        """,
+        (user_id, summary, through_id),
+    )
+    db.commit()
+    return archived
+
+
+def compact_all(db, keep=None, summarize=None, echo=None):
+    """Compact every user over the limit and expire old archive rows.
+
+    Returns (users compacted, messages archived, archived messages deleted).
+    """
+    keep = KEEP_MESSAGES if keep is None else keep
+    users = [r[0] for r in db.execute(
+        "SELECT user_id FROM chat_messages GROUP BY user_id HAVING COUNT(*) > ?", (keep,)
+    ).fetchall()]
+    archived = 0
+    for i, user_id in enumerate(users, 1):
+        n = compact_user(db, user_id, keep, summarize)
+        archived += n
+        if echo:
+            echo(f"[{i}/{len(users)}] user {user_id}: archived {n} message(s)")
+    expired = db.execute(
+        "DELETE FROM chat_archive WHERE created_at < datetime('now', ?)", (f"-{ARCHIVE_DAYS} days",)
+    ).rowcount
+    db.commit()
+    return len(users), archived, expired
+
+
+def clear_user(db, user_id):
+    """Delete a user's whole conversation, archive and summary included."""
+    db.execute("DELETE FROM chat_messages WHERE user_id = ?", (user_id,))
+    db.execute("DELETE FROM chat_archive WHERE user_id = ?", (user_id,))
+    db.execute("DELETE FROM chat_summaries WHERE user_id = ?", (user_id,))
+    db.commit()
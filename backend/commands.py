@@ -0,0 +1,187 @@
+# Maintenance commands, run through the Flask CLI:
+#   flask --app backend.main:create_app <command>
+import os
+import time
+
+import click
+from flask import current_app
+
+from .database import get_db
+from .migrations import LATEST_VERSION, apply_pending, current_version, pending_migrations
+from .models import CLEANUP_STEPS, repair_post_counters
+from . import admin_jobs, ai_client, assets, chat_history, follows, image_pipeline, news_fetcher, search, timeline, upload_store
+from .file_utils import allowed_file
+
+
+def _db_size(db):
+    page_size = db.execute("PRAGMA page_size").fetchone()[0]
+    pages = db.execute("PRAGMA page_count").fetchone()[0]
+    free = db.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * page_size, free * page_size
+
+
+def _mb(n):
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+def register_commands(app):
+    @app.cli.command("repair-counters")
+    def repair_counters():
+        """Rebuild post like/comment counters and user follower/following counters."""
+        db = get_db()
+        fixed = repair_post_counters(db)
+        click.echo(f"Repaired counters on {fixed} post(s).")
+        fixed = follows.repair_follow_counters(db)
+        click.echo(f"Repaired follow counters on {fixed} user(s).")
+
+    @app.cli.command("migrate")
+    @click.option("--status", is_flag=True, help="Only list pending migrations.")
+    def migrate(status):
+        """Apply pending schema migrations."""
+        db = get_db()
+        if status:
+            click.echo(f"Schema version {current_version(db)} of {LATEST_VERSION}")
+            for version, name, _ in pending_migrations(db):
+                click.echo(f"  pending {version}: {name}")
+            return
+        applied = apply_pending(db, echo=click.echo)
+        click.echo(f"Applied {len(applied)} migration(s); schema version {current_version(db)}.")
+
+    @app.cli.command("cleanup-db")
+    @click.option("--vacuum/--no-vacuum", default=False, help="Rewrite the database file afterwards to reclaim space.")
+    def cleanup_db(vacuum):
+        """Remove legacy/invalid rows and optionally VACUUM. Run offline: VACUUM rewrites the whole file."""
+        db = get_db()
+        for i, (label, sql) in enumerate(CLEANUP_STEPS, 1):
+            started = time.perf_counter()
+            removed = db.execute(sql).rowcount
+            db.commit()
+            click.echo(f"[{i}/{len(CLEANUP_STEPS)}] {label}: removed {removed} row(s) in {time.perf_counter() - started:.1f}s")
+        if not vacuum:
+            return
+
+        size, free = _db_size(db)
+        click.echo(f"VACUUM: {_mb(size)} on disk, {_mb(free)} free pages")
+        started = time.perf_counter()
+        last_report = [started]
+
+        def _progress():
+            now = time.perf_counter()
+            if now - last_report[0] >= 2:
+                last_report[0] = now
+                click.echo(f"  ... still vacuuming ({now - started:.0f}s)")
+            return 0
+
+        db.set_progress_handler(_progress, 100000)
+        try:
+            db.execute("VACUUM")
+        finally:
+            db.set_progress_handler(None, 0)
+        size_after, _ = _db_size(db)
+        click.echo(f"VACUUM done in {time.perf_counter() - started:.1f}s: {_mb(size)} -> {_mb(size_after)}")
+
+    @app.cli.command("rebuild-search")
+    @click.option("--full", is_flag=True, help="Rebuild every index from scratch instead of resuming the backfill.")
+    @click.option("--batch-size", default=1000, show_default=True, help="Rows indexed per transaction.")
+    def rebuild_search(full, batch_size):
+        """Index existing posts, comments and articles for full-text search."""
+        db = get_db()
+        if full:
+            search.rebuild(db, echo=click.echo)
+            return
+        indexed = search.backfill(db, batch_size=batch_size, echo=click.echo)
+        click.echo(f"Indexed {indexed} row(s).")
+
+    @app.cli.command("prune-timelines")
+    @click.option("--keep", default=timeline.MAX_ENTRIES, show_default=True, type=click.IntRange(min=1),
+                  help="Entries kept per user.")
+    def prune_timelines(keep):
+        """Trim every following-timeline to its newest entries."""
+        users, removed = timeline.prune_all(get_db(), keep)
+        click.echo(f"Pruned {removed} entr(y/ies) from {users} timeline(s).")
+
+    @app.cli.command("compact-chat")
+    @click.option("--keep", default=chat_history.KEEP_MESSAGES, show_default=True, help="Messages kept per user.")
+    @click.option("--ai/--no-ai", default=True, help="Summarize archived turns with the model when it is configured.")
+    def compact_chat(keep, ai):
+        """Archive old chatbot turns into per-user summaries and expire the archive."""
+        summarize = chat_history.model_summary if ai and ai_client.api_key() and ai_client.GEMINI_AVAILABLE else None
+        users, archived, expired = chat_history.compact_all(get_db(), keep, summarize=summarize, echo=click.echo)
+        click.echo(f"Archived {archived} message(s) of {users} user(s); deleted {expired} expired archived message(s).")
+
+    @app.cli.command("generate-image-variants")
+    @click.option("--force", is_flag=True, help="Regenerate variants that already exist.")
+    def generate_image_variants(force):
+        """Create resized WebP variants for uploads that do not have them yet."""
+        if not image_pipeline.PIL_AVAILABLE:
+            raise click.ClickException("Pillow is not installed: pip install Pillow")
+        static_folder = current_app.static_folder
+        paths = sorted(p for p in upload_store.iter_uploads(static_folder) if allowed_file(p))
+        done = 0
+        for i, rel in enumerate(paths, 1):
+            if not force and os.path.exists(os.path.join(static_folder, image_pipeline.manifest_path(rel))):
+                continue
+            if image_pipeline.generate_variants(static_folder, rel):
+                done += 1
+            click.echo(f"[{i}/{len(paths)}] {rel}")
+        click.echo(f"Generated variants for {done} upload(s).")
+
+    @app.cli.command("dedupe-uploads")
+    @click.option("--dry-run", is_flag=True, help="Only report what would be moved.")
+    def dedupe_uploads(dry_run):
+        """Move referenced uploads to content-addressed paths and drop duplicate files."""
+        rewritten, saved = upload_store.dedupe(get_db(), current_app.static_folder, dry_run=dry_run, echo=click.echo)
+        verb = "Would save" if dry_run else "Saved"
+        click.echo(f"Rewrote {rewritten} upload(s). {verb} {_mb(saved)} of duplicates.")
+
+    @app.cli.command("gc-uploads")
+    @click.option("--dry-run", is_flag=True, help="Only report what would be removed.")
+    @click.option("--grace", default=upload_store.GC_GRACE_SECONDS, show_default=True,
+                  help="Keep unreferenced files younger than this many seconds.")
+    @click.option("--top", default=20, show_default=True, help="Owners listed in the usage report.")
+    def gc_uploads(dry_run, grace, top):
+        """Delete upload files nothing references and report disk usage by owner."""
+        report = upload_store.gc_uploads(
+            get_db(), current_app.static_folder, grace=grace, dry_run=dry_run, echo=click.echo
+        )
+        click.echo(f"Kept {report['files']} file(s), {_mb(report['bytes'])}:")
+        owners = sorted(report["owners"].items(), key=lambda item: item[1][1], reverse=True)
+        for owner, (files, size) in owners[:top]:
+            click.echo(f"  {owner:<30} {files:>6} file(s) {_mb(size):>10}")
+        if len(owners) > top:
+            rest = owners[top:]
+            click.echo(f"  ... {len(rest)} more owner(s), {_mb(sum(size for _, (_, size) in rest))}")
+        verb = "Would remove" if dry_run else "Removed"
+        click.echo(
+            f"{verb} {report['removed']} unreferenced file(s) ({_mb(report['removed_bytes'])}), "
+            f"{report['temp_removed']} temp file(s) and {report['dirs_removed']} empty folder(s); "
+            f"{report['young']} unreferenced file(s) are within the grace period."
+        )
+
+    @app.cli.command("build-assets")
+    def build_assets():
+        """Fingerprint and precompress static CSS/JS/images into static/dist, minifying with rcssmin/rjsmin if installed."""
+        manifest = assets.build(current_app.static_folder, echo=click.echo)
+        if not assets.BROTLI_AVAILABLE:
+            click.echo("brotli is not installed: only .gz files were written.")
+        click.echo(f"Built {len(manifest)} asset(s).")
+
+    @app.cli.command("refresh-news")
+    @click.option("--force", is_flag=True, help="Re-check feeds not checked in the last minute, even if not due.")
+    def refresh_news(force):
+        """Fetch the configured news feeds now (the web workers do this in the background)."""
+        outcomes = news_fetcher.refresh_all(get_db(), force=force)
+        for url, outcome in outcomes.items():
+            click.echo(f"{url}: {outcome}")
+        if not outcomes:
+            click.echo("No feed is due (use --force).")
+
+    @app.cli.command("run-admin-jobs")
+    @click.option("--retry-failed", is_flag=True, help="Queue jobs that ended with an error again first.")
+    def run_admin_jobs(retry_failed):
+        """Run queued admin jobs (bulk deletes) in the foreground."""
+        db = get_db()
+        if retry_failed:
+            click.echo(f"Re-queued {admin_jobs.retry_failed(db)} failed job(s).")
+        ran = admin_jobs.run_pending(db, current_app.static_folder)
+        click.echo(f"Ran {ran} job(s).")
@@ -1,24 +1,168 @@
 import os
 import sqlite3
+import threading
 from flask import g
 
+from .query import InstrumentedConnection
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "gardencircle.db")
+
+DB_PATH = os.environ.get("GARDENCIRCLE_DB") or os.path.join(os.path.dirname(__file__), "gardencircle.db")
+
+# Applied once when a pooled connection is created (not per request).
+# Override with e.g. SQLITE_PRAGMAS="cache_size=-64000,mmap_size=0".
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",       # readers no longer block behind a writer
+    "synchronous": "NORMAL",     # safe with WAL, one fsync per checkpoint instead of per commit
+    "cache_size": -16000,        # ~16 MB page cache, kept warm because connections are reused
+    "mmap_size": 134217728,      # 128 MB memory-mapped reads
+    "busy_timeout": 5000,        # wait for the write lock instead of failing with "database is locked"
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+}
+_ALLOWED_PRAGMAS = set(DEFAULT_PRAGMAS)
+
+# Prepared statements kept per connection; pooled connections keep them across requests.
+STATEMENT_CACHE_SIZE = int(os.environ.get("SQLITE_STATEMENT_CACHE") or 256)
+
+
+def _pragmas_from_env():
+    pragmas = dict(DEFAULT_PRAGMAS)
+    for item in (os.environ.get("SQLITE_PRAGMAS") or "").split(","):
+        name, _, value = item.partition("=")
+        name = name.strip().lower()
+        if name in _ALLOWED_PRAGMAS and value.strip():
+            pragmas[name] = value.strip()
+    return pragmas
+
+
+class ConnectionPool:
+    """Process-wide pool of SQLite connections.
+
+    A request borrows one connection and hands it back at teardown, so PRAGMAs
+    are applied once and the page cache survives between requests. Idle
+    connections are reused LIFO to keep the hottest cache in play.
+    """
+
+    def __init__(self, path, pragmas=None, max_idle=8):
+        self.path = path
+        self.pragmas = dict(pragmas or DEFAULT_PRAGMAS)
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        # Connections inherited over fork() must never be used or closed in the child.
+        self._abandoned = []
+        self._stats = {"created": 0, "reused": 0, "released": 0, "discarded": 0, "in_use": 0}
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            factory=InstrumentedConnection,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _check_fork(self):
+        # Called with the lock held. Gunicorn workers fork after the app was
+        # imported; start every worker with a fresh pool.
+        pid = os.getpid()
+        if pid != self._pid:
+            self._abandoned.extend(self._idle)
+            self._idle = []
+            self._pid = pid
+            self._stats["in_use"] = 0
+
+    def acquire(self):
+        conn = None
+        with self._lock:
+            self._check_fork()
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats["reused"] += 1
+            self._stats["in_use"] += 1
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._stats["in_use"] -= 1
+                raise
+            with self._lock:
+                self._stats["created"] += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._close(conn)
+            return
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._abandoned.append(conn)
+                return
+            self._stats["in_use"] = max(0, self._stats["in_use"] - 1)
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                self._stats["released"] += 1
+                return
+            self._stats["discarded"] += 1
+        conn.close()
+
+    def _close(self, conn):
+        with self._lock:
+            self._stats["in_use"] = max(0, self._stats["in_use"] - 1)
+            self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), max_idle=self.max_idle,
+                        pid=self._pid, pragmas=dict(self.pragmas))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None or _pool.path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.path != DB_PATH:
+                max_idle = int(os.environ.get("SQLITE_POOL_SIZE") or 8)
+                _pool = ConnectionPool(DB_PATH, _pragmas_from_env(), max_idle=max_idle)
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats()
 
 
 def get_db():
     db = getattr(g, "_database", None)
     if db is None:
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        db = g._database = sqlite3.connect(DB_PATH)
-        db.row_factory = sqlite3.Row
+        db = g._database = get_pool().acquire()
     return db
 
 
 def close_db(e=None):
     db = getattr(g, "_database", None)
     if db is not None:
-        db.close()
         g._database = None
-
-
+        get_pool().release(db)
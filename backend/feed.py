@@ -0,0 +1,118 @@
+from .pagination import decode_cursor, keyset_page
+from .query import in_list
+
+
+# One statement hydrates a post with everything a feed card needs:
+# the denormalized counters, the author's avatar and whether the viewer liked it.
+_POST_COLUMNS = """
+    p.id, p.author_id, p.author, p.content, p.created_at, p.image_path,
+    p.like_count, p.comment_count,
+    u.profile_image AS author_image,
+    EXISTS(SELECT 1 FROM likes l WHERE l.user_id = ? AND l.post_id = p.id) AS liked
+"""
+
+
+def _post_from_row(row):
+    return {
+        "id": row["id"],
+        "author_id": row["author_id"],
+        "author": row["author"],
+        "author_image": row["author_image"],
+        "content": row["content"],
+        "created_at": row["created_at"],
+        "image_path": row["image_path"],
+        "like_count": row["like_count"],
+        "liked": bool(row["liked"]),
+        "comment_count": row["comment_count"],
+    }
+
+
+def fetch_feed_page(db, viewer_id, cursor_token=None, limit=20, author_id=None):
+    """Fetch and hydrate one page of posts newest-first in a single query.
+
+    Pages are keyset-based on (created_at, id) and backed by idx_posts_created_id,
+    so deep pages cost the same as the first. Pass limit=None to get every
+    matching post. Returns (posts, next_cursor).
+    """
+    where = []
+    params = [viewer_id]
+    if author_id is not None:
+        where.append("p.author_id = ?")
+        params.append(author_id)
+    cursor = decode_cursor(cursor_token)
+    if cursor:
+        where.append("(p.created_at, p.id) < (?, ?)")
+        params.extend(cursor)
+    sql = f"SELECT {_POST_COLUMNS} FROM posts p LEFT JOIN users u ON u.id = p.author_id"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY p.created_at DESC, p.id DESC"
+    if limit is None:
+        rows = db.execute(sql, params).fetchall()
+        return [_post_from_row(r) for r in rows], None
+    sql += " LIMIT ?"
+    params.append(limit + 1)
+    rows, next_cursor = keyset_page(db.execute(sql, params).fetchall(), limit)
+    return [_post_from_row(r) for r in rows], next_cursor
+
+
+def hydrate_posts(db, post_ids, viewer_id):
+    """Hydrate the given post ids in one round-trip, preserving their order.
+
+    Ids that no longer exist are skipped.
+    """
+    if not post_ids:
+        return []
+    rows = db.execute(
+        f"""
+        SELECT {_POST_COLUMNS}
+        FROM json_each(?) AS ids
+        JOIN posts p ON p.id = ids.value
+        LEFT JOIN users u ON u.id = p.author_id
+        ORDER BY ids.key
+        """,
+        (viewer_id, in_list(int(i) for i in post_ids)),
+    ).fetchall()
+    return [_post_from_row(r) for r in rows]
+
+
+def get_post(db, post_id, viewer_id):
+    """Hydrate a single post, or return None if it does not exist."""
+    posts = hydrate_posts(db, [post_id], viewer_id)
+    return posts[0] if posts else None
+
+
+def liked_post_ids(db, viewer_id, post_ids):
+    """Return the subset of post_ids the viewer has liked (one query for any batch size)."""
+    if not viewer_id or not post_ids:
+        return set()
+    rows = db.execute(
+        "SELECT post_id FROM likes WHERE user_id = ? AND post_id IN (SELECT value FROM json_each(?))",
+        (viewer_id, in_list(int(i) for i in post_ids)),
+    ).fetchall()
+    return {r[0] for r in rows}
+
+
+def fetch_comments(db, post_id):
+    """All comments of a post, oldest first, with their author's avatar."""
+    rows = db.execute(
+        """
+        SELECT c.id, c.author_id, c.author, u.profile_image AS author_image, c.text, c.created_at
+        FROM comments c
+        LEFT JOIN users u ON u.id = c.author_id
+        WHERE c.post_id = ?
+        ORDER BY c.created_at ASC, c.id ASC
+        """,
+        (post_id,),
+    ).fetchall()
+    return [
+        {
+            "id": r["id"],
+            "author_id": r["author_id"],
+            "author": r["author"],
+            "author_image": r["author_image"],
+            "text": r["text"],
+            "created_at": r["created_at"],
+        }
+        for r in rows
+    ]
@@ -2,7 +2,10 @@ import os
 import uuid
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
-from flask import current_app
+from flask import Request, current_app
+
+from .image_pipeline import schedule_variants
+from .upload_store import IncomingUpload, store_stream
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -12,6 +15,13 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def file_extension(filename):
+    """Lower-case extension of an allowed filename, or None"""
+    if filename and allowed_file(filename):
+        return filename.rsplit('.', 1)[1].lower()
+    return None
+
+
 def generate_unique_filename(filename):
     """Generate a unique filename to avoid conflicts"""
     if filename and allowed_file(filename):
@@ -24,37 +34,59 @@ def generate_unique_filename(filename):
     return None
 
 
+class UploadRequest(Request):
+    """Request whose image uploads are validated and hashed while they stream in.
+
+    Werkzeug normally spools every file part to a temporary file before the
+    view runs; here parts with an image extension go straight into an
+    IncomingUpload, so a non-image or oversized upload fails on its first
+    chunks instead of after the whole body has been received.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and allowed_file(filename):
+            max_bytes = current_app.config.get('MAX_CONTENT_LENGTH')
+            if max_bytes and content_length and content_length > max_bytes:
+                raise RequestEntityTooLarge()
+            return IncomingUpload(current_app.config['UPLOAD_FOLDER'], max_bytes)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
 def save_uploaded_file(file, upload_folder):
     """
-    Save an uploaded file to the upload folder
+    Save an uploaded file to content-addressed storage in the upload folder
     
     Args:
         file: Flask file object from request.files
-        upload_folder: Path to the upload folder
+        upload_folder: Path to the upload folder (``<static>/uploads``)
     
     Returns:
         str: Relative path to the uploaded file, or None if save failed
+    
+    Raises:
+        UnsupportedMediaType: the content is not a supported image
+        RequestEntityTooLarge: the file exceeds MAX_CONTENT_LENGTH
     """
     if not file or file.filename == '':
         return None
     
-    if not allowed_file(file.filename):
-        return None
-    
-    # Generate unique filename
-    filename = generate_unique_filename(file.filename)
-    if not filename:
+    ext = file_extension(file.filename)
+    if not ext:
         return None
     
-    # Ensure upload folder exists
-    os.makedirs(upload_folder, exist_ok=True)
+    # Identical bytes map to the same uploads/ab/cd/<sha256>.<ext> path;
+    # the extension comes from the sniffed content, not the client's filename
+    static_folder = os.path.dirname(upload_folder)
+    if isinstance(file.stream, IncomingUpload):
+        relative_path = file.stream.commit(static_folder)
+    else:
+        relative_path = store_stream(file.stream, static_folder, current_app.config.get('MAX_CONTENT_LENGTH'))
     
-    # Save file
-    file_path = os.path.join(upload_folder, filename)
-    file.save(file_path)
+    # Resized/EXIF-stripped variants are generated in the background
+    schedule_variants(current_app.static_folder, relative_path)
     
     # Return relative path from static folder
-    return f"uploads/{filename}"
+    return relative_path
 
 
 def delete_file(file_path):
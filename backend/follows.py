@@ -0,0 +1,257 @@
+import threading
+from collections import Counter
+
+from .query import in_list
+from . import timeline
+
+
+# Follow/unfollow writes shared by the single-user routes and the batch API,
+# plus the follow graph read side.
+#
+# users.follower_count / users.following_count are kept by triggers, so a
+# profile or a follow button reads its counters with one primary-key lookup
+# instead of counting an index range of a popular account every time.
+#
+# Each process also keeps the whole follow graph as two adjacency maps,
+# loaded on first use. It is stamped with the data_versions 'follows'
+# counter (bumped by a trigger per follow row written anywhere): writes made
+# through this module patch it in place when nothing else changed the graph
+# in between, any other change makes the next read reload it. Suggestions
+# and mutual follows are then set operations in memory rather than SQL
+# self-joins per request; single-edge checks stay indexed lookups.
+
+FOLLOW_COUNTER_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_follows_count_insert AFTER INSERT ON follows BEGIN
+    UPDATE users SET follower_count = follower_count + 1 WHERE id = NEW.followed_id;
+    UPDATE users SET following_count = following_count + 1 WHERE id = NEW.follower_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_follows_count_delete AFTER DELETE ON follows BEGIN
+    UPDATE users SET follower_count = follower_count - 1 WHERE id = OLD.followed_id;
+    UPDATE users SET following_count = following_count - 1 WHERE id = OLD.follower_id;
+END;
+"""
+
+SUGGESTION_LIMIT = 20
+
+
+def repair_follow_counters(db, commit=True):
+    """Recompute users.follower_count / users.following_count from follows.
+
+    Returns the number of users whose counters were wrong.
+    """
+    cur = db.execute(
+        """
+        UPDATE users SET
+            follower_count = (SELECT COUNT(*) FROM follows WHERE followed_id = users.id),
+            following_count = (SELECT COUNT(*) FROM follows WHERE follower_id = users.id)
+        WHERE follower_count != (SELECT COUNT(*) FROM follows WHERE followed_id = users.id)
+           OR following_count != (SELECT COUNT(*) FROM follows WHERE follower_id = users.id)
+        """
+    )
+    if commit:
+        db.commit()
+    return cur.rowcount
+
+
+def counts(db, user_id):
+    """(followers, following) of a user from the maintained counters."""
+    row = db.execute("SELECT follower_count, following_count FROM users WHERE id = ?", (user_id,)).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def _graph_version(db):
+    row = db.execute("SELECT version FROM data_versions WHERE name = 'follows'").fetchone()
+    return row[0] if row else 0
+
+
+class _Graph:
+    """In-memory adjacency of the follow graph, valid for one 'follows' version."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.following = {}  # user id -> ids they follow
+        self.followers = {}  # user id -> ids following them
+        self.stats = {"loads": 0, "patched": 0}
+
+    def _add(self, follower_id, followed_id):
+        self.following.setdefault(follower_id, set()).add(followed_id)
+        self.followers.setdefault(followed_id, set()).add(follower_id)
+
+    def _remove(self, follower_id, followed_id):
+        self.following.get(follower_id, set()).discard(followed_id)
+        self.followers.get(followed_id, set()).discard(follower_id)
+
+    def current(self, db):
+        """Lock the graph, reloading it first if the database moved on. Use as a context manager."""
+        version = _graph_version(db)
+        self.lock.acquire()
+        try:
+            if self.version != version:
+                self.following, self.followers = {}, {}
+                self.version = None  # until fully loaded
+                for follower_id, followed_id in db.execute("SELECT follower_id, followed_id FROM follows"):
+                    self._add(follower_id, followed_id)
+                self.version = version
+                self.stats["loads"] += 1
+        except Exception:
+            self.lock.release()
+            raise
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+    def applied(self, before, after, edges):
+        """Patch in edges a committed write changed, if the graph was current before it."""
+        with self.lock:
+            if self.version is None or self.version != before:
+                return  # stale or never loaded: the next read reloads
+            for follower_id, followed_id, added in edges:
+                if added:
+                    self._add(follower_id, followed_id)
+                else:
+                    self._remove(follower_id, followed_id)
+            self.version = after
+            self.stats["patched"] += 1
+
+
+_graph = _Graph()
+
+
+def _write(db, fn):
+    """Run fn() -> (result, changed edges) in one write transaction and patch the graph after commit."""
+    if db.in_transaction:
+        db.commit()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # The write lock is held, so before/after bracket exactly our own changes
+        before = _graph_version(db)
+        result, edges = fn()
+        after = _graph_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    _graph.applied(before, after, edges)
+    return result
+
+
+def follow(db, follower_id, followed_id):
+    """Add one follow edge (and backfill the timeline). Returns True if it was new.
+
+    Call inside a transaction; the caller commits.
+    """
+    cur = db.execute("INSERT OR IGNORE INTO follows(follower_id, followed_id) VALUES(?, ?)", (follower_id, followed_id))
+    if cur.rowcount:
+        timeline.on_follow(db, follower_id, followed_id)
+    return bool(cur.rowcount)
+
+
+def unfollow(db, follower_id, followed_id):
+    """Remove one follow edge. Returns True if it existed. The caller commits."""
+    cur = db.execute("DELETE FROM follows WHERE follower_id=? AND followed_id=?", (follower_id, followed_id))
+    if cur.rowcount:
+        timeline.on_unfollow(db, follower_id, followed_id)
+    return bool(cur.rowcount)
+
+
+def set_following(db, follower_id, followed_id, wanted):
+    """Follow or unfollow in its own transaction. Returns the target's (followers, following) after it."""
+    def run():
+        changed = (follow if wanted else unfollow)(db, follower_id, followed_id)
+        return counts(db, followed_id), [(follower_id, followed_id, wanted)] if changed else []
+    return _write(db, run)
+
+
+def apply_batch(db, follower_id, ops):
+    """Follow/unfollow many users in one transaction. `ops` is a list of (username, follow) pairs.
+
+    Repeating a follow or unfollow is a no-op. Returns one dict per op:
+    {"username", "following", "changed", "followers"} or {"username", "error"}
+    with error "not_found" or "self"; follower counts are taken after the batch.
+    """
+    names = sorted({username for username, _ in ops})
+
+    def run():
+        ids = dict(db.execute(
+            "SELECT username, id FROM users WHERE username IN (SELECT value FROM json_each(?))", (in_list(names),)
+        ).fetchall())
+        changed, edges = [], []
+        for username, wanted in ops:
+            target = ids.get(username)
+            if target is None or target == follower_id:
+                changed.append(None)
+                continue
+            was_changed = (follow if wanted else unfollow)(db, follower_id, target)
+            changed.append(was_changed)
+            if was_changed:
+                edges.append((follower_id, target, bool(wanted)))
+        followers = dict(db.execute(
+            "SELECT id, follower_count FROM users WHERE id IN (SELECT value FROM json_each(?))",
+            (in_list(ids.values()),),
+        ).fetchall())
+        return (ids, changed, followers), edges
+
+    ids, changed, followers = _write(db, run)
+    results = []
+    for (username, wanted), was_changed in zip(ops, changed):
+        target = ids.get(username)
+        if target is None:
+            results.append({"username": username, "error": "not_found"})
+        elif target == follower_id:
+            results.append({"username": username, "error": "self"})
+        else:
+            results.append({
+                "username": username,
+                "following": bool(wanted),
+                "changed": was_changed,
+                "followers": followers.get(target, 0),
+            })
+    return results
+
+
+def is_following(db, follower_id, followed_id):
+    # One lookup on the UNIQUE(follower_id, followed_id) index: cheaper than a
+    # graph reload after another process wrote a follow
+    return db.execute(
+        "SELECT 1 FROM follows WHERE follower_id = ? AND followed_id = ?", (follower_id, followed_id)
+    ).fetchone() is not None
+
+
+def mutual_follows(db, viewer_id, user_id):
+    """Ids of users the viewer follows who also follow user_id ("followed by ...")."""
+    with _graph.current(db) as graph:
+        common = graph.following.get(viewer_id, set()) & graph.followers.get(user_id, set())
+    common.discard(user_id)
+    return sorted(common)
+
+
+def suggestions(db, user_id, limit=SUGGESTION_LIMIT):
+    """People the user may know, as [(user id, mutual count)], best first.
+
+    Candidates are followed by people the user follows, or follow the user;
+    each such connection counts once. Users already followed are left out.
+    """
+    with _graph.current(db) as graph:
+        following = graph.following.get(user_id, set())
+        scores = Counter()
+        for friend_id in following:
+            scores.update(graph.following.get(friend_id, ()))
+        scores.update(graph.followers.get(user_id, ()))
+    for skip in following | {user_id}:
+        scores.pop(skip, None)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def stats():
+    with _graph.lock:
+        return {
+            "version": _graph.version,
+            "users": len(_graph.following.keys() | _graph.followers.keys()),
+            "edges": sum(len(s) for s in _graph.following.values()),
+            **_graph.stats,
+        }
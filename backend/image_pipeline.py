@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import make_cache
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# Resized, EXIF-free WebP variants of uploaded images, generated off the
+# request thread. Each upload `uploads/<name>.<ext>` gets
+# `uploads/variants/<name>_<size>.webp` plus a `<name>.json` sidecar listing
+# the widths actually produced (written last, so its presence means "done").
+VARIANT_WIDTHS = {"thumb": 320, "feed": 800, "full": 1600}
+WEBP_QUALITY = 80
+VARIANTS_DIR = "variants"
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("IMAGE_WORKERS") or 2),
+    thread_name_prefix="image-variants",
+)
+_stats_lock = threading.Lock()
+_stats = {"queued": 0, "done": 0, "failed": 0, "skipped": 0}
+# relative upload path -> srcset string. Variants never change once written,
+# but a miss ("" while they are being generated) is only kept briefly.
+_srcset_cache = make_cache("srcset", maxsize=4096, ttl=3600)
+SRCSET_MISS_TTL = 10
+
+
+def _bump(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats, pillow=PIL_AVAILABLE)
+
+
+def _split(relative_path):
+    folder, filename = os.path.split(relative_path)
+    stem = os.path.splitext(filename)[0]
+    return folder, stem
+
+
+def variant_path(relative_path, size):
+    folder, stem = _split(relative_path)
+    return f"{folder}/{VARIANTS_DIR}/{stem}_{size}.webp"
+
+
+def manifest_path(relative_path):
+    folder, stem = _split(relative_path)
+    return f"{folder}/{VARIANTS_DIR}/{stem}.json"
+
+
+def generate_variants(static_folder, relative_path):
+    """Write the WebP variants and sidecar for one upload. Returns the sidecar dict or None."""
+    if not PIL_AVAILABLE:
+        _bump("skipped")
+        return None
+    source = os.path.join(static_folder, relative_path)
+    folder, _ = _split(relative_path)
+    os.makedirs(os.path.join(static_folder, folder, VARIANTS_DIR), exist_ok=True)
+    try:
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            manifest = {}
+            for size, width in VARIANT_WIDTHS.items():
+                if width > img.width and size != "full":
+                    continue
+                variant = img
+                if img.width > width:
+                    height = max(1, round(img.height * width / img.width))
+                    variant = img.resize((width, height), Image.LANCZOS)
+                rel = variant_path(relative_path, size)
+                tmp = os.path.join(static_folder, rel + ".tmp")
+                # Saving without exif= drops EXIF/GPS metadata from the variant
+                variant.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+                os.replace(tmp, os.path.join(static_folder, rel))
+                manifest[size] = {"path": rel, "width": variant.width}
+        sidecar = os.path.join(static_folder, manifest_path(relative_path))
+        with open(sidecar + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh)
+        os.replace(sidecar + ".tmp", sidecar)
+        forget(relative_path)
+        _bump("done")
+        return manifest
+    except Exception as e:
+        _bump("failed")
+        print(f"Image variant generation failed for {relative_path}: {e}")
+        return None
+
+
+def schedule_variants(static_folder, relative_path):
+    """Queue variant generation and return immediately."""
+    if not relative_path or not PIL_AVAILABLE:
+        return None
+    if os.path.exists(os.path.join(static_folder, manifest_path(relative_path))):
+        return None  # content-addressed re-upload: variants already exist
+    _bump("queued")
+    return _executor.submit(generate_variants, static_folder, relative_path)
+
+
+def srcset_for(static_folder, relative_path, url_for_static):
+    """`srcset` value for an upload's WebP variants, or "" if they are not ready (yet)."""
+    if not relative_path or relative_path.startswith(("http://", "https://", "/")):
+        return ""
+    srcset = _srcset_cache.get(relative_path)
+    if srcset is None:
+        srcset = _read_srcset(static_folder, relative_path, url_for_static)
+        _srcset_cache.set(relative_path, srcset, ttl=None if srcset else SRCSET_MISS_TTL)
+    return srcset
+
+
+def _read_srcset(static_folder, relative_path, url_for_static):
+    try:
+        with open(os.path.join(static_folder, manifest_path(relative_path)), encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return ""
+    entries = sorted(manifest.values(), key=lambda v: v["width"])
+    return ", ".join(f"{url_for_static(filename=v['path'])} {v['width']}w" for v in entries)
+
+
+def forget(relative_path):
+    _srcset_cache.delete(relative_path)
+
+
+def remove_variants(static_folder, relative_path):
+    """Delete an upload's variants and sidecar (the upload itself is left alone)."""
+    forget(relative_path)
+    for rel in [variant_path(relative_path, size) for size in VARIANT_WIDTHS] + [manifest_path(relative_path)]:
+        try:
+            os.remove(os.path.join(static_folder, rel))
+        except OSError:
+            pass
@@ -0,0 +1,185 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .database import get_pool
+from .query import in_list
+
+
+# Like toggling.
+#
+# toggle() flips a like in one BEGIN IMMEDIATE transaction: DELETE ...
+# RETURNING tells whether a like existed, otherwise INSERT ... ON CONFLICT
+# adds it (only if the post exists), and the new count comes from
+# posts.like_count, which the counter triggers maintain. Holding the write
+# lock for the whole toggle means two rapid clicks cannot interleave.
+#
+# With LIKE_GROUP_COMMIT=1, toggles are handed to one writer thread per
+# process instead, which applies everything that arrived within
+# LIKE_BATCH_MS in a single transaction, so N likes cost one commit (and
+# one fsync) instead of N.
+GROUP_COMMIT = os.environ.get("LIKE_GROUP_COMMIT", "0") == "1"
+BATCH_MS = float(os.environ.get("LIKE_BATCH_MS") or 5)
+MAX_BATCH = 256
+
+
+def _apply(db, user_id, post_id):
+    """One toggle inside the caller's transaction. Returns (liked, count) or None if the post is missing."""
+    removed = db.execute(
+        "DELETE FROM likes WHERE user_id = ? AND post_id = ? RETURNING post_id", (user_id, post_id)
+    ).fetchall()
+    if removed:
+        liked = False
+    else:
+        added = db.execute(
+            """
+            INSERT INTO likes(user_id, post_id) SELECT ?, id FROM posts WHERE id = ?
+            ON CONFLICT(user_id, post_id) DO NOTHING RETURNING post_id
+            """,
+            (user_id, post_id),
+        ).fetchall()
+        if not added:
+            return None
+        liked = True
+    count = db.execute("SELECT like_count FROM posts WHERE id = ?", (post_id,)).fetchone()[0]
+    return liked, count
+
+
+def _toggle_now(db, user_id, post_id):
+    if db.in_transaction:
+        db.commit()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        result = _apply(db, user_id, post_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+
+class _GroupWriter:
+    """Writer thread that commits queued toggles in batches."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.queue = queue.Queue()
+        self.stats = {"batches": 0, "toggles": 0, "largest_batch": 0}
+        thread = threading.Thread(target=self._run, name="like-writer", daemon=True)
+        thread.start()
+
+    def submit(self, user_id, post_id):
+        future = Future()
+        self.queue.put((user_id, post_id, future))
+        return future
+
+    def _run(self):
+        db = get_pool().acquire()
+        while True:
+            batch = [self.queue.get()]
+            # Let concurrent requests join the batch
+            deadline = time.monotonic() + BATCH_MS / 1000
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(db, batch)
+            except Exception as e:
+                # Keep the thread alive; whoever has no answer yet gets the error
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, db, batch):
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            results = [_apply(db, user_id, post_id) for user_id, post_id, _ in batch]
+            db.commit()
+        except Exception:
+            if db.in_transaction:
+                db.rollback()
+            # Apply them one by one so a single bad toggle does not fail the rest
+            for user_id, post_id, future in batch:
+                try:
+                    future.set_result(_toggle_now(db, user_id, post_id))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+        self.stats["batches"] += 1
+        self.stats["toggles"] += len(batch)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        # A forked worker needs its own thread
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = _GroupWriter()
+        return _writer
+
+
+def toggle(db, user_id, post_id):
+    """Like or unlike a post for a user. Returns (liked, like_count), or None if the post does not exist."""
+    if GROUP_COMMIT:
+        return _get_writer().submit(user_id, post_id).result(timeout=30)
+    return _toggle_now(db, user_id, post_id)
+
+
+def apply_batch(db, user_id, ops):
+    """Set many likes in one transaction. `ops` is a list of (post_id, like) pairs.
+
+    Liking twice or unliking a post that is not liked is a no-op, so a
+    replayed batch leaves the same state. Returns one dict per op:
+    {"post_id", "liked", "count"} or {"post_id", "error": "not_found"};
+    counts are the post's like count after the whole batch.
+    """
+    post_ids = sorted({post_id for post_id, _ in ops})
+    if db.in_transaction:
+        db.commit()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        existing = {r[0] for r in db.execute(
+            "SELECT id FROM posts WHERE id IN (SELECT value FROM json_each(?))", (in_list(post_ids),)
+        ).fetchall()}
+        for post_id, like in ops:
+            if post_id not in existing:
+                continue
+            if like:
+                db.execute("INSERT OR IGNORE INTO likes(user_id, post_id) VALUES (?, ?)", (user_id, post_id))
+            else:
+                db.execute("DELETE FROM likes WHERE user_id = ? AND post_id = ?", (user_id, post_id))
+        counts = dict(db.execute(
+            "SELECT id, like_count FROM posts WHERE id IN (SELECT value FROM json_each(?))", (in_list(post_ids),)
+        ).fetchall())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [
+        {"post_id": post_id, "liked": bool(like), "count": counts[post_id]} if post_id in existing
+        else {"post_id": post_id, "error": "not_found"}
+        for post_id, like in ops
+    ]
+
+
+def stats():
+    writer = _writer
+    return {
+        "group_commit": GROUP_COMMIT,
+        "batch_ms": BATCH_MS,
+        **(dict(writer.stats) if writer is not None else {}),
+    }
@@ -1,9 +1,14 @@
 # backend/main.py
-from flask import Flask
+from flask import Flask, abort, request, send_file, url_for
+from werkzeug.security import safe_join
 from dotenv import load_dotenv
+import mimetypes
 import os
+from . import assets
 from .database import close_db
+from .query import add_server_timing
 from .models import ensure_schema
+from .upload_store import is_immutable
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,8 +25,12 @@ def root():
 def create_app():
     # Defer imports to avoid circulars during setup
     from .routes import register_routes
+    from .commands import register_commands
     register_routes(app)
+    register_commands(app)
     app.teardown_appcontext(close_db)
+    app.after_request(add_server_timing)
+    app.config.setdefault("SERVER_TIMING", os.environ.get("SERVER_TIMING") == "1")
 
     # Performance defaults (safe, behavior-preserving)
     # - gzip/br compression for text responses (templates, css, js, json)
@@ -63,11 +72,39 @@ def create_app():
             path = path or ""
 
         if path.startswith("/static/"):
-            # Static assets: allow browser caching but keep it modest since filenames aren't hashed.
-            resp.headers.setdefault("Cache-Control", "public, max-age=3600")
+            if path.startswith("/static/dist/"):
+                pass  # fingerprinted build output, headers set by dist_asset()
+            elif is_immutable(path[len("/static/"):]) and resp.status_code in (200, 304):
+                # Content-addressed uploads never change under the same URL
+                resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+            else:
+                # Static assets: allow browser caching but keep it modest since filenames aren't hashed.
+                resp.headers.setdefault("Cache-Control", "public, max-age=3600")
         return resp
 
-    # Initialize DB schema inside app context
+    # Fingerprinted assets from `flask build-assets`, served precompressed when the client allows it
+    @app.route("/static/dist/<path:filename>")
+    def dist_asset(filename):
+        full = safe_join(os.path.join(app.static_folder, assets.DIST_DIR), filename)
+        if not full or not os.path.isfile(full):
+            abort(404)
+        path, encoding = assets.pick_encoding(full, request.headers.get("Accept-Encoding"))
+        resp = send_file(path, mimetype=mimetypes.guess_type(full)[0], conditional=True)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        if full.endswith(assets.COMPRESSIBLE):
+            resp.vary.add("Accept-Encoding")
+        resp.headers["Cache-Control"] = assets.IMMUTABLE_CACHE
+        return resp
+
+    @app.template_global()
+    def asset_url(filename):
+        """URL of a static asset, fingerprinted when a build exists."""
+        built = assets.load_manifest(app.static_folder).get(filename)
+        return url_for("static", filename=built or filename)
+
+    # Apply pending schema migrations (a single read when already up to date).
+    # Data cleanup and VACUUM live in the offline `cleanup-db` command.
     with app.app_context():
         ensure_schema()
     return app
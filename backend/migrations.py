@@ -0,0 +1,293 @@
+import sqlite3
+
+from .models import repair_post_counters
+from .search import search_schema
+from . import admin_jobs, chat_history, follows, news_fetcher, page_cache, timeline, upload_store
+
+
+# Versioned schema migrations. Each step runs once, inside a single write
+# transaction, and is recorded in `schema_version`; a process that boots on
+# an up-to-date database only reads MAX(version).
+#
+# Append new steps at the end, never renumber or edit an applied step.
+
+BASE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        bio TEXT DEFAULT '',
+        profile_image TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT (datetime('now'))
+    );
+    
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        author_id INTEGER,
+        author TEXT NOT NULL DEFAULT 'Anonym',
+        content TEXT NOT NULL,
+        image_path TEXT,
+        like_count INTEGER NOT NULL DEFAULT 0,
+        comment_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL DEFAULT (datetime('now'))
+    );
+    
+    CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id INTEGER NOT NULL,
+        author_id INTEGER,
+        author TEXT NOT NULL DEFAULT 'Anonym',
+        text TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT (datetime('now')),
+        FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE,
+        FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE SET NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        image_path TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT (datetime('now'))
+    );
+
+    CREATE TABLE IF NOT EXISTS news (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        image_path TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT (datetime('now'))
+    );
+
+    CREATE TABLE IF NOT EXISTS likes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        post_id INTEGER NOT NULL,
+        UNIQUE(user_id, post_id),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS follows (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        follower_id INTEGER NOT NULL,
+        followed_id INTEGER NOT NULL,
+        UNIQUE(follower_id, followed_id),
+        FOREIGN KEY (follower_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (followed_id) REFERENCES users(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('user', 'bot')),
+        message TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT (datetime('now')),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    );
+    
+    -- Performance indexes
+    CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_posts_created_id ON posts(created_at DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_posts_author_id ON posts(author_id);
+    CREATE INDEX IF NOT EXISTS idx_likes_post_id ON likes(post_id);
+    CREATE INDEX IF NOT EXISTS idx_likes_user_id ON likes(user_id);
+    CREATE INDEX IF NOT EXISTS idx_likes_user_post ON likes(user_id, post_id);
+    CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments(post_id);
+    CREATE INDEX IF NOT EXISTS idx_comments_author_id ON comments(author_id);
+    CREATE INDEX IF NOT EXISTS idx_follows_follower ON follows(follower_id);
+    CREATE INDEX IF NOT EXISTS idx_follows_followed ON follows(followed_id);
+    CREATE INDEX IF NOT EXISTS idx_chat_messages_user_id ON chat_messages(user_id);
+    CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at DESC);
+"""
+
+# Keep posts.like_count / posts.comment_count in step with every write path
+# (routes, admin deletes, ad-hoc SQL) without touching the callers.
+POST_COUNTER_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_likes_count_insert AFTER INSERT ON likes BEGIN
+    UPDATE posts SET like_count = like_count + 1 WHERE id = NEW.post_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_likes_count_delete AFTER DELETE ON likes BEGIN
+    UPDATE posts SET like_count = like_count - 1 WHERE id = OLD.post_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_comments_count_insert AFTER INSERT ON comments BEGIN
+    UPDATE posts SET comment_count = comment_count + 1 WHERE id = NEW.post_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_comments_count_delete AFTER DELETE ON comments BEGIN
+    UPDATE posts SET comment_count = comment_count - 1 WHERE id = OLD.post_id;
+END;
+"""
+
+
+def run_script(db, script):
+    """Execute a multi-statement script without executescript()'s implicit COMMIT."""
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            db.execute(buf)
+            buf = ""
+    if buf.strip():
+        db.execute(buf)
+
+
+def _add_column(db, table, column_sql):
+    """ALTER TABLE ... ADD COLUMN; returns False if the column already exists."""
+    try:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column_sql}")
+        return True
+    except sqlite3.OperationalError as e:
+        if "duplicate column" in str(e):
+            return False
+        raise
+
+
+def _base_schema(db):
+    run_script(db, BASE_SCHEMA)
+
+
+def _legacy_columns(db):
+    # Databases created before these columns were part of BASE_SCHEMA
+    _add_column(db, "posts", "image_path TEXT")
+    _add_column(db, "posts", "author_id INTEGER")
+    _add_column(db, "comments", "author_id INTEGER")
+    _add_column(db, "users", "is_admin BOOLEAN DEFAULT 0")
+
+
+def _post_counters(db):
+    added = _add_column(db, "posts", "like_count INTEGER NOT NULL DEFAULT 0")
+    added = _add_column(db, "posts", "comment_count INTEGER NOT NULL DEFAULT 0") or added
+    run_script(db, POST_COUNTER_TRIGGERS)
+    if added:
+        repair_post_counters(db, commit=False)
+
+
+def _full_text_search(db):
+    run_script(db, search_schema())
+
+
+def _follow_timelines(db):
+    run_script(db, timeline.TIMELINE_SCHEMA)
+    db.execute(
+        """
+        INSERT OR IGNORE INTO timeline_pull_authors(author_id)
+        SELECT followed_id FROM follows GROUP BY followed_id HAVING COUNT(*) > ?
+        """,
+        (timeline.FANOUT_LIMIT,),
+    )
+    # Seed timelines from existing follows (and own posts), newest posts per pair only
+    db.execute(
+        """
+        INSERT OR IGNORE INTO timeline_entries(user_id, post_id, author_id, created_at)
+        SELECT user_id, id, author_id, created_at FROM (
+            SELECT pairs.user_id, p.id, p.author_id, p.created_at,
+                   ROW_NUMBER() OVER (PARTITION BY pairs.user_id, p.author_id
+                                      ORDER BY p.created_at DESC, p.id DESC) AS n
+            FROM (
+                SELECT follower_id AS user_id, followed_id AS author_id FROM follows
+                WHERE followed_id NOT IN (SELECT author_id FROM timeline_pull_authors)
+                UNION
+                SELECT DISTINCT author_id, author_id FROM posts WHERE author_id IS NOT NULL
+            ) AS pairs
+            JOIN posts p ON p.author_id = pairs.author_id
+        ) WHERE n <= ?
+        """,
+        (timeline.FOLLOW_BACKFILL,),
+    )
+
+
+def _upload_refcounts(db):
+    run_script(db, upload_store.blob_schema())
+    upload_store.seed_refcounts(db)
+
+
+def _data_versions(db):
+    _add_column(db, "posts", "version INTEGER NOT NULL DEFAULT 0")
+    run_script(db, page_cache.DATA_VERSION_SCHEMA)
+
+
+def _news_feeds(db):
+    for column_sql in ("link TEXT", "source TEXT", "published_at TEXT", "feed_url TEXT"):
+        _add_column(db, "news", column_sql)
+    run_script(db, news_fetcher.NEWS_SCHEMA)
+
+
+def _chat_history(db):
+    run_script(db, chat_history.CHAT_SCHEMA)
+
+
+def _follow_counters(db):
+    added = _add_column(db, "users", "follower_count INTEGER NOT NULL DEFAULT 0")
+    added = _add_column(db, "users", "following_count INTEGER NOT NULL DEFAULT 0") or added
+    run_script(db, follows.FOLLOW_COUNTER_TRIGGERS)
+    if added:
+        follows.repair_follow_counters(db, commit=False)
+
+
+def _admin_jobs(db):
+    run_script(db, admin_jobs.ADMIN_JOBS_SCHEMA)
+
+
+MIGRATIONS = [
+    (1, "base schema", _base_schema),
+    (2, "legacy columns", _legacy_columns),
+    (3, "post like/comment counters", _post_counters),
+    (4, "full-text search", _full_text_search),
+    (5, "follow timelines", _follow_timelines),
+    (6, "upload refcounts", _upload_refcounts),
+    (7, "data versions", _data_versions),
+    (8, "news feeds", _news_feeds),
+    (9, "chat history", _chat_history),
+    (10, "follower/following counters", _follow_counters),
+    (11, "admin jobs", _admin_jobs),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(db):
+    try:
+        row = db.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def pending_migrations(db):
+    version = current_version(db)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def apply_pending(db, echo=None):
+    """Apply migrations newer than the recorded version. Returns the applied versions.
+
+    Runs under BEGIN IMMEDIATE so workers booting at the same time serialize
+    on the write lock and only the first one does the work.
+    """
+    if current_version(db) >= LATEST_VERSION:
+        return []
+    applied = []
+    db.commit()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT (datetime('now'))
+            )
+            """
+        )
+        for version, name, migrate in pending_migrations(db):
+            if echo:
+                echo(f"Applying migration {version}: {name}")
+            migrate(db)
+            db.execute("INSERT INTO schema_version(version, name) VALUES(?, ?)", (version, name))
+            applied.append(version)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return applied
@@ -1,11 +1,58 @@
+import os
+import threading
 import time
-from datetime import datetime
-from typing import List, Dict, Optional
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple
 
 import feedparser
 
+from .cache import make_cache
+from .database import get_pool
+from .query import in_list
 
-_CACHE: Dict[str, object] = {"data": None, "ts": 0.0}
+
+# News ingestion.
+#
+# A background thread in each worker refreshes the configured feeds with
+# conditional GETs (ETag / Last-Modified), fetching them concurrently, and
+# upserts the normalized entries into the `news` table. `/news` only reads
+# that table, so it always answers instantly with the last good snapshot,
+# and a failed fetch never replaces it.
+#
+# `news_feeds` keeps per-feed validators and a lease: a worker must claim a
+# feed (lease_until in the past, last check older than the interval) before
+# fetching it, so N workers still fetch each feed once per interval.
+DEFAULT_FEEDS = "The Guardian|https://www.theguardian.com/environment/rss"
+REFRESH_INTERVAL = int(os.environ.get("NEWS_REFRESH_INTERVAL") or 900)
+# `?refresh=1` may re-check a feed this often at most
+MIN_REFRESH_INTERVAL = 60
+FETCH_TIMEOUT = float(os.environ.get("NEWS_FETCH_TIMEOUT") or 10)
+KEEP_PER_FEED = int(os.environ.get("NEWS_KEEP_PER_FEED") or 100)
+LEASE_SECONDS = 2 * FETCH_TIMEOUT + 30
+# /news reads go through a short-lived cache; a refresh that stores entries clears
+# it (other processes keep their copy at most for the 60 s TTL)
+_news_cache = make_cache("news", maxsize=32, ttl=60)
+USER_AGENT = "GardenCircle news (+https://github.com/SPSE-Zoska-IV-C/Petelen_GardenCircle)"
+
+NEWS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS news_feeds (
+    url TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL NOT NULL DEFAULT 0,
+    success_at REAL,
+    entries INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_news_link ON news(link);
+CREATE INDEX IF NOT EXISTS idx_news_feed_published ON news(feed_url, published_at DESC, id DESC);
+"""
 
 
 def _pick_best_image(items: list[dict]) -> Optional[str]:
@@ -71,38 +118,208 @@ def _format_date(entry: dict) -> Optional[str]:
     return None
 
 
-def fetch_guardian_environment(limit: int = 12, bypass_cache: bool = False) -> List[Dict[str, str]]:
-    global _CACHE
-    ttl_seconds = 900  # 15 minutes
-    now = time.time()
-    if (not bypass_cache) and _CACHE["data"] and (now - float(_CACHE["ts"])) < ttl_seconds:
-        return _CACHE["data"]  # type: ignore
+def configured_feeds() -> List[Tuple[str, str]]:
+    """(source, url) pairs from NEWS_FEEDS: comma separated `url` or `Source|url` items."""
+    feeds = []
+    for item in (os.environ.get("NEWS_FEEDS") or DEFAULT_FEEDS).split(","):
+        item = item.strip()
+        if not item:
+            continue
+        source, _, url = item.rpartition("|")
+        url = url.strip()
+        feeds.append(((source.strip() or urllib.parse.urlsplit(url).hostname or url), url))
+    return feeds
 
-    feed_url = "https://www.theguardian.com/environment/rss"
-    parsed = feedparser.parse(feed_url)
-    items: List[Dict[str, str]] = []
 
+def _normalize(parsed, source: str) -> List[Dict[str, Optional[str]]]:
+    items = []
     for entry in parsed.entries or []:
-        title = entry.get("title") or ""
         link = entry.get("link") or ""
-        summary = (entry.get("summary") or "").strip()
-        image = _extract_image(entry) or None
-        published_at = _format_date(entry)
-
+        if not link:
+            continue
         items.append({
-            "title": title,
-            "summary": summary,
+            "title": entry.get("title") or "",
+            "summary": (entry.get("summary") or "").strip(),
             "link": link,
-            "image": image,
-            "source": "The Guardian",
-            "published_at": published_at,
+            "image": _extract_image(entry) or None,
+            "source": source,
+            "published_at": _format_date(entry),
         })
+    return items
 
-    # Limit after normalization
-    items = items[:limit]
 
-    _CACHE["data"] = items
-    _CACHE["ts"] = now
-    return items
+def _fetch(url: str, etag: Optional[str], last_modified: Optional[str]) -> Dict[str, object]:
+    """One conditional GET. Runs on a pool thread, so it must not touch the database."""
+    headers = {"User-Agent": USER_AGENT, "Accept": "application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=FETCH_TIMEOUT) as resp:
+            body = resp.read()
+            result = {"status": resp.status, "body": body,
+                      "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    except urllib.error.HTTPError as e:
+        result = {"status": e.code, "error": None if e.code == 304 else f"HTTP {e.code}"}
+    except Exception as e:
+        result = {"status": None, "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def _claim(db, url: str, min_interval: float) -> bool:
+    now = time.time()
+    claimed = db.execute(
+        "UPDATE news_feeds SET lease_until = ? WHERE url = ? AND lease_until <= ? AND checked_at <= ?",
+        (now + LEASE_SECONDS, url, now, now - min_interval),
+    ).rowcount
+    db.commit()
+    return bool(claimed)
+
+
+def _store(db, source: str, url: str, result: Dict[str, object]) -> str:
+    now = time.time()
+    if result["status"] == 304:
+        db.execute("UPDATE news_feeds SET checked_at = ?, success_at = ?, error = NULL, lease_until = 0 WHERE url = ?",
+                   (now, now, url))
+        db.commit()
+        return "not modified"
+    items = []
+    error = result.get("error")
+    if not error:
+        parsed = feedparser.parse(result["body"])
+        items = _normalize(parsed, source)
+        if not items and parsed.get("bozo"):
+            error = f"unparseable feed: {parsed.get('bozo_exception')}"
+    if error:
+        # Keep the last good snapshot; only record the failure
+        db.execute("UPDATE news_feeds SET checked_at = ?, error = ?, lease_until = 0 WHERE url = ?", (now, error, url))
+        db.commit()
+        return f"error: {error}"
+
+    fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")
+    db.executemany(
+        """
+        INSERT INTO news(title, content, image_path, link, source, published_at, feed_url)
+        VALUES (:title, :summary, :image, :link, :source, :published_at, :feed_url)
+        ON CONFLICT(link) DO UPDATE SET
+            title = excluded.title, content = excluded.content, image_path = excluded.image_path,
+            source = excluded.source, feed_url = excluded.feed_url,
+            published_at = COALESCE(excluded.published_at, news.published_at)
+        """,
+        [dict(item, published_at=item["published_at"] or fetched_at, feed_url=url) for item in items],
+    )
+    db.execute(
+        """
+        DELETE FROM news WHERE feed_url = ? AND id NOT IN (
+            SELECT id FROM news WHERE feed_url = ? ORDER BY published_at DESC, id DESC LIMIT ?
+        )
+        """,
+        (url, url, KEEP_PER_FEED),
+    )
+    db.execute(
+        """
+        UPDATE news_feeds SET etag = ?, last_modified = ?, checked_at = ?, success_at = ?,
+            entries = ?, error = NULL, lease_until = 0
+        WHERE url = ?
+        """,
+        (result.get("etag"), result.get("last_modified"), now, now, len(items), url),
+    )
+    db.commit()
+    _news_cache.clear()
+    return f"{len(items)} entries"
+
+
+def refresh_all(db, force: bool = False) -> Dict[str, str]:
+    """Refresh every feed that is due (or, with force, not checked in the last minute).
+
+    Feeds are fetched concurrently; database writes stay on the calling
+    thread. Returns {url: outcome} for the feeds this call claimed.
+    """
+    feeds = configured_feeds()
+    db.executemany("INSERT OR IGNORE INTO news_feeds(url, source) VALUES (?, ?)", [(u, s) for s, u in feeds])
+    db.commit()
+    min_interval = MIN_REFRESH_INTERVAL if force else REFRESH_INTERVAL
+    claimed = []
+    for source, url in feeds:
+        if _claim(db, url, min_interval):
+            row = db.execute("SELECT etag, last_modified FROM news_feeds WHERE url = ?", (url,)).fetchone()
+            claimed.append((source, url, row["etag"], row["last_modified"]))
+    if not claimed:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(8, len(claimed)), thread_name_prefix="news-fetch") as pool:
+        results = list(pool.map(lambda f: _fetch(f[1], f[2], f[3]), claimed))
+    return {url: _store(db, source, url, result) for (source, url, _, _), result in zip(claimed, results)}
+
+
+def latest_news(db, limit: int = 12) -> List[Dict[str, Optional[str]]]:
+    """Newest stored entries of the configured feeds."""
+    urls = [url for _, url in configured_feeds()]
+
+    def load():
+        rows = db.execute(
+            """
+            SELECT title, content, link, image_path, source, published_at FROM news
+            WHERE feed_url IN (SELECT value FROM json_each(?))
+            ORDER BY published_at DESC, id DESC LIMIT ?
+            """,
+            (in_list(urls), limit),
+        ).fetchall()
+        return [
+            {"title": r["title"], "summary": r["content"], "link": r["link"], "image": r["image_path"],
+             "source": r["source"], "published_at": r["published_at"]}
+            for r in rows
+        ]
+
+    return _news_cache.get_or_set((limit, tuple(urls)), load)
+
+
+def feed_status(db) -> List[Dict[str, object]]:
+    urls = [url for _, url in configured_feeds()]
+    rows = db.execute(
+        "SELECT * FROM news_feeds WHERE url IN (SELECT value FROM json_each(?)) ORDER BY url", (in_list(urls),)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+_refresher = {"thread": None, "pid": None}
+_refresher_lock = threading.Lock()
+_wake = threading.Event()
+_force = threading.Event()
+
+
+def _refresh_loop():
+    while True:
+        force = _force.is_set()
+        _force.clear()
+        db = get_pool().acquire()
+        try:
+            refresh_all(db, force=force)
+        except Exception as e:
+            print(f"News refresh failed: {e}")
+        finally:
+            get_pool().release(db)
+        # Wake up regularly: another worker may hold a lease that expires
+        _wake.wait(min(REFRESH_INTERVAL, MIN_REFRESH_INTERVAL))
+        _wake.clear()
+
+
+def start_refresher():
+    """Start this process's refresher thread (idempotent, fork-aware). NEWS_REFRESH=0 disables it."""
+    if os.environ.get("NEWS_REFRESH", "1") == "0":
+        return
+    pid = os.getpid()
+    with _refresher_lock:
+        if _refresher["pid"] == pid and _refresher["thread"].is_alive():
+            return
+        thread = threading.Thread(target=_refresh_loop, name="news-refresher", daemon=True)
+        thread.start()
+        _refresher.update(thread=thread, pid=pid)
 
 
+def request_refresh():
+    """Ask the refresher to re-check feeds now (rate-limited to MIN_REFRESH_INTERVAL per feed)."""
+    _force.set()
+    _wake.set()
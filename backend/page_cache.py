@@ -0,0 +1,162 @@
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from . import assets
+from .cache import make_cache
+from .database import get_db
+from .query import in_list
+
+
+# Rendered-page cache with ETag revalidation.
+#
+# `data_versions` holds one counter per kind of data a page can show; the
+# triggers below bump it on every write, whichever code path makes it.
+# posts.version is the same idea per post (edit, like, comment).
+#
+# A cached view's ETag is a hash of the URL, the viewer, the versions it
+# depends on, the template files and the asset build, so checking it costs one primary-key
+# read instead of the page's queries. A matching If-None-Match gets a 304;
+# otherwise the rendered HTML is served from the page cache when present.
+DATA_VERSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS data_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO data_versions(name) VALUES ('posts'), ('articles'), ('users'), ('follows');
+
+CREATE TRIGGER IF NOT EXISTS trg_dv_posts_insert AFTER INSERT ON posts BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'posts';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dv_posts_delete AFTER DELETE ON posts BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'posts';
+END;
+-- Likes and comments reach posts through the counter triggers
+CREATE TRIGGER IF NOT EXISTS trg_dv_posts_update
+AFTER UPDATE OF content, image_path, like_count, comment_count ON posts BEGIN
+    UPDATE posts SET version = version + 1 WHERE id = new.id;
+    UPDATE data_versions SET version = version + 1 WHERE name = 'posts';
+END;
+-- Comment edits/deletes that leave comment_count alone still change the post page
+CREATE TRIGGER IF NOT EXISTS trg_dv_comments_update AFTER UPDATE ON comments BEGIN
+    UPDATE posts SET version = version + 1 WHERE id = new.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dv_articles_insert AFTER INSERT ON articles BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'articles';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dv_articles_delete AFTER DELETE ON articles BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'articles';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dv_articles_update AFTER UPDATE ON articles BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'articles';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dv_users_insert AFTER INSERT ON users BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'users';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dv_users_delete AFTER DELETE ON users BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'users';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dv_users_update
+AFTER UPDATE OF username, bio, profile_image, is_admin ON users BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'users';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dv_follows_insert AFTER INSERT ON follows BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'follows';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dv_follows_delete AFTER DELETE ON follows BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = 'follows';
+END;
+"""
+
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE") or 256)
+PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL") or 300)
+
+_pages = make_cache("pages", maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+# Response headers replayed with a cached body (e.g. JSON type and paging links)
+_CACHED_HEADERS = ("Content-Type", "Link", "X-Next-Cursor")
+_template_stamp = None
+
+
+def _templates_stamp():
+    """Changes whenever a template file changes, so deploys invalidate old ETags."""
+    global _template_stamp
+    if _template_stamp is None or current_app.debug:
+        folder = os.path.join(current_app.root_path, current_app.template_folder)
+        parts = sorted(f"{e.name}:{e.stat().st_mtime_ns}" for e in os.scandir(folder) if e.is_file())
+        _template_stamp = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12]
+    return _template_stamp
+
+
+def data_versions(db, names):
+    """Current counters for the given data kinds, in the order given."""
+    rows = dict(db.execute(
+        "SELECT name, version FROM data_versions WHERE name IN (SELECT value FROM json_each(?))",
+        (in_list(names),),
+    ).fetchall())
+    return [rows.get(name, 0) for name in names]
+
+
+def post_version(db, post_id):
+    row = db.execute("SELECT version FROM posts WHERE id = ?", (post_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _etag_matches(etag):
+    # Flask-Compress sends compressed responses as "<etag>:gzip" / "<etag>:br"
+    return any(tag == etag or tag.startswith(etag + ":") for tag in request.if_none_match.as_set())
+
+
+def cached_page(*names, key=None):
+    """Serve a GET view from the page cache, revalidated by data version.
+
+    `names` are the data_versions the page depends on; `key(db, **view_args)`
+    may return extra parts (e.g. one post's version). Requests carrying
+    flashed messages bypass the cache, since those render once.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or session.get("_flashes"):
+                return view(*args, **kwargs)
+            db = get_db()
+            parts = [
+                request.full_path,
+                current_user.get_id(),
+                _templates_stamp(),
+                assets.build_stamp(current_app.static_folder),
+                *data_versions(db, names),
+            ]
+            if key is not None:
+                parts.append(key(db, **kwargs))
+            etag = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+            if _etag_matches(etag):
+                resp = make_response("", 304)
+            else:
+                cached = _pages.get(etag)
+                if isinstance(cached, tuple):  # bodies cached by older code are plain bytes
+                    body, headers = cached
+                    resp = make_response(body)
+                    resp.headers.update(headers)
+                else:
+                    resp = make_response(view(*args, **kwargs))
+                    if resp.status_code != 200 or session.get("_flashes"):
+                        return resp
+                    headers = {k: v for k, v in resp.headers.items() if k in _CACHED_HEADERS}
+                    _pages.set(etag, (resp.get_data(), headers))
+            resp.set_etag(etag)
+            # Per-user HTML: browsers may keep it but must revalidate every time
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapper
+    return decorator
+
+
+def stats():
+    return _pages.stats()
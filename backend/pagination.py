@@ -0,0 +1,57 @@
+import base64
+import json
+from typing import Optional, Tuple
+
+
+def encode_token(values: list) -> str:
+    """Pack a sort key into an opaque, URL-safe token."""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_token(token: Optional[str]) -> Optional[list]:
+    """Inverse of encode_token; None if the token is missing or malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        return None
+    return values if isinstance(values, list) else None
+
+
+def encode_cursor(created_at, post_id) -> str:
+    """Build an opaque cursor token pointing just past the given row."""
+    return encode_token([created_at, post_id])
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Return (created_at, id) for a cursor token, or None if missing/invalid."""
+    values = decode_token(token)
+    try:
+        created_at, post_id = values
+        return str(created_at), int(post_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_limit(value, default: int, maximum: int = 100) -> int:
+    """Clamp a user supplied page size to 1..maximum."""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def keyset_page(rows, limit: int):
+    """Split a LIMIT limit+1 result into (page, next_cursor).
+
+    Rows must expose `created_at` and `id` (sqlite3.Row works).
+    """
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    last = page[-1]
+    return page, encode_cursor(last["created_at"], last["id"])
@@ -0,0 +1,121 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g, has_request_context
+from flask_login import current_user
+
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """Key used for statistics: collapse whitespace and variable IN (?,?,...) lists."""
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return _IN_LIST.sub("IN (?...)", sql)
+
+
+def in_list(values):
+    """Bind a list for `IN (SELECT value FROM json_each(?))`.
+
+    The statement text stays the same whatever the list length, so sqlite3's
+    statement cache can reuse it instead of preparing a new IN (?,?,...) variant.
+    """
+    return json.dumps(list(values))
+
+
+class StatementStats:
+    """Per-statement call count, total time and a bounded sample window for percentiles."""
+
+    def __init__(self, samples=512):
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def record(self, sql, seconds):
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                entry = self._data[key] = {"count": 0, "total": 0.0, "max": 0.0, "samples": deque(maxlen=self._samples)}
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["samples"].append(seconds)
+
+    def snapshot(self, limit=None):
+        with self._lock:
+            items = [(sql, dict(e, samples=sorted(e["samples"]))) for sql, e in self._data.items()]
+        result = []
+        for sql, e in items:
+            samples = e["samples"]
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+            result.append({
+                "sql": sql,
+                "count": e["count"],
+                "total_ms": round(e["total"] * 1000, 3),
+                "avg_ms": round(e["total"] / e["count"] * 1000, 3),
+                "p95_ms": round(p95 * 1000, 3),
+                "max_ms": round(e["max"] * 1000, 3),
+            })
+        result.sort(key=lambda item: item["total_ms"], reverse=True)
+        return result[:limit] if limit else result
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+statement_stats = StatementStats()
+
+
+def _record(sql, seconds):
+    statement_stats.record(sql, seconds)
+    if has_request_context():
+        g._sql_count = getattr(g, "_sql_count", 0) + 1
+        g._sql_time = getattr(g, "_sql_time", 0.0) + seconds
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that times every execute().
+
+    The measured time covers preparing the statement and stepping to the
+    first row, which is where SQLite does the work for our LIMIT/aggregate
+    queries; fetching remaining rows is not included.
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(sql, time.perf_counter() - start)
+
+
+def _server_timing_allowed():
+    # Query counts and timings are internal; only show them to admins or when asked to
+    if current_app.debug or current_app.config.get("SERVER_TIMING"):
+        return True
+    return bool(getattr(current_user, "is_admin", False))
+
+
+def add_server_timing(resp):
+    """after_request hook: per-request SQL count/time as a Server-Timing header.
+
+    Sent in debug mode, with SERVER_TIMING=1, or to admin users.
+    """
+    count = getattr(g, "_sql_count", 0)
+    if count and _server_timing_allowed():
+        resp.headers.add("Server-Timing", f'db;dur={g._sql_time * 1000:.2f};desc="{count} queries"')
+    return resp
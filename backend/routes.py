@@ -1,19 +1,24 @@
-from flask import render_template, request, redirect, url_for, jsonify, session, send_from_directory, flash
+from flask import render_template, request, redirect, url_for, jsonify, session, send_from_directory, flash, Response, stream_with_context
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime
+from functools import partial
+import json
 import os
+import sqlite3
 import string
 
-from .database import get_db
+from .database import get_db, get_pool, pool_stats
+from .query import in_list, statement_stats
 from .user import User
-from .file_utils import save_uploaded_file, allowed_file, generate_unique_filename
-from .news_fetcher import fetch_guardian_environment
-
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from .file_utils import UploadRequest, save_uploaded_file, allowed_file, generate_unique_filename
+from . import news_fetcher
+from .feed import fetch_feed_page, fetch_comments, get_post
+from .pagination import parse_limit
+from .search import KINDS as SEARCH_KINDS, search as run_search
+from .page_cache import cached_page, post_version
+from .cache import cache_stats
+from . import admin_jobs, ai_client, ai_jobs, chat_history, follows, image_pipeline, likes, timeline, upload_store
 
 # Admin panel gate: `is_admin` alone persisted across user switches; bind unlock to app user when logged in.
 _ADMIN_UNLOCKED_UID_KEY = "admin_unlocked_uid"
@@ -58,20 +63,158 @@ def validate_registration_password(password: str):
     return True, ""
 
 
+# System prompt for nature/outdoor assistance
+CHAT_SYSTEM_PROMPT = """You are GardenCircle Guide, a friendly AI expert on všetko zo sveta prírody.
+Rozprávaj sa po slovensky a pokrývaj:
+- rastliny a záhradu
+- huby a ich bezpečný zber
+- zvieratá, stopovanie, voľne žijúcu zver
+- počasie, klímu, ekológiu a environmentálne témy
+- turistiku, kempovanie, udržateľné pobyty v prírode a ochranu životného prostredia.
+Buď povzbudivý, poskytuj praktické tipy, zdôrazni bezpečnosť, legislatívu a etiku.
+Ak si nie si istý, daj všeobecné odporúčania alebo bezpečnostné rady a navrhni príbuznú prírodnú tému.
+Odmietni len otázky úplne mimo prírody alebo nebezpečné/ilegálne požiadavky; aj vtedy odpovedz zdvorilo a ponúkni súvisiacu prírodnú oblasť.
+Vždy podporuj udržateľné a legálne správanie."""
+
+
+def _chat_prompt(message, summary=None, turns=()):
+    """System prompt, then the earlier conversation (see chat_history.context_window), then the question."""
+    parts = [CHAT_SYSTEM_PROMPT]
+    if summary:
+        parts.append(f"Zhrnutie staršej konverzácie: {summary}")
+    if turns:
+        lines = [f"{'User' if role == 'user' else 'Assistant'}: {text}" for role, text in turns]
+        parts.append("Conversation so far:\n" + "\n".join(lines))
+    parts.append(f"User question: {message}\n\nAssistant:")
+    return "\n\n".join(parts)
+
+
+def _save_chat(db, user_id, message, reply):
+    """Store one question/answer pair; errors are logged, not raised."""
+    try:
+        db.execute(
+            "INSERT INTO chat_messages (user_id, role, message) VALUES (?, ?, ?), (?, ?, ?)",
+            (user_id, 'user', message, user_id, 'bot', reply)
+        )
+        db.commit()
+    except Exception as db_error:
+        # Log error but don't fail the request
+        print(f"Error saving chat message: {db_error}")
+
+
+def _all_models_failed(error):
+    """User-facing message for a chat reply no model could produce."""
+    last_error = str(error)
+    # If all models failed, try to list available models for debugging
+    try:
+        available_models = ai_client.available_models()
+        model_list = ', '.join(available_models[:5]) if available_models else "žiadne"
+        return f"Žiadny z modelov nefunguje. Dostupné modely: {model_list}. Posledná chyba: {last_error}. Skúste aktualizovať: pip install --upgrade google-generativeai"
+    except Exception:
+        return f"Nepodarilo sa nájsť fungujúci model. Posledná chyba: {last_error}. Skúste aktualizovať google-generativeai: pip install --upgrade google-generativeai"
+
+
+def _ai_busy(error):
+    resp = jsonify({"error": str(error)})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(error.retry_after)
+    return resp
+
+
+BATCH_LIMIT = 1000
+
+
+def _batch_ops(key, flag, kind):
+    """Parse {"ops": [{key: ..., flag: bool}, ...]} into (ops, None) or (None, error response).
+
+    `flag` defaults to true; the whole batch is rejected if an item is malformed.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("ops")
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": "ops must be a non-empty list"}), 400)
+    if len(items) > BATCH_LIMIT:
+        return None, (jsonify({"error": f"at most {BATCH_LIMIT} ops per batch"}), 413)
+    ops = []
+    for i, item in enumerate(items):
+        value = item.get(key) if isinstance(item, dict) else None
+        wanted = item.get(flag, True) if isinstance(item, dict) else None
+        if not isinstance(value, kind) or isinstance(value, bool) or not isinstance(wanted, bool):
+            return None, (jsonify({"error": f"ops[{i}]: expected {{\"{key}\": {kind.__name__}, \"{flag}\": bool}}"}), 400)
+        ops.append((value, wanted))
+    return ops, None
+
+
+def _user_cards(db, ids):
+    """{"id", "username", "profile_image"} for user ids, in the order given (missing users skipped)."""
+    rows = {r["id"]: r for r in db.execute(
+        "SELECT id, username, profile_image FROM users WHERE id IN (SELECT value FROM json_each(?))", (in_list(ids),)
+    ).fetchall()}
+    return [dict(rows[i]) for i in ids if i in rows]
+
+
+def _run_ai_job(kind, fn, asynchronous=False):
+    """Run fn() on the AI pool and answer with its result.
+
+    Asynchronous callers, callers whose job is still unfinished after
+    ai_jobs.SYNC_WAIT seconds and callers arriving while AI_SYNC_WAITERS
+    others are already waiting get 202 with a job id to poll instead.
+    A full pool answers 429 right away.
+    """
+    try:
+        job_id, future = ai_jobs.submit(current_user.id, kind, fn)
+    except ai_jobs.Saturated as e:
+        return _ai_busy(e)
+    if not asynchronous:
+        try:
+            return jsonify(ai_jobs.wait(future))
+        except FutureTimeout:
+            pass
+        except ai_client.AIError as e:
+            return jsonify({"error": str(e)}), 500
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": url_for("api_ai_job", job_id=job_id)}), 202
+
+
 def register_routes(app):
     login_manager.init_app(app)
     app.secret_key = os.environ.get("SECRET_KEY", "dev-secret-key-change-in-production")
     
     # Configure file upload settings
     app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
-    app.config['UPLOAD_FOLDER'] = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static", "uploads"))
+    # Uploads live under the static folder: collect() and the /static/ route resolve paths against it
+    app.config.setdefault('UPLOAD_FOLDER', os.path.abspath(os.path.join(app.static_folder, "uploads")))
     
     upload_dir = app.config['UPLOAD_FOLDER']
     os.makedirs(upload_dir, exist_ok=True)
+    # Validate and hash uploaded images while the request body streams in
+    app.request_class = UploadRequest
+
+    @app.template_global()
+    def upload_srcset(path):
+        """srcset of an upload's WebP variants ("" until they have been generated)."""
+        return image_pipeline.srcset_for(app.static_folder, path, partial(url_for, 'static'))
 
     def is_ajax_request():
         return request.headers.get("X-Requested-With") == "XMLHttpRequest"
 
+    def _requested_feed():
+        # "all" = global stream, "following" = personalized timeline
+        return "following" if request.args.get("feed") == "following" else "all"
+
+    @app.errorhandler(413)
+    @app.errorhandler(415)
+    def upload_rejected(error):
+        # Raised while the upload is still streaming in (see UploadRequest)
+        if error.code == 413:
+            message = f"Súbor je príliš veľký (max. {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB)."
+        else:
+            message = error.description
+        if is_ajax_request() or request.path.startswith("/api/"):
+            return jsonify({"error": message}), error.code
+        flash(message, "error")
+        back = request.referrer if (request.referrer or "").startswith(request.host_url) else url_for('home')
+        return redirect(back)
+
     # Authentication Routes
     @app.route("/login", methods=["GET", "POST"])
     def login():
@@ -85,8 +228,8 @@ def register_routes(app):
             if not username or not password:
                 return render_template("login.html", error="Prosím vyplň všetky polia")
             
-            user = User.get_by_username(username)
-            if user and user.check_password(password):
+            user = User.authenticate(username, password)
+            if user:
                 login_user(user)
                 _clear_admin_gate_session()
                 return redirect(url_for('posts_page'))
@@ -142,69 +285,20 @@ def register_routes(app):
     # Profile Routes
     @app.route("/user/<username>")
     @login_required
+    @cached_page("posts", "users", "follows")
     def user_profile(username):
         user = User.get_by_username(username)
         if not user:
             return render_template("404.html"), 404
         
         db = get_db()
-        # Get posts with same structure as posts page
-        rows = db.execute(
-            "SELECT id, author_id, author, content, created_at, image_path FROM posts WHERE author_id = ? ORDER BY created_at DESC",
-            (user.id,)
-        ).fetchall()
-        
-        if not rows:
-            posts = []
-        else:
-            # Bulk fetch all like counts and comment counts
-            post_ids = [r[0] for r in rows]
-            placeholders = ','.join('?' * len(post_ids))
-            
-            # Get all like counts in one query
-            like_counts = db.execute(
-                f"SELECT post_id, COUNT(*) as count FROM likes WHERE post_id IN ({placeholders}) GROUP BY post_id",
-                post_ids
-            ).fetchall()
-            like_counts_dict = {row[0]: row[1] for row in like_counts}
-            
-            # Get all comment counts in one query
-            comment_counts = db.execute(
-                f"SELECT post_id, COUNT(*) as count FROM comments WHERE post_id IN ({placeholders}) GROUP BY post_id",
-                post_ids
-            ).fetchall()
-            comment_counts_dict = {row[0]: row[1] for row in comment_counts}
-            
-            # Get all liked posts for current user in one query
-            liked_posts = set()
-            if current_user.is_authenticated:
-                liked_rows = db.execute(
-                    f"SELECT post_id FROM likes WHERE post_id IN ({placeholders}) AND user_id = ?",
-                    post_ids + [current_user.id]
-                ).fetchall()
-                liked_posts = {row[0] for row in liked_rows}
-            
-            # Format posts with all data
-            posts = []
-            for r in rows:
-                post_id = r[0]
-                posts.append({
-                    "id": post_id,
-                    "author_id": r[1],
-                    "author": r[2],
-                    "content": r[3],
-                    "created_at": r[4],
-                    "image_path": r[5],
-                    "like_count": like_counts_dict.get(post_id, 0),
-                    "liked": post_id in liked_posts,
-                    "comment_count": comment_counts_dict.get(post_id, 0)
-                })
+        # Same hydrated shape as the posts page; the whole profile stays on one page
+        posts, _ = fetch_feed_page(db, current_user.id, author_id=user.id, limit=None)
         
-        followers = db.execute("SELECT COUNT(1) FROM follows WHERE followed_id=?", (user.id,)).fetchone()[0]
-        following = db.execute("SELECT COUNT(1) FROM follows WHERE follower_id=?", (user.id,)).fetchone()[0]
+        followers, following = follows.counts(db, user.id)
         is_following = False
         if current_user.is_authenticated and current_user.id != user.id:
-            is_following = db.execute("SELECT 1 FROM follows WHERE follower_id=? AND followed_id=?", (current_user.id, user.id)).fetchone() is not None
+            is_following = follows.is_following(db, current_user.id, user.id)
         return render_template("profile.html", user=user, posts=posts, followers=followers, following=following, is_following=is_following)
 
     @app.route("/edit-profile", methods=["GET", "POST"])
@@ -228,6 +322,8 @@ def register_routes(app):
                     current_user.update_profile_image(profile_image_url)
             elif profile_image_url:
                 current_user.update_profile_image(profile_image_url)
+            # A replaced profile picture may have been the last reference to its file
+            upload_store.collect(get_db(), app.static_folder)
             
             flash("Profil bol aktualizovaný", "success")
             return redirect(url_for('user_profile', username=current_user.username))
@@ -249,74 +345,20 @@ def register_routes(app):
 
     @app.route("/posts", methods=["GET"])
     @login_required
+    @cached_page("posts", "users", "follows")
     def posts_page():
         db = get_db()
-        # Optimized query with pagination (limit 20 posts)
-        limit = 20
-        rows = db.execute(
-            "SELECT id, author_id, author, content, created_at, image_path FROM posts ORDER BY created_at DESC LIMIT ?",
-            (limit,)
-        ).fetchall()
-        
-        if not rows:
-            return render_template("posts.html", posts=[])
-        
-        # Bulk fetch all like counts and comment counts in 2 queries instead of N queries
-        post_ids = [r[0] for r in rows]
-        placeholders = ','.join('?' * len(post_ids))
-
-        # Fetch author avatars for all authors in this page
-        author_ids = [r[1] for r in rows if r[1] is not None]
-        author_map = {}
-        if author_ids:
-            author_placeholders = ','.join('?' * len(author_ids))
-            author_rows = db.execute(
-                f"SELECT id, profile_image FROM users WHERE id IN ({author_placeholders})",
-                author_ids
-            ).fetchall()
-            author_map = {row[0]: row[1] for row in author_rows}
-        
-        # Get all like counts in one query
-        like_counts = db.execute(
-            f"SELECT post_id, COUNT(*) as count FROM likes WHERE post_id IN ({placeholders}) GROUP BY post_id",
-            post_ids
-        ).fetchall()
-        like_counts_dict = {row[0]: row[1] for row in like_counts}
-        
-        # Get all comment counts in one query
-        comment_counts = db.execute(
-            f"SELECT post_id, COUNT(*) as count FROM comments WHERE post_id IN ({placeholders}) GROUP BY post_id",
-            post_ids
-        ).fetchall()
-        comment_counts_dict = {row[0]: row[1] for row in comment_counts}
-        
-        # Get all liked posts for current user in one query
-        liked_posts = set()
-        if current_user.is_authenticated:
-            liked_rows = db.execute(
-                f"SELECT post_id FROM likes WHERE post_id IN ({placeholders}) AND user_id = ?",
-                post_ids + [current_user.id]
-            ).fetchall()
-            liked_posts = {row[0] for row in liked_rows}
-        
-        posts = []
-        for r in rows:
-            posts.append({
-                "id": r[0],
-                "author_id": r[1],
-                "author": r[2],
-                "author_image": author_map.get(r[1]),
-                "content": r[3],
-                "created_at": r[4],
-                "image_path": r[5],
-                "like_count": like_counts_dict.get(r[0], 0),
-                "liked": r[0] in liked_posts,
-                "comment_count": comment_counts_dict.get(r[0], 0),
-            })
-        return render_template("posts.html", posts=posts)
+        feed = _requested_feed()
+        # Keyset pagination on (created_at, id): older pages cost the same as the first one
+        if feed == "following":
+            posts, next_cursor = timeline.timeline_page(db, current_user.id, request.args.get("cursor"), limit=20)
+        else:
+            posts, next_cursor = fetch_feed_page(db, current_user.id, request.args.get("cursor"), limit=20)
+        return render_template("posts.html", posts=posts, next_cursor=next_cursor, feed=feed)
 
     @app.route("/api/posts", methods=["GET", "POST"])
     @login_required
+    @cached_page("posts", "users", "follows")
     def posts():
         db = get_db()
         if request.method == "POST":
@@ -336,6 +378,7 @@ def register_routes(app):
                 "INSERT INTO posts(author_id, author, content, image_path) VALUES(?, ?, ?, ?)",
                 (current_user.id, current_user.username, content, image_path)
             )
+            timeline.fan_out_post(db, cur.lastrowid, current_user.id)
             db.commit()
             if request.content_type and "application/json" in request.content_type:
                 return jsonify({
@@ -344,149 +387,52 @@ def register_routes(app):
                 }), 201
             return redirect(url_for('posts_page'))
         else:
-            # Optimized: limit results and use bulk queries
-            limit = 30
-            rows = db.execute(
-                "SELECT id, author_id, author, content, created_at, image_path FROM posts ORDER BY created_at DESC LIMIT ?",
-                (limit,)
-            ).fetchall()
-            
-            if not rows:
-                return jsonify([])
-            
-            # Bulk fetch counts
-            post_ids = [r[0] for r in rows]
-            placeholders = ','.join('?' * len(post_ids))
-
-            # Fetch author avatars
-            author_ids = [r[1] for r in rows if r[1] is not None]
-            author_map = {}
-            if author_ids:
-                author_placeholders = ','.join('?' * len(author_ids))
-                author_rows = db.execute(
-                    f"SELECT id, profile_image FROM users WHERE id IN ({author_placeholders})",
-                    author_ids
-                ).fetchall()
-                author_map = {row[0]: row[1] for row in author_rows}
-            
-            like_counts = db.execute(
-                f"SELECT post_id, COUNT(*) as count FROM likes WHERE post_id IN ({placeholders}) GROUP BY post_id",
-                post_ids
-            ).fetchall()
-            like_counts_dict = {row[0]: row[1] for row in like_counts}
-            
-            comment_counts = db.execute(
-                f"SELECT post_id, COUNT(*) as count FROM comments WHERE post_id IN ({placeholders}) GROUP BY post_id",
-                post_ids
-            ).fetchall()
-            comment_counts_dict = {row[0]: row[1] for row in comment_counts}
-            
-            liked_posts = set()
-            if current_user.is_authenticated:
-                liked_rows = db.execute(
-                    f"SELECT post_id FROM likes WHERE post_id IN ({placeholders}) AND user_id = ?",
-                    post_ids + [current_user.id]
-                ).fetchall()
-                liked_posts = {row[0] for row in liked_rows}
-            
-            data = []
-            for r in rows:
-                data.append({
-                    "id": r[0],
-                    "author_id": r[1],
-                    "author": r[2],
-                    "author_image": author_map.get(r[1]),
-                    "content": r[3],
-                    "created_at": r[4],
-                    "image_path": r[5],
-                    "like_count": like_counts_dict.get(r[0], 0),
-                    "liked": r[0] in liked_posts,
-                    "comment_count": comment_counts_dict.get(r[0], 0)
-                })
-            return jsonify(data)
+            # Keyset pagination: pass back `next_cursor` as `?cursor=` to load older posts
+            limit = parse_limit(request.args.get("limit"), default=30)
+            feed = _requested_feed()
+            if feed == "following":
+                data, next_cursor = timeline.timeline_page(db, current_user.id, request.args.get("cursor"), limit=limit)
+            else:
+                data, next_cursor = fetch_feed_page(db, current_user.id, request.args.get("cursor"), limit=limit)
+            if request.args.get("paged") == "1":
+                return jsonify({"posts": data, "next_cursor": next_cursor})
+            # Original shape: a bare list, with the next page in the headers
+            resp = jsonify(data)
+            if next_cursor:
+                extra = {"feed": feed} if feed == "following" else {}
+                next_url = url_for("posts", cursor=next_cursor, limit=limit, **extra)
+                resp.headers["X-Next-Cursor"] = next_cursor
+                resp.headers["Link"] = f'<{next_url}>; rel="next"'
+            return resp
 
     @app.route("/posts/<int:post_id>")
     @login_required
+    @cached_page("users", key=lambda db, post_id: post_version(db, post_id))
     def post_detail(post_id: int):
         db = get_db()
-        pc = db.execute("SELECT id, author_id, author, content, created_at, image_path FROM posts WHERE id=?", (post_id,)).fetchone()
-        if not pc:
+        post = get_post(db, post_id, current_user.id)
+        if not post:
             return render_template("404.html"), 404
-        like_count = db.execute("SELECT COUNT(1) FROM likes WHERE post_id=?", (post_id,)).fetchone()[0]
-        liked = db.execute("SELECT 1 FROM likes WHERE post_id=? AND user_id=?", (post_id, current_user.id)).fetchone() is not None
-        comments = db.execute(
-            "SELECT id, author_id, author, text, created_at FROM comments WHERE post_id=? ORDER BY created_at ASC",
-            (post_id,),
-        ).fetchall()
-        comment_author_ids = [r[1] for r in comments if r[1] is not None]
-        comment_author_map = {}
-        if comment_author_ids:
-            ca_placeholders = ','.join('?' * len(comment_author_ids))
-            comment_author_rows = db.execute(
-                f"SELECT id, profile_image FROM users WHERE id IN ({ca_placeholders})",
-                comment_author_ids
-            ).fetchall()
-            comment_author_map = {row[0]: row[1] for row in comment_author_rows}
-
-        comments_fmt = [
-            {
-                "id": r[0],
-                "author_id": r[1],
-                "author": r[2],
-                "author_image": comment_author_map.get(r[1]),
-                "text": r[3],
-                "created_at": r[4]
-            } for r in comments
-        ]
-        post_author_image = None
-        if pc[1]:
-            post_author_image = comment_author_map.get(pc[1])
-            if post_author_image is None:
-                row = db.execute("SELECT profile_image FROM users WHERE id=?", (pc[1],)).fetchone()
-                post_author_image = row[0] if row else None
-
-        post = {
-            "id": pc[0],
-            "author_id": pc[1],
-            "author": pc[2],
-            "author_image": post_author_image,
-            "content": pc[3],
-            "created_at": pc[4],
-            "image_path": pc[5],
-            "like_count": like_count,
-            "liked": liked
-        }
-        return render_template("post.html", post=post, comments=comments_fmt)
+        return render_template("post.html", post=post, comments=fetch_comments(db, post_id))
 
     @app.route("/api/posts/<int:post_id>/comments", methods=["GET", "POST"])
     @login_required
     def add_comment(post_id: int):
         db = get_db()
         if request.method == "GET":
-            rows = db.execute(
-                "SELECT id, author_id, author, text, created_at FROM comments WHERE post_id=? ORDER BY created_at ASC",
-                (post_id,),
-            ).fetchall()
-            author_ids = [r[1] for r in rows if r[1] is not None]
-            author_map = {}
-            if author_ids:
-                a_placeholders = ','.join('?' * len(author_ids))
-                a_rows = db.execute(
-                    f"SELECT id, profile_image FROM users WHERE id IN ({a_placeholders})",
-                    author_ids
-                ).fetchall()
-                author_map = {row[0]: row[1] for row in a_rows}
-            return jsonify([
-                {"id": r[0], "author_id": r[1], "author": r[2], "author_image": author_map.get(r[1]), "text": r[3], "created_at": r[4]} for r in rows
-            ])
+            return jsonify(fetch_comments(db, post_id))
         data = request.get_json(silent=True) or request.form
         text = (data.get("text") or "").strip()
         if not text.strip():
             return jsonify({"error": "Text required"}), 400
-        cur = db.execute(
-            "INSERT INTO comments(post_id, author_id, author, text) VALUES(?, ?, ?, ?)",
-            (post_id, current_user.id, current_user.username, text)
-        )
+        try:
+            cur = db.execute(
+                "INSERT INTO comments(post_id, author_id, author, text) VALUES(?, ?, ?, ?)",
+                (post_id, current_user.id, current_user.username, text)
+            )
+        except sqlite3.IntegrityError:
+            # foreign_keys is on: the post no longer exists
+            return jsonify({"error": "Not found"}), 404
         db.commit()
         if request.content_type and "application/json" in request.content_type:
             return jsonify({"id": cur.lastrowid, "author": current_user.username, "author_id": current_user.id, "author_image": current_user.profile_image, "text": text}), 201
@@ -504,21 +450,6 @@ def register_routes(app):
         if not post:
             return jsonify({"error": "Príspevok sa nenašiel."}), 404
 
-        api_key = os.getenv("GOOGLE_AI_STUDIO_API_KEY")
-        if not api_key:
-            return jsonify({"error": "AI nie je nastavená. Skontroluj API kľúč."}), 500
-        if not GEMINI_AVAILABLE:
-            return jsonify({"error": "Chýba balíček google-generativeai."}), 500
-
-        genai.configure(api_key=api_key)
-        model_names = [
-            'gemini-2.5-flash',
-            'gemini-2.5-pro-preview-05-06',
-            'gemini-2.5-flash-preview-05-20',
-            'gemini-2.5-pro-preview-03-25',
-            'gemini-pro',
-        ]
-
         payload = request.get_json(silent=True) or {}
         answer_length = (payload.get("length") or "short").lower()
         if answer_length not in ("short", "long"):
@@ -540,28 +471,24 @@ def register_routes(app):
         Vytvor odpoveď."""
 
         full_prompt = system_prompt.format(post_content=post["content"])
-        response = None
-        last_error = None
-        for model_name in model_names:
+        content = post["content"]
+
+        def answer():
             try:
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content(full_prompt)
-                break
-            except Exception as e:
-                last_error = str(e)
-                continue
-
-        if response is None or not getattr(response, "text", "").strip():
-            return jsonify({"error": f"AI odpoveď sa nepodarila: {last_error or 'neznáma chyba'}"}), 500
-
-        reply = response.text.strip()
-        reply = reply[:max_chars]
-
-        # Return reply only to the requesting user; do NOT persist to DB.
-        return jsonify({
-            "author": "GardenCircle Guide",
-            "text": reply
-        })
+                reply = ai_client.post_answer(post_id, content, answer_length, full_prompt)
+            except ai_client.AINotConfigured:
+                raise
+            except ai_client.AIError as e:
+                raise ai_client.AIError(f"AI odpoveď sa nepodarila: {e}")
+            if not reply:
+                raise ai_client.AIError("AI odpoveď sa nepodarila: neznáma chyba")
+            # Return reply only to the requesting user; do NOT persist to DB.
+            return {"author": "GardenCircle Guide", "text": reply[:max_chars]}
+
+        cached = ai_client.cached_answer(post_id, content, answer_length)
+        if cached:
+            return jsonify({"author": "GardenCircle Guide", "text": cached[:max_chars]})
+        return _run_ai_job("answer", answer, bool(payload.get("async")))
 
     @app.route("/api/posts/<int:post_id>", methods=["DELETE"])
     @login_required
@@ -570,30 +497,21 @@ def register_routes(app):
         # Check if user owns the post
         post = db.execute("SELECT author_id FROM posts WHERE id=?", (post_id,)).fetchone()
         if post and post[0] == current_user.id:
+            # Delete the post first so the counter triggers on likes/comments have nothing to update
             db.execute("DELETE FROM posts WHERE id=?", (post_id,))
+            db.execute("DELETE FROM comments WHERE post_id=?", (post_id,))
+            db.execute("DELETE FROM likes WHERE post_id=?", (post_id,))
             db.commit()
+            upload_store.collect(db, app.static_folder)
         return ("", 204)
 
     @app.route("/like/<int:post_id>", methods=["POST"])
     @login_required
     def toggle_like(post_id: int):
-        db = get_db()
-        exists = db.execute("SELECT 1 FROM posts WHERE id=?", (post_id,)).fetchone()
-        if not exists:
+        result = likes.toggle(get_db(), current_user.id, post_id)
+        if result is None:
             return jsonify({"error": "Not found"}), 404
-        liked = db.execute("SELECT 1 FROM likes WHERE post_id=? AND user_id=?", (post_id, current_user.id)).fetchone() is not None
-        if liked:
-            db.execute("DELETE FROM likes WHERE post_id=? AND user_id=?", (post_id, current_user.id))
-            db.commit()
-            liked = False
-        else:
-            try:
-                db.execute("INSERT OR IGNORE INTO likes(user_id, post_id) VALUES(?, ?)", (current_user.id, post_id))
-                db.commit()
-                liked = True
-            except Exception:
-                pass
-        count = db.execute("SELECT COUNT(1) FROM likes WHERE post_id=?", (post_id,)).fetchone()[0]
+        liked, count = result
         return jsonify({"liked": liked, "count": count})
 
     @app.route("/follow/<username>", methods=["POST"])
@@ -602,13 +520,8 @@ def register_routes(app):
         target = User.get_by_username(username)
         if not target or target.id == current_user.id:
             return jsonify({"error": "Invalid user"}), 400
-        db = get_db()
-        db.execute("INSERT OR IGNORE INTO follows(follower_id, followed_id) VALUES(?, ?)", (current_user.id, target.id))
-        db.commit()
-        followers = db.execute("SELECT COUNT(1) FROM follows WHERE followed_id=?", (target.id,)).fetchone()[0]
-        # following_count here should reflect how many users the PROFILE OWNER follows,
-        # not how many users the current viewer follows.
-        following = db.execute("SELECT COUNT(1) FROM follows WHERE follower_id=?", (target.id,)).fetchone()[0]
+        # following_count is how many users the PROFILE OWNER follows, not the viewer
+        followers, following = follows.set_following(get_db(), current_user.id, target.id, True)
         return jsonify({"following": True, "followers": followers, "following_count": following})
 
     @app.route("/unfollow/<username>", methods=["POST"])
@@ -617,24 +530,77 @@ def register_routes(app):
         target = User.get_by_username(username)
         if not target or target.id == current_user.id:
             return jsonify({"error": "Invalid user"}), 400
-        db = get_db()
-        db.execute("DELETE FROM follows WHERE follower_id=? AND followed_id=?", (current_user.id, target.id))
-        db.commit()
-        followers = db.execute("SELECT COUNT(1) FROM follows WHERE followed_id=?", (target.id,)).fetchone()[0]
         # As above, keep following_count tied to the profile owner.
-        following = db.execute("SELECT COUNT(1) FROM follows WHERE follower_id=?", (target.id,)).fetchone()[0]
+        followers, following = follows.set_following(get_db(), current_user.id, target.id, False)
         return jsonify({"following": False, "followers": followers, "following_count": following})
 
+    @app.route("/api/likes/batch", methods=["POST"])
+    @login_required
+    def api_likes_batch():
+        """Like/unlike many posts at once: {"ops": [{"post_id": 1, "like": true}, ...]}."""
+        ops, error = _batch_ops("post_id", "like", int)
+        if error:
+            return error
+        return jsonify({"results": likes.apply_batch(get_db(), current_user.id, ops)})
+
+    @app.route("/api/follows/batch", methods=["POST"])
+    @login_required
+    def api_follows_batch():
+        """Follow/unfollow many users at once: {"ops": [{"username": "eva", "follow": true}, ...]}."""
+        ops, error = _batch_ops("username", "follow", str)
+        if error:
+            return error
+        return jsonify({"results": follows.apply_batch(get_db(), current_user.id, ops)})
+
+    @app.route("/api/users/suggestions")
+    @login_required
+    def api_user_suggestions():
+        """People the current user may know, with how many of their connections know them (?limit=)."""
+        db = get_db()
+        limit = parse_limit(request.args.get("limit"), default=10, maximum=follows.SUGGESTION_LIMIT)
+        scored = dict(follows.suggestions(db, current_user.id, limit))
+        return jsonify({"users": [dict(card, mutual_count=scored[card["id"]]) for card in _user_cards(db, list(scored))]})
+
+    @app.route("/api/users/<username>/mutuals")
+    @login_required
+    def api_user_mutuals(username):
+        """Users the current user follows who also follow `username`."""
+        target = User.get_by_username(username)
+        if not target:
+            return jsonify({"error": "Not found"}), 404
+        db = get_db()
+        ids = follows.mutual_follows(db, current_user.id, target.id)
+        return jsonify({"count": len(ids), "users": _user_cards(db, ids[:50])})
+
+    @app.route("/api/search")
+    @login_required
+    def api_search():
+        """Full-text search over posts, comments and articles (?q=, ?type=post,comment,article, ?cursor=)."""
+        kinds = [k.strip() for k in (request.args.get("type") or "").split(",") if k.strip()] or SEARCH_KINDS
+        limit = parse_limit(request.args.get("limit"), default=20, maximum=50)
+        results, next_cursor = run_search(get_db(), request.args.get("q", ""), kinds, request.args.get("cursor"), limit)
+        if results is None:
+            return jsonify({"error": "Query required"}), 400
+        for item in results:
+            if item["kind"] == "article":
+                item["url"] = url_for("article_detail", article_id=item["id"])
+            else:
+                item["url"] = url_for("post_detail", post_id=item["post_id"])
+        return jsonify({"results": results, "next_cursor": next_cursor})
+
     @app.route("/articles")
     @login_required
+    @cached_page("articles")
     def articles():
         db = get_db()
-        rows = db.execute("SELECT id, title, content, image_path, created_at FROM articles ORDER BY created_at DESC").fetchall()
-        items = [{"id":r[0],"title":r[1],"content":r[2],"image_path":r[3],"created_at":r[4]} for r in rows]
+        # The list shows a 150-character teaser, so don't load whole articles
+        rows = db.execute("SELECT id, title, substr(content, 1, 151), image_path, created_at FROM articles ORDER BY created_at DESC").fetchall()
+        items = [{"id":r[0],"title":r[1],"excerpt":r[2],"image_path":r[3],"created_at":r[4]} for r in rows]
         return render_template("articles.html", items=items)
 
     @app.route("/articles/<int:article_id>")
     @login_required
+    @cached_page("articles")
     def article_detail(article_id: int):
         db = get_db()
         row = db.execute("SELECT id, title, content, image_path, created_at FROM articles WHERE id=?", (article_id,)).fetchone()
@@ -646,14 +612,19 @@ def register_routes(app):
     @app.route("/news")
     @login_required
     def news():
+        # Always the stored snapshot; fetching happens on the background refresher
+        news_fetcher.start_refresher()
+        if request.args.get("refresh") in ("1", "true", "yes"):
+            news_fetcher.request_refresh()
+        db = get_db()
         error_message = None
-        try:
-            bypass_cache = request.args.get("refresh") in ("1", "true", "yes")
-            articles = fetch_guardian_environment(limit=12, bypass_cache=bypass_cache)
-        except Exception:
-            articles = []
-            error_message = "Couldn't load news at the moment. Please try again later."
-
+        articles = news_fetcher.latest_news(db, limit=12)
+        if not articles:
+            feeds = news_fetcher.feed_status(db)
+            if any(f["error"] for f in feeds):
+                error_message = "Couldn't load news at the moment. Please try again later."
+            elif not any(f["success_at"] for f in feeds):
+                error_message = "Novinky sa práve načítavajú, skúste to o chvíľu znova."
         return render_template("news.html", articles=articles, error_message=error_message)
 
     @app.route("/about")
@@ -682,122 +653,122 @@ def register_routes(app):
             if not message:
                 return jsonify({"error": "Message is required"}), 400
             
-            # Get API key from environment variable
-            api_key = os.getenv("GOOGLE_AI_STUDIO_API_KEY")
-            
-            if not api_key:
+            if not ai_client.api_key():
                 return jsonify({
                     "error": "Google AI Studio API key not configured. Please set GOOGLE_AI_STUDIO_API_KEY environment variable."
                 }), 500
             
-            if not GEMINI_AVAILABLE:
+            if not ai_client.GEMINI_AVAILABLE:
                 return jsonify({
                     "error": "Google Generative AI library not installed. Please run: pip install google-generativeai"
                 }), 500
             
-            # Configure Gemini API
-            genai.configure(api_key=api_key)
-            
-            
-            model_names = [
-                'gemini-2.5-flash',  # Stable flash version (fastest)
-                'gemini-2.5-pro-preview-05-06',  # Latest pro preview
-                'gemini-2.5-flash-preview-05-20',  # Latest flash preview
-                'gemini-2.5-pro-preview-03-25',  # Older pro preview
-                'gemini-pro',  # Fallback to original (may not work)
-            ]
-            
-            model = None
-            last_error = None
-            
-            # Create a system prompt for nature/outdoor assistance
-            system_prompt = """You are GardenCircle Guide, a friendly AI expert on všetko zo sveta prírody.
-            Rozprávaj sa po slovensky a pokrývaj:
-            - rastliny a záhradu
-            - huby a ich bezpečný zber
-            - zvieratá, stopovanie, voľne žijúcu zver
-            - počasie, klímu, ekológiu a environmentálne témy
-            - turistiku, kempovanie, udržateľné pobyty v prírode a ochranu životného prostredia.
-            Buď povzbudivý, poskytuj praktické tipy, zdôrazni bezpečnosť, legislatívu a etiku.
-            Ak si nie si istý, daj všeobecné odporúčania alebo bezpečnostné rady a navrhni príbuznú prírodnú tému.
-            Odmietni len otázky úplne mimo prírody alebo nebezpečné/ilegálne požiadavky; aj vtedy odpovedz zdvorilo a ponúkni súvisiacu prírodnú oblasť.
-            Vždy podporuj udržateľné a legálne správanie."""
+            summary, turns = chat_history.context_window(get_db(), current_user.id)
+            full_prompt = _chat_prompt(message, summary, turns)
             
-            # Combine system prompt with user message
-            full_prompt = f"{system_prompt}\n\nUser question: {message}\n\nAssistant:"
-            
-            # Try each model until one works
-            response = None
-            for model_name in model_names:
+            user_id = current_user.id
+
+            def reply_job():
+                # Shared client: healthy models first, recently failed ones last
                 try:
-                    model = genai.GenerativeModel(model_name)
-                    # Try to generate response
-                    response = model.generate_content(full_prompt)
-                    break  # Success, exit loop
-                except Exception as e:
-                    last_error = str(e)
-                    response = None
-                    continue  # Try next model
-            
-            if response is None:
-                # If all models failed, try to list available models for debugging
+                    reply, _ = ai_client.generate(full_prompt)
+                except ai_client.AIError as e:
+                    raise ai_client.AIError(_all_models_failed(e))
+                reply = reply or "Prepáč, nepodarilo sa mi vygenerovať odpoveď."
+                # Runs on the AI pool, outside the request: use a connection of its own
+                db = get_pool().acquire()
                 try:
-                    available_models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-                    model_list = ', '.join(available_models[:5]) if available_models else "žiadne"
-                    return jsonify({
-                        "error": f"Žiadny z modelov nefunguje. Dostupné modely: {model_list}. Posledná chyba: {last_error}. Skúste aktualizovať: pip install --upgrade google-generativeai"
-                    }), 500
-                except Exception as list_error:
-                    return jsonify({
-                        "error": f"Nepodarilo sa nájsť fungujúci model. Posledná chyba: {last_error}. Skúste aktualizovať google-generativeai: pip install --upgrade google-generativeai"
-                    }), 500
-            
-            reply = response.text if response.text else "Prepáč, nepodarilo sa mi vygenerovať odpoveď."
-            
-            # Save messages to database
-            db = get_db()
-            try:
-                # Save user message
-                db.execute(
-                    "INSERT INTO chat_messages (user_id, role, message) VALUES (?, ?, ?)",
-                    (current_user.id, 'user', message)
-                )
-                # Save bot reply
-                db.execute(
-                    "INSERT INTO chat_messages (user_id, role, message) VALUES (?, ?, ?)",
-                    (current_user.id, 'bot', reply)
-                )
-                db.commit()
-            except Exception as db_error:
-                # Log error but don't fail the request
-                print(f"Error saving chat message: {db_error}")
-            
-            return jsonify({"reply": reply})
+                    _save_chat(db, user_id, message, reply)
+                finally:
+                    get_pool().release(db)
+                return {"reply": reply}
+
+            return _run_ai_job("chat", reply_job, bool(data.get("async")))
             
         except Exception as e:
             return jsonify({"error": f"Chyba pri komunikácii s AI: {str(e)}"}), 500
 
+    @app.route("/api/chatbot/stream", methods=["POST"])
+    @login_required
+    def api_chatbot_stream():
+        """Like /api/chatbot, but forwards the reply as Server-Sent Events while it is generated.
+
+        Events: `data: {"delta": ...}` per piece, then `event: done` with the
+        whole reply, or `event: error`. The exchange is saved only when the
+        stream completes.
+        """
+        data = request.get_json(silent=True) or {}
+        message = (data.get("message") or "").strip()
+        if not message:
+            return jsonify({"error": "Message is required"}), 400
+
+        summary, turns = chat_history.context_window(get_db(), current_user.id)
+        prompt = _chat_prompt(message, summary, turns)
+        try:
+            pieces = ai_jobs.stream(current_user.id, lambda: ai_client.stream(prompt))
+        except ai_jobs.Saturated as e:
+            return _ai_busy(e)
+        try:
+            # Wait for the first piece here so a request no model can serve still gets a JSON error
+            first = next(pieces, "")
+        except ai_client.AIError as e:
+            return jsonify({"error": f"Chyba pri komunikácii s AI: {e}"}), 500
+        user_id = current_user.id
+
+        def event(payload, name=None):
+            head = f"event: {name}\n" if name else ""
+            return f"{head}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        def generate():
+            parts = [first] if first else []
+            if first:
+                yield event({"delta": first})
+            try:
+                for piece in pieces:
+                    parts.append(piece)
+                    yield event({"delta": piece})
+            except ai_client.AIError as e:
+                yield event({"error": f"Chyba pri komunikácii s AI: {e}"}, "error")
+                return
+            reply = "".join(parts).strip() or "Prepáč, nepodarilo sa mi vygenerovať odpoveď."
+            _save_chat(get_db(), user_id, message, reply)
+            yield event({"reply": reply}, "done")
+
+        return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # nginx: pass events through unbuffered
+        })
+
+    @app.route("/api/ai/jobs/<job_id>")
+    @login_required
+    def api_ai_job(job_id):
+        """Status of an AI job started with `"async": true` (or one that outlived the wait)."""
+        job = ai_jobs.get(job_id, current_user.id)
+        if job is None:
+            return jsonify({"error": "Úloha sa nenašla."}), 404
+        return jsonify({k: v for k, v in job.items() if k != "user_id"})
+
     @app.route("/api/chatbot/history", methods=["GET"])
     @login_required
     def api_chatbot_history():
-        """Get chat history for the current user"""
+        """Get chat history for the current user, newest page first (`?cursor=` for older messages)"""
         try:
             db = get_db()
-            messages = db.execute(
-                "SELECT role, message, created_at FROM chat_messages WHERE user_id = ? ORDER BY created_at ASC",
-                (current_user.id,)
-            ).fetchall()
-            
+            limit = parse_limit(request.args.get("limit"), default=50, maximum=200)
+            messages, next_cursor = chat_history.history_page(db, current_user.id, request.args.get("cursor"), limit)
             history = [
                 {
-                    "role": msg[0],
-                    "message": msg[1],
-                    "created_at": msg[2]
+                    "id": msg["id"],
+                    "role": msg["role"],
+                    "message": msg["message"],
+                    "created_at": msg["created_at"]
                 }
                 for msg in messages
             ]
             
-            return jsonify({"history": history})
+            # The summary of archived turns sits before the oldest page
+            summary = None if next_cursor else chat_history.summary_for(db, current_user.id)
+            return jsonify({"history": history, "next_cursor": next_cursor, "summary": summary})
         except Exception as e:
             return jsonify({"error": f"Chyba pri načítaní histórie: {str(e)}"}), 500
 
@@ -806,12 +777,7 @@ def register_routes(app):
     def api_chatbot_clear():
         """Clear chat history for the current user"""
         try:
-            db = get_db()
-            db.execute(
-                "DELETE FROM chat_messages WHERE user_id = ?",
-                (current_user.id,)
-            )
-            db.commit()
+            chat_history.clear_user(get_db(), current_user.id)
             return jsonify({"success": True})
         except Exception as e:
             return jsonify({"error": f"Chyba pri vymazaní histórie: {str(e)}"}), 500
@@ -841,6 +807,8 @@ def register_routes(app):
         if not _admin_gate_ok():
             return redirect(url_for('admin_login'))
         db = get_db()
+        # Picks up jobs left behind by a worker that stopped
+        admin_jobs.start_runner(app.static_folder)
         rows = db.execute(
             "SELECT id, author, content, created_at FROM posts ORDER BY created_at DESC LIMIT 20"
         ).fetchall()
@@ -880,8 +848,52 @@ def register_routes(app):
             recent_posts=recent_posts,
             users=users,
             recent_articles=recent_articles,
+            jobs=admin_jobs.recent(db),
         )
 
+    @app.route('/admin/metrics/db')
+    def admin_metrics_db():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify(dict(pool_stats(), likes=likes.stats(), follow_graph=follows.stats()))
+
+    @app.route('/admin/metrics/sql')
+    def admin_metrics_sql():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        limit = parse_limit(request.args.get("limit"), default=50, maximum=500)
+        return jsonify({"statements": statement_stats.snapshot(limit), "pool": pool_stats()})
+
+    @app.route('/admin/metrics/cache')
+    def admin_metrics_cache():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify(cache_stats())
+
+    @app.route('/admin/metrics/news')
+    def admin_metrics_news():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify({"feeds": news_fetcher.feed_status(get_db())})
+
+    @app.route('/admin/metrics/uploads')
+    def admin_metrics_uploads():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify(upload_store.stats())
+
+    @app.route('/admin/metrics/images')
+    def admin_metrics_images():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify(image_pipeline.stats())
+
+    @app.route('/admin/metrics/ai')
+    def admin_metrics_ai():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify(dict(ai_client.stats(), jobs=ai_jobs.stats()))
+
     @app.route('/admin/upload', methods=['POST'])
     def admin_upload():
         if not _admin_gate_ok():
@@ -889,10 +901,10 @@ def register_routes(app):
         f = request.files.get('image')
         if not f:
             return redirect(url_for('admin_panel'))
-        fname = f.filename
-        path = os.path.join(upload_dir, fname)
-        f.save(path)
-        return jsonify({"path": f"/static/uploads/{fname}"})
+        path = save_uploaded_file(f, upload_dir)
+        if not path:
+            return jsonify({"error": "Invalid file type"}), 400
+        return jsonify({"path": url_for('static', filename=path)})
 
     @app.route('/admin/articles', methods=['POST'])
     def admin_add_article():
@@ -948,6 +960,7 @@ def register_routes(app):
         db = get_db()
         db.execute("DELETE FROM articles WHERE id=?", (article_id,))
         db.commit()
+        upload_store.collect(db, app.static_folder)
         if is_ajax_request():
             return jsonify({"ok": True, "deleted_article_id": article_id})
         return redirect(url_for('admin_panel'))
@@ -966,10 +979,11 @@ def register_routes(app):
                 return jsonify({"ok": False, "error": "Invalid post id"}), 400
             return redirect(url_for('admin_panel'))
         db = get_db()
+        db.execute("DELETE FROM posts WHERE id=?", (post_id,))
         db.execute("DELETE FROM comments WHERE post_id=?", (post_id,))
         db.execute("DELETE FROM likes WHERE post_id=?", (post_id,))
-        db.execute("DELETE FROM posts WHERE id=?", (post_id,))
         db.commit()
+        upload_store.collect(db, app.static_folder)
         if is_ajax_request():
             return jsonify({"ok": True, "deleted_post_id": post_id})
         return redirect(url_for('admin_panel'))
@@ -980,13 +994,11 @@ def register_routes(app):
             if is_ajax_request():
                 return jsonify({"ok": False, "error": "Unauthorized"}), 403
             return redirect(url_for('admin_login'))
-        db = get_db()
-        db.execute("DELETE FROM comments")
-        db.execute("DELETE FROM likes")
-        db.execute("DELETE FROM posts")
-        db.commit()
+        # Deleted in chunks by the job runner; the panel polls /admin/jobs/<id>
+        admin_jobs.start_runner(app.static_folder)
+        job = admin_jobs.submit(get_db(), "delete_all_posts")
         if is_ajax_request():
-            return jsonify({"ok": True})
+            return jsonify({"ok": True, "job": job}), 202
         return redirect(url_for('admin_panel'))
 
     @app.route('/admin/delete-user', methods=['POST'])
@@ -1015,18 +1027,38 @@ def register_routes(app):
                 return jsonify({"ok": False, "error": "User cannot be deleted"}), 400
             return redirect(url_for('admin_panel'))
 
-        # Clean up related content before removing the user entry
-        db.execute("DELETE FROM comments WHERE author_id=?", (user_id,))
-        db.execute("DELETE FROM posts WHERE author_id=?", (user_id,))
-        db.execute("DELETE FROM follows WHERE follower_id=? OR followed_id=?", (user_id, user_id))
-        db.execute("DELETE FROM likes WHERE user_id=?", (user_id,))
-        db.execute("DELETE FROM chat_messages WHERE user_id=?", (user_id,))
-        db.execute("DELETE FROM users WHERE id=?", (user_id,))
-        db.commit()
+        # Related content, the user row and their files go in a background job
+        admin_jobs.start_runner(app.static_folder)
+        job = admin_jobs.submit(db, "delete_user", user_id)
         if is_ajax_request():
-            return jsonify({"ok": True, "deleted_user_id": user_id})
+            return jsonify({"ok": True, "deleted_user_id": user_id, "job": job}), 202
         return redirect(url_for('admin_panel'))
 
+    @app.route('/admin/jobs')
+    def admin_jobs_list():
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        return jsonify({"jobs": admin_jobs.recent(get_db())})
+
+    @app.route('/admin/jobs/<int:job_id>')
+    def admin_job_status(job_id):
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        job = admin_jobs.get(get_db(), job_id)
+        if job is None:
+            return jsonify({"error": "Not found"}), 404
+        return jsonify(job)
+
+    @app.route('/admin/jobs/<int:job_id>/retry', methods=['POST'])
+    def admin_job_retry(job_id):
+        if not _admin_gate_ok():
+            return jsonify({"error": "Unauthorized"}), 403
+        admin_jobs.start_runner(app.static_folder)
+        job = admin_jobs.retry(get_db(), job_id)
+        if job is None:
+            return jsonify({"error": "Only a failed job can be retried"}), 409
+        return jsonify({"ok": True, "job": job}), 202
+
     @app.route('/admin/news', methods=['POST'])
     def admin_add_news():
         # Manual news creation is disabled; live news are fetched from NewsAPI
@@ -0,0 +1,195 @@
+import re
+import time
+from markupsafe import escape
+
+from .pagination import decode_token, encode_token
+
+
+# FTS5 indexes over posts, comments and articles. They are external-content
+# tables: the text lives only in the source table, the index holds tokens.
+#
+# Triggers keep new writes indexed. Rows that existed before the index was
+# created are filled in by `backfill()` (the `rebuild-search` command), which
+# walks ids (last_id, upto] in small batches; `search_backfill` records how far
+# it got so the delete/update triggers never touch rows not yet indexed.
+INDEXES = {
+    "posts": {"fts": "posts_fts", "columns": ("content", "author")},
+    "comments": {"fts": "comments_fts", "columns": ("text", "author")},
+    "articles": {"fts": "articles_fts", "columns": ("title", "content")},
+}
+
+_TOKENIZE = "unicode61 remove_diacritics 2"
+
+
+def search_schema():
+    """DDL for the FTS tables, sync triggers and backfill bookkeeping."""
+    parts = [
+        """
+        CREATE TABLE IF NOT EXISTS search_backfill (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            upto INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    ]
+    for table, spec in INDEXES.items():
+        fts = spec["fts"]
+        cols = ", ".join(spec["columns"])
+        new_cols = ", ".join(f"new.{c}" for c in spec["columns"])
+        old_cols = ", ".join(f"old.{c}" for c in spec["columns"])
+        indexed = (
+            f"(old.id > (SELECT upto FROM search_backfill WHERE name = '{table}')"
+            f" OR old.id <= (SELECT last_id FROM search_backfill WHERE name = '{table}'))"
+        )
+        parts.append(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='id', tokenize='{_TOKENIZE}'
+        );
+        INSERT OR IGNORE INTO search_backfill(name, last_id, upto) SELECT '{table}', 0, COALESCE(MAX(id), 0) FROM {table};
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} WHEN {indexed} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {cols} ON {table} WHEN {indexed} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END;
+        """)
+    return "".join(parts)
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+MAX_TERMS = 8
+
+
+def build_match_query(q):
+    """Turn free text into a safe FTS5 query: quoted terms, prefix match on the last one."""
+    terms = _WORD.findall(q or "")[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+# Snippet markers that cannot occur in user text; swapped for <mark> after escaping.
+_HL_OPEN, _HL_CLOSE = "\x02", "\x03"
+
+
+def _highlight(snippet):
+    return str(escape(snippet or "")).replace(_HL_OPEN, "<mark>").replace(_HL_CLOSE, "</mark>")
+
+
+_KIND_QUERIES = {
+    "post": f"""
+        SELECT 'post' AS kind, p.id AS id, bm25(posts_fts, 1.0, 0.5) AS rank,
+               snippet(posts_fts, -1, '{_HL_OPEN}', '{_HL_CLOSE}', '…', 16) AS snippet,
+               p.author AS label, p.id AS post_id, p.created_at AS created_at
+        FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+        WHERE posts_fts MATCH :q
+    """,
+    "comment": f"""
+        SELECT 'comment' AS kind, c.id AS id, bm25(comments_fts, 1.0, 0.5) AS rank,
+               snippet(comments_fts, -1, '{_HL_OPEN}', '{_HL_CLOSE}', '…', 16) AS snippet,
+               c.author AS label, c.post_id AS post_id, c.created_at AS created_at
+        FROM comments_fts JOIN comments c ON c.id = comments_fts.rowid
+        WHERE comments_fts MATCH :q
+    """,
+    "article": f"""
+        SELECT 'article' AS kind, a.id AS id, bm25(articles_fts, 2.0, 1.0) AS rank,
+               snippet(articles_fts, -1, '{_HL_OPEN}', '{_HL_CLOSE}', '…', 16) AS snippet,
+               a.title AS label, NULL AS post_id, a.created_at AS created_at
+        FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid
+        WHERE articles_fts MATCH :q
+    """,
+}
+KINDS = tuple(_KIND_QUERIES)
+
+
+def search(db, q, kinds=KINDS, cursor_token=None, limit=20):
+    """Ranked full-text search. Returns (results, next_cursor) or (None, None) for an empty query.
+
+    Results are ordered by bm25 rank (best first) with (kind, id) as the
+    tie-breaker; the cursor seeks past the last (rank, kind, id) seen.
+    """
+    match = build_match_query(q)
+    if match is None:
+        return None, None
+    kinds = [k for k in kinds if k in _KIND_QUERIES] or list(KINDS)
+    union = " UNION ALL ".join(_KIND_QUERIES[k] for k in kinds)
+    params = {"q": match, "limit": limit + 1}
+    sql = f"SELECT * FROM ({union})"
+    cursor = decode_token(cursor_token)
+    if cursor and len(cursor) == 3:
+        sql += " WHERE (rank, kind, id) > (:rank, :kind, :id)"
+        params.update(rank=float(cursor[0]), kind=str(cursor[1]), id=int(cursor[2]))
+    sql += " ORDER BY rank, kind, id LIMIT :limit"
+    rows = db.execute(sql, params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_token([last["rank"], last["kind"], last["id"]])
+    results = [
+        {
+            "kind": r["kind"],
+            "id": r["id"],
+            "post_id": r["post_id"],
+            "label": r["label"],
+            "snippet": _highlight(r["snippet"]),
+            "created_at": r["created_at"],
+            "score": round(-r["rank"], 4),
+        }
+        for r in rows
+    ]
+    return results, next_cursor
+
+
+def backfill(db, batch_size=1000, echo=None):
+    """Index rows that predate the FTS tables, one short transaction per batch.
+
+    Safe to interrupt and re-run: progress is stored in search_backfill.
+    Returns the number of rows indexed.
+    """
+    total = 0
+    for table, spec in INDEXES.items():
+        fts = spec["fts"]
+        cols = ", ".join(spec["columns"])
+        last_id, upto = db.execute(
+            "SELECT last_id, upto FROM search_backfill WHERE name = ?", (table,)
+        ).fetchone()
+        started = time.perf_counter()
+        while last_id < upto:
+            rows = db.execute(
+                f"SELECT id, {cols} FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (last_id, upto, batch_size),
+            ).fetchall()
+            new_last = rows[-1]["id"] if rows else upto
+            db.executemany(
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES ({', '.join('?' * (len(spec['columns']) + 1))})",
+                [tuple(r) for r in rows],
+            )
+            db.execute("UPDATE search_backfill SET last_id = ? WHERE name = ?", (new_last, table))
+            db.commit()
+            total += len(rows)
+            last_id = new_last
+            if echo:
+                echo(f"{table}: indexed up to id {last_id} of {upto} ({time.perf_counter() - started:.1f}s)")
+    return total
+
+
+def rebuild(db, echo=None):
+    """Drop and rebuild every index from its source table in one pass."""
+    for table, spec in INDEXES.items():
+        fts = spec["fts"]
+        started = time.perf_counter()
+        db.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        db.execute(
+            "UPDATE search_backfill SET last_id = upto WHERE name = ?", (table,)
+        )
+        db.commit()
+        if echo:
+            echo(f"{table}: rebuilt in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,182 @@
+import os
+
+from .feed import hydrate_posts
+from .pagination import decode_cursor, encode_cursor
+
+
+# Personalized "following" timeline, fan-out-on-write.
+#
+# When a post is created its id is copied into timeline_entries for every
+# follower, so reading a timeline is one index range scan of page size.
+# Authors with more than FANOUT_LIMIT followers are switched to pull mode
+# (timeline_pull_authors, sticky): their posts are not copied and are merged
+# in at read time instead, so one post never costs millions of writes.
+FANOUT_LIMIT = int(os.environ.get("TIMELINE_FANOUT_LIMIT") or 1000)
+# Entries kept per user; older ones are pruned (the global feed still has them).
+MAX_ENTRIES = int(os.environ.get("TIMELINE_MAX_ENTRIES") or 1000)
+# Recent posts copied into a timeline when the user starts following someone.
+FOLLOW_BACKFILL = int(os.environ.get("TIMELINE_FOLLOW_BACKFILL") or 50)
+
+TIMELINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timeline_entries (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, created_at, post_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_timeline_post ON timeline_entries(post_id);
+CREATE INDEX IF NOT EXISTS idx_timeline_user_author ON timeline_entries(user_id, author_id);
+
+CREATE TABLE IF NOT EXISTS timeline_pull_authors (
+    author_id INTEGER PRIMARY KEY
+);
+
+CREATE INDEX IF NOT EXISTS idx_posts_author_created ON posts(author_id, created_at DESC, id DESC);
+
+-- Deleted posts/users disappear from timelines whichever code path deletes them
+CREATE TRIGGER IF NOT EXISTS trg_timeline_post_delete AFTER DELETE ON posts BEGIN
+    DELETE FROM timeline_entries WHERE post_id = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_timeline_user_delete AFTER DELETE ON users BEGIN
+    DELETE FROM timeline_entries WHERE user_id = old.id;
+    DELETE FROM timeline_pull_authors WHERE author_id = old.id;
+END;
+"""
+
+
+def _is_pull_author(db, author_id):
+    return db.execute("SELECT 1 FROM timeline_pull_authors WHERE author_id = ?", (author_id,)).fetchone() is not None
+
+
+def fan_out_post(db, post_id, author_id):
+    """Copy a new post into its followers' timelines (and the author's own).
+
+    Call inside the transaction that created the post.
+    """
+    if author_id is None:
+        return
+    if not _is_pull_author(db, author_id):
+        row = db.execute("SELECT follower_count FROM users WHERE id = ?", (author_id,)).fetchone()
+        if row is not None and row[0] > FANOUT_LIMIT:
+            db.execute("INSERT OR IGNORE INTO timeline_pull_authors(author_id) VALUES (?)", (author_id,))
+        else:
+            db.execute(
+                """
+                INSERT OR IGNORE INTO timeline_entries(user_id, post_id, author_id, created_at)
+                SELECT f.follower_id, p.id, p.author_id, p.created_at
+                FROM posts p JOIN follows f ON f.followed_id = p.author_id
+                WHERE p.id = ?
+                """,
+                (post_id,),
+            )
+    db.execute(
+        """
+        INSERT OR IGNORE INTO timeline_entries(user_id, post_id, author_id, created_at)
+        SELECT p.author_id, p.id, p.author_id, p.created_at FROM posts p WHERE p.id = ?
+        """,
+        (post_id,),
+    )
+
+
+def on_follow(db, follower_id, followed_id):
+    """Backfill the follower's timeline with the followed author's recent posts."""
+    if _is_pull_author(db, followed_id):
+        return
+    db.execute(
+        """
+        INSERT OR IGNORE INTO timeline_entries(user_id, post_id, author_id, created_at)
+        SELECT ?, id, author_id, created_at FROM posts
+        WHERE author_id = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+        """,
+        (follower_id, followed_id, FOLLOW_BACKFILL),
+    )
+    prune_user(db, follower_id)
+
+
+def on_unfollow(db, follower_id, followed_id):
+    db.execute(
+        "DELETE FROM timeline_entries WHERE user_id = ? AND author_id = ?",
+        (follower_id, followed_id),
+    )
+
+
+def prune_user(db, user_id, keep=None):
+    """Drop everything older than the newest `keep` (at least 1) entries of one timeline."""
+    keep = MAX_ENTRIES if keep is None else keep
+    if keep < 1:
+        # OFFSET keep - 1 would become -1, i.e. no offset, and keep one entry
+        raise ValueError(f"keep must be at least 1, got {keep}")
+    cur = db.execute(
+        """
+        DELETE FROM timeline_entries
+        WHERE user_id = ? AND (created_at, post_id) < (
+            SELECT created_at, post_id FROM timeline_entries
+            WHERE user_id = ?
+            ORDER BY created_at DESC, post_id DESC
+            LIMIT 1 OFFSET ?
+        )
+        """,
+        (user_id, user_id, keep - 1),
+    )
+    return cur.rowcount
+
+
+def prune_all(db, keep=None):
+    """Prune every oversized timeline. Returns (users pruned, entries removed)."""
+    keep = MAX_ENTRIES if keep is None else keep
+    users = [r[0] for r in db.execute(
+        "SELECT user_id FROM timeline_entries GROUP BY user_id HAVING COUNT(*) > ?", (keep,)
+    ).fetchall()]
+    removed = 0
+    for user_id in users:
+        removed += prune_user(db, user_id, keep)
+        db.commit()
+    return len(users), removed
+
+
+def timeline_page(db, user_id, cursor_token=None, limit=20):
+    """One page of the user's following timeline, newest first. Returns (posts, next_cursor).
+
+    Reads limit+1 pushed entries plus limit+1 posts from followed pull-mode
+    authors, merges both by (created_at, id) and hydrates the page.
+    """
+    cursor = decode_cursor(cursor_token)
+    seek = " AND (created_at, post_id) < (?, ?)" if cursor else ""
+    params = [user_id] + (list(cursor) if cursor else []) + [limit + 1]
+    pushed = db.execute(
+        f"""
+        SELECT post_id AS id, created_at FROM timeline_entries
+        WHERE user_id = ?{seek}
+        ORDER BY created_at DESC, post_id DESC LIMIT ?
+        """,
+        params,
+    ).fetchall()
+
+    seek = " AND (p.created_at, p.id) < (?, ?)" if cursor else ""
+    params = [user_id] + (list(cursor) if cursor else []) + [limit + 1]
+    pulled = db.execute(
+        f"""
+        SELECT p.id, p.created_at FROM posts p
+        WHERE p.author_id IN (
+            SELECT f.followed_id FROM follows f
+            JOIN timeline_pull_authors t ON t.author_id = f.followed_id
+            WHERE f.follower_id = ?
+        ){seek}
+        ORDER BY p.created_at DESC, p.id DESC LIMIT ?
+        """,
+        params,
+    ).fetchall()
+
+    merged = {}
+    for row in list(pushed) + list(pulled):
+        merged[row["id"]] = row["created_at"]
+    ordered = sorted(merged.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    next_cursor = None
+    if len(ordered) > limit:
+        ordered = ordered[:limit]
+        post_id, created_at = ordered[-1]
+        next_cursor = encode_cursor(created_at, post_id)
+    return hydrate_posts(db, [post_id for post_id, _ in ordered], user_id), next_cursor
@@ -0,0 +1,493 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from . import image_pipeline
+
+
+# Content-addressed upload storage.
+#
+# Uploads live at `uploads/<h[0:2]>/<h[2:4]>/<sha256>.<ext>`, so uploading the
+# same bytes twice yields the same path and the file is stored once. Because
+# a path never changes content, these files (and their variants) are served
+# with cache-forever headers.
+#
+# `upload_blobs` counts how many rows reference each upload path. Triggers on
+# the referencing columns keep the counts exact whichever code path inserts,
+# updates or deletes a row; `collect()` removes files whose count dropped to 0.
+REFERENCES = (
+    ("posts", "image_path"),
+    ("users", "profile_image"),
+    ("articles", "image_path"),
+)
+
+# A file (re-)uploaded this recently is not collected yet: the request that
+# stored it may not have committed its reference. Its row stays, so a later
+# collect() retries it.
+COLLECT_GRACE_SECONDS = 60
+
+CHUNK_SIZE = 64 * 1024
+_CAS_PATH = re.compile(r"^uploads/[0-9a-f]{2}/[0-9a-f]{2}/(variants/)?[0-9a-f]{64}[._]")
+
+
+def blob_schema():
+    """DDL for the refcount table and the triggers maintaining it."""
+    parts = [
+        """
+        CREATE TABLE IF NOT EXISTS upload_blobs (
+            path TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_upload_blobs_unreferenced ON upload_blobs(path) WHERE refcount <= 0;
+        """
+    ]
+    for table, column in REFERENCES:
+        acquire = (
+            f"INSERT INTO upload_blobs(path, refcount) SELECT new.{column}, 1"
+            f" WHERE new.{column} LIKE 'uploads/%'"
+            " ON CONFLICT(path) DO UPDATE SET refcount = refcount + 1;"
+        )
+        release = f"UPDATE upload_blobs SET refcount = refcount - 1 WHERE path = old.{column};"
+        parts.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_blob_{table}_insert AFTER INSERT ON {table} BEGIN
+            {acquire}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_blob_{table}_delete AFTER DELETE ON {table} BEGIN
+            {release}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_blob_{table}_update AFTER UPDATE OF {column} ON {table}
+        WHEN old.{column} IS NOT new.{column} BEGIN
+            {release}
+            {acquire}
+        END;
+        """)
+    return "".join(parts)
+
+
+def _referenced_paths_sql():
+    return " UNION ALL ".join(
+        f"SELECT {column} AS path FROM {table} WHERE {column} LIKE 'uploads/%'"
+        for table, column in REFERENCES
+    )
+
+
+def seed_refcounts(db):
+    """Fill upload_blobs from the rows that exist right now."""
+    db.execute("DELETE FROM upload_blobs")
+    db.execute(
+        f"INSERT INTO upload_blobs(path, refcount) SELECT path, COUNT(*) FROM ({_referenced_paths_sql()}) GROUP BY path"
+    )
+
+
+def cas_path(digest, ext):
+    return f"uploads/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def is_immutable(relative_path):
+    """True for content-addressed uploads and their variants."""
+    return bool(_CAS_PATH.match(relative_path or ""))
+
+
+# Leading bytes of the image formats we accept -> stored extension
+_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+SNIFF_BYTES = 12
+
+
+def sniff_image(head):
+    """Image extension for the first bytes of a file, or None if it is not a supported image."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for magic, ext in _MAGIC:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+_stats_lock = threading.Lock()
+_stats = {"accepted": 0, "rejected": 0, "bytes": 0, "seconds": 0.0}
+_recent = deque(maxlen=50)
+
+
+def _record(accepted, size, seconds, kind=None, reason=None):
+    with _stats_lock:
+        _stats["accepted" if accepted else "rejected"] += 1
+        if accepted:
+            _stats["bytes"] += size
+            _stats["seconds"] += seconds
+        _recent.append({
+            "ok": accepted,
+            "kind": kind,
+            "reason": reason,
+            "bytes": size,
+            "seconds": round(seconds, 4),
+            "mb_per_s": round(size / seconds / (1024 * 1024), 2) if seconds > 0 else None,
+        })
+
+
+def stats():
+    """Upload counters plus the most recent uploads with their throughput."""
+    with _stats_lock:
+        totals = dict(_stats)
+        recent = list(_recent)
+    seconds = totals["seconds"]
+    totals["mb_per_s"] = round(totals["bytes"] / seconds / (1024 * 1024), 2) if seconds > 0 else None
+    totals["seconds"] = round(seconds, 3)
+    return {"totals": totals, "recent": recent}
+
+
+class IncomingUpload:
+    """Write target for one uploaded file, filled chunk by chunk as it arrives.
+
+    The first bytes are sniffed and anything that is not a supported image
+    is rejected before the rest is read; the data is hashed while being
+    written to a temp file, and `commit()` moves that file to its
+    content-addressed path. A closed, uncommitted upload deletes its temp file.
+    """
+
+    def __init__(self, upload_root, max_bytes=None):
+        os.makedirs(upload_root, exist_ok=True)
+        self.path = os.path.join(upload_root, f".incoming-{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}")
+        self.max_bytes = max_bytes
+        self.kind = None
+        self.size = 0
+        self.relative_path = None
+        self._head = b""
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, "w+b")
+        self._started = time.perf_counter()
+
+    def _reject(self, error, reason):
+        _record(False, self.size, time.perf_counter() - self._started, self.kind, reason)
+        self.close()
+        raise error
+
+    def write(self, data):
+        if self.kind is None:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self.kind = sniff_image(self._head)
+                if self.kind is None:
+                    self._reject(UnsupportedMediaType("Nahraný súbor nie je podporovaný obrázok."), "not an image")
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self._reject(RequestEntityTooLarge(), "too large")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def commit(self, static_folder):
+        """Move the finished upload into place and return its relative path."""
+        if self.relative_path:
+            return self.relative_path
+        if self.kind is None:
+            self.kind = sniff_image(self._head)
+            if self.kind is None:
+                self._reject(UnsupportedMediaType("Nahraný súbor nie je podporovaný obrázok."), "not an image")
+        self._file.close()
+        relative_path = cas_path(self._digest.hexdigest(), self.kind)
+        target = os.path.join(static_folder, relative_path)
+        if os.path.exists(target):
+            os.remove(self.path)
+            os.utime(target)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.replace(self.path, target)
+            except FileNotFoundError:
+                # gc-uploads removed the (empty) shard directory in between
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(self.path, target)
+        self.relative_path = relative_path
+        _record(True, self.size, time.perf_counter() - self._started, self.kind)
+        return relative_path
+
+    # File-like API expected by werkzeug's FileStorage
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+        if self.relative_path is None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def store_stream(stream, static_folder, max_bytes=None):
+    """Copy a file-like object into content-addressed storage. Returns the relative path.
+
+    Raises UnsupportedMediaType / RequestEntityTooLarge for data that is not
+    a supported image or is larger than max_bytes.
+    """
+    incoming = IncomingUpload(os.path.join(static_folder, "uploads"), max_bytes)
+    try:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            incoming.write(chunk)
+        return incoming.commit(static_folder)
+    finally:
+        incoming.close()
+
+
+def collect(db, static_folder, grace=COLLECT_GRACE_SECONDS):
+    """Delete uploads no row references any more. Call after the commit that released them.
+
+    Returns the number of files removed.
+    """
+    paths = [r[0] for r in db.execute("SELECT path FROM upload_blobs WHERE refcount <= 0").fetchall()]
+    removed = 0
+    cutoff = time.time() - grace
+    for relative_path in paths:
+        full = os.path.join(static_folder, relative_path)
+        try:
+            if os.stat(full).st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            pass
+        # Re-check the count in the same statement: the blob may have been reused meanwhile
+        if not db.execute("DELETE FROM upload_blobs WHERE path = ? AND refcount <= 0", (relative_path,)).rowcount:
+            continue
+        db.commit()
+        try:
+            os.remove(full)
+            removed += 1
+        except OSError:
+            pass
+        image_pipeline.remove_variants(static_folder, relative_path)
+    return removed
+
+
+def iter_uploads(static_folder):
+    """Yield the relative path of every stored upload (variants and temp files excluded)."""
+    stack = [os.path.join(static_folder, "uploads")]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.startswith(".") or entry.name == image_pipeline.VARIANTS_DIR:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield os.path.relpath(entry.path, static_folder).replace(os.sep, "/")
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dedupe(db, static_folder, dry_run=False, echo=None):
+    """Move every referenced legacy upload into content-addressed storage.
+
+    Each file is copied to its CAS path, the referencing rows are rewritten
+    and committed, and only then are the old files collected, so an
+    interrupted run leaves every reference pointing at an existing file.
+    Returns (files rewritten, bytes saved).
+    """
+    legacy = [
+        r[0] for r in db.execute(f"SELECT DISTINCT path FROM ({_referenced_paths_sql()}) ORDER BY path").fetchall()
+        if not is_immutable(r[0])
+    ]
+    rewritten, saved, seen = 0, 0, set()
+    for i, old in enumerate(legacy, 1):
+        full = os.path.join(static_folder, old)
+        if not os.path.isfile(full):
+            if echo:
+                echo(f"[{i}/{len(legacy)}] {old}: missing on disk, skipped")
+            continue
+        ext = old.rsplit(".", 1)[-1].lower() if "." in old else "bin"
+        new = cas_path(_file_digest(full), ext)
+        target = os.path.join(static_folder, new)
+        duplicate = new in seen or os.path.exists(target)
+        seen.add(new)
+        if duplicate:
+            saved += os.path.getsize(full)
+        if echo:
+            echo(f"[{i}/{len(legacy)}] {old} -> {new}{' (duplicate)' if duplicate else ''}")
+        if dry_run:
+            continue
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(full, target + ".tmp")
+            os.replace(target + ".tmp", target)
+        for table, column in REFERENCES:
+            db.execute(f"UPDATE {table} SET {column} = ? WHERE {column} = ?", (new, old))
+        db.commit()
+        rewritten += 1
+    if not dry_run:
+        collect(db, static_folder, grace=0)
+    return rewritten, saved
+
+
+# Mark-and-sweep over the whole upload folder. collect() only sees paths
+# upload_blobs knows about; this also finds files nothing ever counted
+# (uploads from before the refcounts, crashed requests, abandoned
+# `.incoming-*` temp files, variants of deleted originals).
+GC_GRACE_SECONDS = 24 * 3600
+UNREFERENCED = "(nepoužité)"
+
+
+# Upload URLs pasted into article text or set as an image URL (what /admin/upload returns)
+_STATIC_UPLOAD_URL = re.compile(r"/static/(uploads/[^\s\"'()<>?#]+)")
+
+
+def _owners(db):
+    """Mark phase: {relative path: owner} for every upload a row references."""
+    rows = db.execute(
+        """
+        SELECT p.image_path, COALESCE(u.username, p.author) FROM posts p
+        LEFT JOIN users u ON u.id = p.author_id WHERE p.image_path LIKE 'uploads/%'
+        UNION ALL
+        SELECT profile_image, username FROM users WHERE profile_image LIKE 'uploads/%'
+        UNION ALL
+        SELECT image_path, '(články)' FROM articles WHERE image_path LIKE 'uploads/%'
+        """
+    )
+    owners = {}
+    for path, owner in rows:
+        # A content-addressed file can be shared; report it under the first owner
+        owners.setdefault(path, owner or "Anonym")
+    urls = db.execute(
+        """
+        SELECT profile_image, username FROM users WHERE profile_image LIKE '%/static/uploads/%'
+        UNION ALL
+        SELECT image_path, '(články)' FROM articles WHERE image_path LIKE '%/static/uploads/%'
+        UNION ALL
+        SELECT content, '(články)' FROM articles WHERE content LIKE '%/static/uploads/%'
+        """
+    )
+    for text, owner in urls:
+        for path in _STATIC_UPLOAD_URL.findall(text):
+            owners.setdefault(path, owner or "Anonym")
+    return owners
+
+
+def gc_uploads(db, static_folder, grace=GC_GRACE_SECONDS, dry_run=False, echo=None):
+    """Delete upload files no row references that are older than `grace` seconds.
+
+    Walks the folder with os.scandir one directory at a time, also removing
+    stale temp files, variants whose original is gone and empty shard
+    directories. Returns a report dict; "owners" maps owner -> [files, bytes]
+    for everything kept, unreferenced files included under UNREFERENCED.
+    """
+    owners = _owners(db)
+    stem_owners = {
+        (os.path.dirname(path), os.path.splitext(os.path.basename(path))[0]): owner
+        for path, owner in owners.items()
+    }
+    cutoff = time.time() - grace
+    root = os.path.join(static_folder, "uploads")
+    report = {
+        "files": 0, "bytes": 0, "removed": 0, "removed_bytes": 0,
+        "young": 0, "temp_removed": 0, "dirs_removed": 0, "owners": {},
+    }
+
+    def remove(entry, relative_path, size):
+        if echo:
+            echo(f"{'would remove' if dry_run else 'remove'} {relative_path} ({size} B)")
+        if not dry_run:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                return False
+        return True
+
+    def sweep(path):
+        """Sweep one directory; returns True if it is left empty."""
+        kept, subdirs = 0, []
+        # Stream the entries (the flat legacy folder can be huge); subdirectories
+        # are swept after this scandir is closed
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif not entry.is_file(follow_symlinks=False) or not sweep_file(entry):
+                    kept += 1
+        for subdir in subdirs:
+            if not (sweep(subdir) and remove_dir(subdir)):
+                kept += 1
+        return kept == 0
+
+    def sweep_file(entry):
+        """Remove or account for one file; returns True if it was removed."""
+        st = entry.stat(follow_symlinks=False)
+        relative_path = os.path.relpath(entry.path, static_folder).replace(os.sep, "/")
+        folder, name = os.path.split(relative_path)
+        if name.startswith(".incoming-"):
+            if st.st_mtime < cutoff and remove(entry, relative_path, st.st_size):
+                report["temp_removed"] += 1
+                return True
+        elif not name.startswith("."):  # .gitkeep and the like are left alone
+            if os.path.basename(folder) == image_pipeline.VARIANTS_DIR:
+                # <stem>_<size>.webp or <stem>.json belong to <stem>.<ext> one level up
+                stem, parent = os.path.splitext(name)[0], os.path.dirname(folder)
+                owner = stem_owners.get((parent, stem)) or stem_owners.get((parent, stem.rsplit("_", 1)[0]))
+            else:
+                owner = owners.get(relative_path)
+            if owner is None and st.st_mtime >= cutoff:
+                report["young"] += 1
+            elif owner is None and remove(entry, relative_path, st.st_size):
+                report["removed"] += 1
+                report["removed_bytes"] += st.st_size
+                removed_paths.append(relative_path)
+                return True
+            totals = report["owners"].setdefault(owner or UNREFERENCED, [0, 0])
+            totals[0] += 1
+            totals[1] += st.st_size
+        report["files"] += 1
+        report["bytes"] += st.st_size
+        return False
+
+    def remove_dir(path):
+        if echo:
+            echo(f"{'would remove' if dry_run else 'remove'} empty {os.path.relpath(path, static_folder)}/")
+        if not dry_run:
+            try:
+                os.rmdir(path)
+            except OSError:
+                return False  # something was just written into it
+        report["dirs_removed"] += 1
+        return True
+
+    removed_paths = []
+    if os.path.isdir(root):
+        sweep(root)
+    if removed_paths and not dry_run:
+        # One short write at the end: the sweep itself never holds the write lock
+        db.executemany(
+            "DELETE FROM upload_blobs WHERE path = ? AND refcount <= 0", [(path,) for path in removed_paths]
+        )
+        db.commit()
+    return report
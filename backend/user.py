@@ -1,56 +1,127 @@
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import UserMixin
+import os
 import sqlite3
+from .cache import make_cache
 from .database import get_db
 
 
-class User(UserMixin):
-    def __init__(self, id, username, email, password_hash, bio="", profile_image=None, created_at=None, is_admin=False):
+# The login_manager user_loader runs on every authenticated request; keep
+# recently seen users cached for a short while. Writes below invalidate; with
+# the default per-process cache other workers see a change after USER_CACHE_TTL.
+_user_cache = make_cache(
+    "users",
+    maxsize=int(os.environ.get("USER_CACHE_SIZE") or 2048),
+    ttl=float(os.environ.get("USER_CACHE_TTL") or 60),
+)
+
+_USER_COLUMNS = "id, username, email, bio, profile_image, created_at, COALESCE(is_admin, 0) as is_admin"
+
+
+class User:
+    """Logged-in user as seen by flask_login.
+
+    Deliberately does not hold the password hash: it is only read from the
+    database while checking a password.
+    """
+
+    __slots__ = ("id", "username", "email", "bio", "profile_image", "created_at", "is_admin")
+
+    def __init__(self, id, username, email, bio="", profile_image=None, created_at=None, is_admin=False):
         self.id = id
         self.username = username
         self.email = email
-        self.password_hash = password_hash
         self.bio = bio
         self.profile_image = profile_image
         self.created_at = created_at
         self.is_admin = bool(is_admin)
-    
+
+    # flask_login user interface (what UserMixin would provide)
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = object.__hash__
+
+    @staticmethod
+    def _from_row(row):
+        return User(row[0], row[1], row[2], row[3], row[4], row[5], row[6])
+
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-    
+        db = get_db()
+        row = db.execute("SELECT password_hash FROM users WHERE id = ?", (self.id,)).fetchone()
+        return bool(row) and check_password_hash(row[0], password)
+
     @staticmethod
-    def get_by_id(user_id):
+    def authenticate(username, password):
+        """Return the User for valid credentials, otherwise None."""
         db = get_db()
         row = db.execute(
-            "SELECT id, username, email, password_hash, bio, profile_image, created_at, COALESCE(is_admin, 0) as is_admin FROM users WHERE id = ?",
-            (user_id,)
+            f"SELECT {_USER_COLUMNS}, password_hash FROM users WHERE username = ?",
+            (username,)
         ).fetchone()
-        if row:
-            return User(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7])
+        if row and check_password_hash(row["password_hash"], password):
+            return User._from_row(row)
         return None
-    
+
+    @staticmethod
+    def get_by_id(user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        def load():
+            row = get_db().execute(
+                f"SELECT {_USER_COLUMNS} FROM users WHERE id = ?",
+                (user_id,)
+            ).fetchone()
+            return User._from_row(row) if row else None
+
+        return _user_cache.get_or_set(user_id, load)
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop a cached user after its row changed or was deleted."""
+        _user_cache.delete(int(user_id))
+
+    @staticmethod
+    def cache_stats():
+        return _user_cache.stats()
+
     @staticmethod
     def get_by_username(username):
         db = get_db()
         row = db.execute(
-            "SELECT id, username, email, password_hash, bio, profile_image, created_at, COALESCE(is_admin, 0) as is_admin FROM users WHERE username = ?",
+            f"SELECT {_USER_COLUMNS} FROM users WHERE username = ?",
             (username,)
         ).fetchone()
         if row:
-            return User(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7])
+            return User._from_row(row)
         return None
-    
+
     @staticmethod
     def get_by_email(email):
         db = get_db()
         row = db.execute(
-            "SELECT id, username, email, password_hash, bio, profile_image, created_at, COALESCE(is_admin, 0) as is_admin FROM users WHERE email = ?",
+            f"SELECT {_USER_COLUMNS} FROM users WHERE email = ?",
             (email,)
         ).fetchone()
         if row:
-            return User(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7])
+            return User._from_row(row)
         return None
-    
+
     @staticmethod
     def create(username, email, password, is_admin=False):
         db = get_db()
@@ -64,7 +135,7 @@ class User(UserMixin):
             return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
-    
+
     def update_bio(self, bio):
         db = get_db()
         db.execute(
@@ -73,7 +144,8 @@ class User(UserMixin):
         )
         db.commit()
         self.bio = bio
-    
+        User.invalidate(self.id)
+
     def update_profile_image(self, image_path):
         db = get_db()
         db.execute(
@@ -82,7 +154,8 @@ class User(UserMixin):
         )
         db.commit()
         self.profile_image = image_path
-    
+        User.invalidate(self.id)
+
     @staticmethod
     def get_user_posts(username):
         db = get_db()
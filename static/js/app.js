@@ -208,9 +208,13 @@
     }
   }
 
-  async function fetchPosts() {
-    const res = await fetch('/api/posts');
-    if (!res.ok) return [];
+  // Feed API is keyset-paginated; with paged=1 it answers {posts: [...], next_cursor: "..."|null}
+  async function fetchPosts(cursor = null, feed = 'all') {
+    const params = new URLSearchParams({ paged: '1' });
+    if (cursor) params.set('cursor', cursor);
+    if (feed === 'following') params.set('feed', 'following');
+    const res = await fetch(`/api/posts?${params}`);
+    if (!res.ok) return { posts: [], next_cursor: null };
     return res.json();
   }
 
@@ -227,6 +231,11 @@
       `;
       return;
     }
+    appendPosts(list);
+  }
+
+  function appendPosts(list) {
+    if (!postList || !postTemplate) return;
     list.forEach(async (post) => {
       const tmpl = postTemplate.content.cloneNode(true);
       const li = tmpl.querySelector("li");
@@ -311,7 +320,7 @@
       }
 
       const commentForm = tmpl.querySelector(".comment-form");
-      commentForm.addEventListener("submit", async (ev) => {
+      if (commentForm) commentForm.addEventListener("submit", async (ev) => {
         ev.preventDefault();
         const input = commentForm.querySelector(".comment-input");
         const text = input.value.trim();
@@ -333,7 +342,7 @@
       });
 
       // Load existing comments for this post
-      try {
+      if (tmpl.querySelector('.comment-list')) try {
         const cres = await fetch(`/api/posts/${post.id}/comments`);
         if (cres.ok) {
           const comments = await cres.json();
@@ -347,7 +356,7 @@
       } catch {}
 
       const deleteBtn = tmpl.querySelector(".delete-post");
-      deleteBtn.addEventListener("click", async () => {
+      if (deleteBtn) deleteBtn.addEventListener("click", async () => {
         if (!confirm("Naozaj chcete vymazať tento príspevok?")) return;
         await fetch(`/api/posts/${post.id}`, { method: "DELETE" });
         await loadPosts();
@@ -360,9 +369,35 @@
   async function loadPosts() {
     if (!postList) return;
     const data = await fetchPosts();
+    const posts = data.posts || [];
     const query = (searchBox && searchBox.value ? searchBox.value : '').toLowerCase();
-    const filtered = !query ? data : data.filter(p => (p.content||'').toLowerCase().includes(query) || (p.author||'').toLowerCase().includes(query));
+    const filtered = !query ? posts : posts.filter(p => (p.content||'').toLowerCase().includes(query) || (p.author||'').toLowerCase().includes(query));
     renderPosts(filtered);
+    setNextCursor(data.next_cursor);
+  }
+
+  // "Load older" button: follow next_cursor without reloading the page
+  const loadMoreBtn = $("#loadMorePosts");
+  function setNextCursor(cursor) {
+    if (!loadMoreBtn) return;
+    loadMoreBtn.dataset.cursor = cursor || '';
+    loadMoreBtn.style.display = cursor ? '' : 'none';
+  }
+  if (loadMoreBtn && postList && postTemplate) {
+    loadMoreBtn.addEventListener('click', async (e) => {
+      e.preventDefault();
+      const cursor = loadMoreBtn.dataset.cursor;
+      if (!cursor || loadMoreBtn.disabled) return;
+      loadMoreBtn.disabled = true;
+      try {
+        const data = await fetchPosts(cursor, loadMoreBtn.dataset.feed);
+        appendPosts(data.posts || []);
+        cachedCards = null;
+        setNextCursor(data.next_cursor);
+      } finally {
+        loadMoreBtn.disabled = false;
+      }
+    });
   }
 
   // Filter server-rendered posts client-side if no dynamic rendering
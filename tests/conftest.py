@@ -0,0 +1,64 @@
+import itertools
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The database path is read when backend.database is imported, so point it
+# (and the static folder uploads go to) at a throwaway directory first.
+_TMP = tempfile.mkdtemp(prefix="gardencircle-tests-")
+os.environ["GARDENCIRCLE_DB"] = os.path.join(_TMP, "gardencircle.db")
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["NEWS_REFRESH"] = "0"
+
+from backend.database import get_pool  # noqa: E402
+from backend.main import app as flask_app, create_app  # noqa: E402
+
+PASSWORD = "Abcdef1!"
+_names = itertools.count(1)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def app():
+    flask_app.static_folder = os.path.join(_TMP, "static")
+    create_app()
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+@pytest.fixture
+def db(app):
+    # A pooled connection rather than an app context: requests made by the
+    # test client while one is pushed would share its `g` (and logged-in user)
+    conn = get_pool().acquire()
+    yield conn
+    get_pool().release(conn)
+
+
+@pytest.fixture
+def static_folder(app):
+    return app.static_folder
+
+
+@pytest.fixture
+def make_user(app):
+    """Register a new user and return (logged-in test client, user id)."""
+    def make(prefix="user"):
+        name = f"{prefix}{next(_names)}"
+        client = app.test_client()
+        client.post("/register", data={
+            "username": name, "email": f"{name}@example.sk",
+            "password": PASSWORD, "confirm_password": PASSWORD,
+        })
+        conn = get_pool().acquire()
+        try:
+            user_id = conn.execute("SELECT id FROM users WHERE username = ?", (name,)).fetchone()[0]
+        finally:
+            get_pool().release(conn)
+        return client, user_id
+    return make
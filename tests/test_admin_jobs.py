@@ -0,0 +1,66 @@
+import time
+
+from backend import admin_jobs
+
+
+def _running_job(db, user_id, lease_until):
+    job_id = db.execute(
+        "INSERT INTO admin_jobs(kind, target_id, status, lease_until) VALUES ('delete_user', ?, 'running', ?)",
+        (user_id, lease_until),
+    ).lastrowid
+    db.commit()
+    return job_id
+
+
+def test_expired_lease_is_taken_over(db, static_folder, make_user):
+    _, user_id = make_user()
+    # Its runner died halfway: the lease ran out without being renewed
+    job_id = _running_job(db, user_id, time.time() - 1)
+
+    assert admin_jobs.run_pending(db, static_folder) >= 1
+    assert admin_jobs.get(db, job_id)["status"] == "done"
+    assert db.execute("SELECT COUNT(*) FROM users WHERE id = ?", (user_id,)).fetchone()[0] == 0
+
+
+def test_live_lease_is_left_alone(db, static_folder, make_user):
+    _, user_id = make_user()
+    job_id = _running_job(db, user_id, time.time() + admin_jobs.LEASE_SECONDS)
+    try:
+        admin_jobs.run_pending(db, static_folder)
+        assert admin_jobs.get(db, job_id)["status"] == "running"
+        assert db.execute("SELECT COUNT(*) FROM users WHERE id = ?", (user_id,)).fetchone()[0] == 1
+    finally:
+        db.execute("UPDATE admin_jobs SET status = 'error', lease_until = 0 WHERE id = ?", (job_id,))
+        db.commit()
+
+
+def test_submit_reuses_unfinished_job(db, make_user):
+    _, user_id = make_user()
+    first = admin_jobs.submit(db, "delete_user", user_id)
+    assert admin_jobs.submit(db, "delete_user", user_id)["id"] == first["id"]
+    db.execute("UPDATE admin_jobs SET status = 'error' WHERE id = ?", (first["id"],))
+    db.commit()
+
+
+def test_failed_user_delete_keeps_the_user_and_can_be_retried(db, static_folder, make_user, monkeypatch):
+    client, user_id = make_user()
+    client.post("/api/posts", json={"content": "ešte tu"})
+
+    def fail(self, where, params=()):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(admin_jobs._Job, "delete_posts", fail)
+    job = admin_jobs.submit(db, "delete_user", user_id)
+    admin_jobs.run_pending(db, static_folder)
+    assert admin_jobs.get(db, job["id"])["status"] == "error"
+    # The posts phase failed before the user row went, so nothing is orphaned
+    assert db.execute("SELECT COUNT(*) FROM users WHERE id = ?", (user_id,)).fetchone()[0] == 1
+    assert db.execute("SELECT COUNT(*) FROM posts WHERE author_id = ?", (user_id,)).fetchone()[0] == 1
+
+    monkeypatch.undo()
+    assert admin_jobs.retry(db, job["id"])["status"] == "queued"
+    admin_jobs.run_pending(db, static_folder)
+    assert admin_jobs.get(db, job["id"])["status"] == "done"
+    assert db.execute("SELECT COUNT(*) FROM users WHERE id = ?", (user_id,)).fetchone()[0] == 0
+    assert db.execute("SELECT COUNT(*) FROM posts WHERE author_id = ?", (user_id,)).fetchone()[0] == 0
+    # Only failed jobs are retried
+    assert admin_jobs.retry(db, job["id"]) is None
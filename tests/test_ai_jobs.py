@@ -0,0 +1,42 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+from backend import ai_jobs
+
+
+@pytest.fixture
+def blocked_job(monkeypatch):
+    """A job stuck on the AI pool until the returned event is set."""
+    monkeypatch.setattr(ai_jobs, "_sync_slots", threading.BoundedSemaphore(1))
+    release = threading.Event()
+    job_id, future = ai_jobs.submit(-1, "test", release.wait, 5)
+    yield job_id, future, release
+    release.set()
+    future.result(timeout=5)
+
+
+def test_request_does_not_wait_when_waiter_slots_are_taken(blocked_job):
+    job_id, future, release = blocked_job
+    ai_jobs._sync_slots.acquire()  # another request thread is already waiting
+    try:
+        started = time.monotonic()
+        with pytest.raises(FutureTimeout):
+            ai_jobs.wait(future)
+        assert time.monotonic() - started < 0.5
+    finally:
+        ai_jobs._sync_slots.release()
+    assert ai_jobs.get(job_id, -1)["status"] in ("queued", "running")
+
+
+def test_wait_is_bounded_and_then_returns_the_result(blocked_job, monkeypatch):
+    job_id, future, release = blocked_job
+    monkeypatch.setattr(ai_jobs, "SYNC_WAIT", 0.05)
+    with pytest.raises(FutureTimeout):
+        ai_jobs.wait(future)
+    release.set()
+    monkeypatch.setattr(ai_jobs, "SYNC_WAIT", 5)
+    assert ai_jobs.wait(future) is True
+    assert ai_jobs.get(job_id, -1)["status"] == "done"
@@ -0,0 +1,42 @@
+import gzip
+import os
+
+from backend import assets
+
+# Inputs a naive comment/whitespace stripper gets wrong
+JS = 'function f(s){ return /"/.test(s) }\nvar b = "x // y";\nvar c = `a /* b */ c`;\n'
+CSS = '.a::after { content: "a , b ; c"; }\n.b { background: url(/static/img/leaf.svg); }\n'
+
+
+def _build(tmp_path):
+    static = tmp_path / "static"
+    for name, text in (("js/app.js", JS), ("css/style.css", CSS), ("img/leaf.svg", "<svg/>")):
+        (static / name).parent.mkdir(parents=True, exist_ok=True)
+        (static / name).write_text(text, encoding="utf-8")
+    manifest = assets.build(str(static))
+    return static, manifest
+
+
+def _read(static, manifest, name):
+    return (static / manifest[name]).read_text(encoding="utf-8")
+
+
+def test_build_keeps_strings_and_regex_literals(tmp_path):
+    static, manifest = _build(tmp_path)
+    js = _read(static, manifest, "js/app.js")
+    assert '/"/.test(s)' in js
+    assert '"x // y"' in js
+    assert "`a /* b */ c`" in js
+    assert '"a , b ; c"' in _read(static, manifest, "css/style.css")
+
+
+def test_build_fingerprints_and_precompresses(tmp_path):
+    static, manifest = _build(tmp_path)
+    assert set(manifest) == {"js/app.js", "css/style.css", "img/leaf.svg"}
+    built = manifest["js/app.js"]
+    assert built.startswith("dist/js/app.") and built.endswith(".js")
+    with open(os.path.join(static, built + ".gz"), "rb") as fh:
+        assert gzip.decompress(fh.read()).decode("utf-8") == _read(static, manifest, "js/app.js")
+    # CSS points at the fingerprinted image
+    assert f"/static/{manifest['img/leaf.svg']}" in _read(static, manifest, "css/style.css")
+    assert assets.load_manifest(str(static)) == manifest
@@ -0,0 +1,63 @@
+from backend import follows
+
+
+def _post(db, user_id):
+    post_id = db.execute(
+        "INSERT INTO posts(author_id, author, content) VALUES (?, 'autor', 'dávka')", (user_id,)
+    ).lastrowid
+    db.commit()
+    return post_id
+
+
+def _username(db, user_id):
+    return db.execute("SELECT username FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+
+
+def test_likes_batch_is_idempotent(db, make_user):
+    client, user_id = make_user("b")
+    first, second = _post(db, user_id), _post(db, user_id)
+    ops = {"ops": [{"post_id": first}, {"post_id": second, "like": True}, {"post_id": 999999},
+                   {"post_id": first, "like": True}]}
+    expected = [
+        {"post_id": first, "liked": True, "count": 1},
+        {"post_id": second, "liked": True, "count": 1},
+        {"post_id": 999999, "error": "not_found"},
+        {"post_id": first, "liked": True, "count": 1},
+    ]
+    assert client.post("/api/likes/batch", json=ops).get_json() == {"results": expected}
+    # Replaying the batch changes nothing
+    assert client.post("/api/likes/batch", json=ops).get_json() == {"results": expected}
+
+    resp = client.post("/api/likes/batch", json={"ops": [{"post_id": first, "like": False}]})
+    assert resp.get_json()["results"] == [{"post_id": first, "liked": False, "count": 0}]
+
+
+def test_batch_rejects_malformed_ops(make_user):
+    client, _ = make_user("b")
+    assert client.post("/api/likes/batch", json={"ops": []}).status_code == 400
+    assert client.post("/api/likes/batch", json={"ops": [{"post_id": "1"}]}).status_code == 400
+    assert client.post("/api/likes/batch", json={"ops": [{"post_id": True}]}).status_code == 400
+    assert client.post("/api/follows/batch", json={"ops": [{"username": "eva", "follow": 1}]}).status_code == 400
+    assert client.post("/api/follows/batch", json={"ops": [{"username": "eva"}] * 1001}).status_code == 413
+
+
+def test_follows_batch_endpoint(db, make_user):
+    client, user_id = make_user("b")
+    _, other = make_user("b")
+    name = _username(db, other)
+    resp = client.post("/api/follows/batch", json={"ops": [{"username": name}, {"username": "nikto"}]})
+    results = resp.get_json()["results"]
+    assert results[0]["following"] is True and results[0]["followers"] == 1
+    assert results[1]["error"] == "not_found"
+    assert follows.is_following(db, user_id, other)
+
+
+def test_apply_batch_reports_each_op(db, make_user):
+    a, b, c = [make_user("b")[1] for _ in range(3)]
+    names = dict(db.execute("SELECT id, username FROM users WHERE id IN (?, ?, ?)", (a, b, c)).fetchall())
+    results = follows.apply_batch(db, a, [(names[b], True), (names[c], True), (names[b], True), ("nikto", True),
+                                          (names[a], True), (names[c], False)])
+    assert [r.get("changed", r.get("error")) for r in results] == [True, True, False, "not_found", "self", True]
+    assert follows.is_following(db, a, b) and not follows.is_following(db, a, c)
+    assert follows.counts(db, a) == (0, 1)
+    assert follows.suggestions(db, b) == [(a, 1)]
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backend.cache import Cache, SQLiteCache, TTLCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return TTLCache(maxsize=8, ttl=60, name="test")
+    return SQLiteCache("test", maxsize=8, ttl=60, path=str(tmp_path / "cache.db"))
+
+
+def test_backends_implement_the_interface():
+    with pytest.raises(TypeError):
+        Cache("abstract", 1, 1)
+
+
+def test_get_set_delete(cache):
+    assert cache.get("a") is None
+    cache.set("a", {"x": 1})
+    assert cache.get("a") == {"x": 1}
+    cache.delete("a")
+    assert cache.get("a", "missing") == "missing"
+
+
+def test_get_or_set_coalesces_concurrent_misses(cache):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return "hodnota"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set("k", loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["hodnota"] * 8
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] >= 1 and stats["hits"] + stats["misses"] + stats["coalesced"] >= 8
+
+
+def test_none_is_not_cached(cache):
+    assert cache.get_or_set("n", lambda: None) is None
+    assert cache.get_or_set("n", lambda: 5) == 5
+
+
+def test_locked_cache_file_falls_back_to_the_loader(tmp_path):
+    cache = SQLiteCache("test", path=str(tmp_path / "cache.db"))
+    cache.set("warm", 1)  # creates the schema
+    other = sqlite3.connect(str(tmp_path / "cache.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.monotonic()
+        assert cache.get_or_set("k", lambda: "z databázy") == "z databázy"
+        assert time.monotonic() - started < 2
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
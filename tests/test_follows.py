@@ -0,0 +1,58 @@
+import os
+import sqlite3
+
+from backend import follows
+
+
+def _users(make_user, n):
+    return [make_user("f")[1] for _ in range(n)]
+
+
+def _raw_follow(follower_id, followed_id):
+    """A follow written by another process, bypassing this one's graph."""
+    conn = sqlite3.connect(os.environ["GARDENCIRCLE_DB"])
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("INSERT INTO follows(follower_id, followed_id) VALUES (?, ?)", (follower_id, followed_id))
+    conn.commit()
+    conn.close()
+
+
+def test_counters_follow_writes(db, make_user):
+    a, b = _users(make_user, 2)
+    assert follows.set_following(db, a, b, True) == (1, 0)
+    assert follows.set_following(db, a, b, True) == (1, 0)  # repeating is a no-op
+    assert follows.counts(db, a) == (0, 1)
+    _raw_follow(b, a)
+    assert follows.counts(db, a) == (1, 1)
+    assert follows.set_following(db, a, b, False) == (0, 1)
+    assert follows.repair_follow_counters(db) == 0
+
+
+def test_graph_is_patched_by_own_writes_and_reloaded_after_others(db, make_user):
+    a, b, c, d = _users(make_user, 4)
+    follows.set_following(db, a, b, True)
+    follows.set_following(db, b, c, True)
+    assert follows.suggestions(db, a) == [(c, 1)]
+    loads = follows.stats()["loads"]
+
+    # Our own write patches the loaded graph in place
+    follows.set_following(db, a, c, True)
+    assert follows.suggestions(db, a) == []
+    assert follows.stats()["loads"] == loads
+
+    # Another process's write makes the next read reload it
+    _raw_follow(d, c)
+    assert follows.mutual_follows(db, a, c) == [b]
+    assert follows.stats()["loads"] == loads + 1
+    # Followers not followed back are suggested too
+    assert follows.suggestions(db, c) == [(a, 1), (b, 1), (d, 1)]
+
+
+def test_is_following_is_a_lookup_not_a_graph_load(db, make_user):
+    a, b = _users(make_user, 2)
+    loads = follows.stats()["loads"]
+    _raw_follow(a, b)
+    assert follows.is_following(db, a, b)
+    assert not follows.is_following(db, b, a)
+    assert follows.stats()["loads"] == loads
+
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import time
+import uuid
+
+from backend import image_pipeline, upload_store
+
+
+def _file(static, relative_path, age=3600):
+    full = static / relative_path
+    full.parent.mkdir(parents=True, exist_ok=True)
+    full.write_bytes(b"x" * 10)
+    past = time.time() - age
+    os.utime(full, (past, past))
+    return relative_path
+
+
+def _cas():
+    return upload_store.cas_path(uuid.uuid4().hex * 2, "png")
+
+
+def test_gc_removes_only_unreferenced_files(db, tmp_path, make_user):
+    static = tmp_path / "static"
+    _, user_id = make_user()
+    posted = _file(static, _cas())
+    in_article = _file(static, _cas())
+    as_article_image = _file(static, f"uploads/{uuid.uuid4().hex}_legacy.jpg")
+    orphan = _file(static, _cas())
+    young = _file(static, _cas(), age=0)
+    temp = _file(static, f"uploads/.incoming-{uuid.uuid4().hex}")
+    orphan_variant = _file(static, image_pipeline.variant_path(orphan, "thumb"))
+    kept_variant = _file(static, image_pipeline.variant_path(posted, "thumb"))
+
+    db.execute("INSERT INTO posts(author_id, author, content, image_path) VALUES (?, 'a', 'b', ?)", (user_id, posted))
+    # What /admin/upload hands out is a URL; admins paste it into articles
+    db.execute(
+        "INSERT INTO articles(title, content, image_path) VALUES ('t', ?, ?)",
+        (f'<img src="/static/{in_article}"> text', f"/static/{as_article_image}"),
+    )
+    db.commit()
+
+    report = upload_store.gc_uploads(db, str(static), grace=60)
+
+    for path in (posted, in_article, as_article_image, young, kept_variant):
+        assert (static / path).exists(), path
+    for path in (orphan, temp, orphan_variant):
+        assert not (static / path).exists(), path
+    assert report["removed"] == 2 and report["temp_removed"] == 1 and report["young"] == 1
+    # Shard folders of the removed orphan are gone too
+    assert not (static / os.path.dirname(orphan)).exists()
+
+
+def test_gc_dry_run_changes_nothing(db, tmp_path):
+    static = tmp_path / "static"
+    orphan = _file(static, _cas())
+    report = upload_store.gc_uploads(db, str(static), grace=60, dry_run=True)
+    assert report["removed"] == 1
+    assert (static / orphan).exists()
+
+
+def test_gc_does_not_hold_the_write_lock_while_sweeping(db, tmp_path):
+    static = tmp_path / "static"
+    paths = [_file(static, _cas()) for _ in range(3)]
+    for path in paths:
+        db.execute("INSERT INTO upload_blobs(path, refcount) VALUES (?, 0)", (path,))
+    db.commit()
+    other = sqlite3.connect(os.environ["GARDENCIRCLE_DB"], timeout=0, isolation_level=None)
+    locked = []
+
+    def echo(line):
+        # Runs between file removals: another writer must get in
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            other.execute("ROLLBACK")
+        except sqlite3.OperationalError as e:
+            locked.append(str(e))
+
+    upload_store.gc_uploads(db, str(static), grace=60, echo=echo)
+    other.close()
+    assert locked == []
+    assert db.execute(
+        "SELECT COUNT(*) FROM upload_blobs WHERE path IN (?, ?, ?)", paths
+    ).fetchone()[0] == 0
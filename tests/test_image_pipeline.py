@@ -0,0 +1,47 @@
+import json
+import os
+
+from backend import image_pipeline
+
+
+def _url(filename):
+    return f"/static/{filename}"
+
+
+def _write_manifest(static_folder, rel):
+    sidecar = os.path.join(static_folder, image_pipeline.manifest_path(rel))
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    manifest = {
+        "full": {"path": image_pipeline.variant_path(rel, "full"), "width": 1600},
+        "thumb": {"path": image_pipeline.variant_path(rel, "thumb"), "width": 320},
+    }
+    with open(sidecar, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+
+
+def test_srcset_misses_are_cached_until_variants_exist(static_folder, monkeypatch):
+    rel = "uploads/srcset_test.jpg"
+    reads = []
+    read = image_pipeline._read_srcset
+    monkeypatch.setattr(image_pipeline, "_read_srcset", lambda *a: reads.append(a) or read(*a))
+
+    # Rendering a page full of images without variants reads each sidecar once
+    for _ in range(5):
+        assert image_pipeline.srcset_for(static_folder, rel, _url) == ""
+    assert len(reads) == 1
+
+    # Generating variants drops the cached miss
+    _write_manifest(static_folder, rel)
+    image_pipeline.forget(rel)
+    expected = "/static/uploads/variants/srcset_test_thumb.webp 320w, /static/uploads/variants/srcset_test_full.webp 1600w"
+    for _ in range(3):
+        assert image_pipeline.srcset_for(static_folder, rel, _url) == expected
+    assert len(reads) == 2
+
+    image_pipeline.remove_variants(static_folder, rel)
+    assert image_pipeline.srcset_for(static_folder, rel, _url) == ""
+
+
+def test_external_images_have_no_srcset(static_folder):
+    assert image_pipeline.srcset_for(static_folder, "https://example.sk/a.jpg", _url) == ""
+    assert image_pipeline.srcset_for(static_folder, None, _url) == ""
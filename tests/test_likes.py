@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import Future
+
+from backend import likes
+
+
+def _post(db, user_id):
+    post_id = db.execute(
+        "INSERT INTO posts(author_id, author, content) VALUES (?, 'autor', 'na lajky')", (user_id,)
+    ).lastrowid
+    db.commit()
+    return post_id
+
+
+def _like_count(db, post_id):
+    return db.execute("SELECT like_count FROM posts WHERE id = ?", (post_id,)).fetchone()[0]
+
+
+def test_toggle_flips_and_counts(db, make_user):
+    client, user_id = make_user("l")
+    post_id = _post(db, user_id)
+    assert client.post(f"/like/{post_id}").get_json() == {"liked": True, "count": 1}
+    assert client.post(f"/like/{post_id}").get_json() == {"liked": False, "count": 0}
+    assert client.post("/like/999999").status_code == 404
+    assert _like_count(db, post_id) == 0
+
+
+def test_group_commit_applies_concurrent_toggles_together(db, make_user, monkeypatch):
+    monkeypatch.setattr(likes, "GROUP_COMMIT", True)
+    monkeypatch.setattr(likes, "BATCH_MS", 50)
+    _, author = make_user("l")
+    post_id = _post(db, author)
+    users = [make_user("l")[1] for _ in range(12)]
+    batches_before = likes._get_writer().stats["batches"]
+
+    results = {}
+    start = threading.Barrier(len(users))
+
+    def like(user_id):
+        start.wait()
+        results[user_id] = likes.toggle(None, user_id, post_id)
+
+    threads = [threading.Thread(target=like, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(liked for liked, _ in results.values())
+    # Counts are read inside the batch, so together they are 1..N
+    assert sorted(count for _, count in results.values()) == list(range(1, len(users) + 1))
+    assert _like_count(db, post_id) == len(users)
+    assert likes._get_writer().stats["batches"] - batches_before < len(users)
+    # A missing post in the batch does not fail the others
+    assert likes.toggle(None, users[0], 999999) is None
+    assert likes.toggle(None, users[0], post_id) == (False, len(users) - 1)
+
+
+def test_failed_batch_falls_back_to_single_toggles(db, make_user, monkeypatch):
+    _, user_id = make_user("l")
+    post_id = _post(db, user_id)
+    writer = likes._GroupWriter.__new__(likes._GroupWriter)
+    writer.stats = {"batches": 0, "toggles": 0, "largest_batch": 0}
+    apply = likes._apply
+    calls = []
+
+    def flaky(conn, uid, pid):
+        calls.append(pid)
+        if len(calls) == 1:
+            raise RuntimeError("disk I/O error")
+        return apply(conn, uid, pid)
+
+    monkeypatch.setattr(likes, "_apply", flaky)
+    batch = [(user_id, post_id, Future()), (user_id, 999999, Future())]
+    writer._commit(db, batch)
+    assert batch[0][2].result() == (True, 1)
+    assert batch[1][2].result() is None
+    assert writer.stats["batches"] == 0
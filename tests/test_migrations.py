@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from backend import search
+from backend.database import ConnectionPool
+from backend.migrations import LATEST_VERSION, MIGRATIONS, apply_pending, current_version
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(__file__), "baseline_schema.sql")
+
+
+@pytest.fixture
+def connect(tmp_path):
+    """Open pooled-style connections (same PRAGMAs as the app) to files under tmp_path."""
+    pools = []
+
+    def connect(name):
+        pool = ConnectionPool(str(tmp_path / name))
+        pools.append(pool)
+        return pool.acquire()
+
+    yield connect
+    for pool in pools:
+        pool.close_all()
+
+
+def _schema(db):
+    """{table: set of columns} plus the names of every index and trigger."""
+    tables = [r[0] for r in db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()]
+    columns = {t: {r[1] for r in db.execute(f"PRAGMA table_info('{t}')").fetchall()} for t in tables}
+    others = {tuple(r) for r in db.execute(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()}
+    return columns, others
+
+
+def _matches(db, term):
+    return db.execute("SELECT COUNT(*) FROM posts_fts WHERE posts_fts MATCH ?", (term,)).fetchone()[0]
+
+
+def _assert_consistent(db):
+    # Not integrity_check: SQLite 3.40 reports false NOT NULL errors for
+    # WITHOUT ROWID tables such as timeline_entries
+    assert db.execute("PRAGMA foreign_key_check").fetchall() == []
+
+
+def test_fresh_database_reaches_latest_version(connect):
+    db = connect("fresh.db")
+    assert current_version(db) == 0
+    assert apply_pending(db) == [version for version, _, _ in MIGRATIONS]
+    assert current_version(db) == LATEST_VERSION
+    # Up to date: nothing to apply, nothing written
+    assert apply_pending(db) == []
+    _assert_consistent(db)
+
+
+def test_baseline_database_migrates_to_fresh_schema(connect):
+    db = connect("baseline.db")
+    with open(BASELINE_SCHEMA) as f:
+        db.executescript(f.read())
+    alice = db.execute(
+        "INSERT INTO users(username, email, password_hash, profile_image) VALUES ('alice', 'a@x.sk', 'x', ?)",
+        ("uploads/0517f633deeb_images_2.jpg",),
+    ).lastrowid
+    bob = db.execute("INSERT INTO users(username, email, password_hash) VALUES ('bob', 'b@x.sk', 'x')").lastrowid
+    post = db.execute(
+        "INSERT INTO posts(author_id, author, content, image_path) VALUES (?, 'alice', 'ahoj', ?)",
+        (alice, "uploads/0517f633deeb_images_2.jpg"),
+    ).lastrowid
+    db.execute("INSERT INTO likes(user_id, post_id) VALUES (?, ?)", (bob, post))
+    db.execute("INSERT INTO comments(post_id, author_id, author, text) VALUES (?, ?, 'bob', 'pekné')", (post, bob))
+    db.execute("INSERT INTO follows(follower_id, followed_id) VALUES (?, ?)", (bob, alice))
+    db.commit()
+
+    assert apply_pending(db) == [version for version, _, _ in MIGRATIONS]
+    assert current_version(db) == LATEST_VERSION
+    _assert_consistent(db)
+
+    # Backfilled from the existing rows
+    assert tuple(db.execute("SELECT like_count, comment_count FROM posts WHERE id = ?", (post,)).fetchone()) == (1, 1)
+    assert tuple(db.execute("SELECT follower_count FROM users WHERE id = ?", (alice,)).fetchone()) == (1,)
+    assert tuple(db.execute("SELECT following_count FROM users WHERE id = ?", (bob,)).fetchone()) == (1,)
+    assert db.execute(
+        "SELECT refcount FROM upload_blobs WHERE path = 'uploads/0517f633deeb_images_2.jpg'"
+    ).fetchone()[0] == 2
+    assert db.execute(
+        "SELECT COUNT(*) FROM timeline_entries WHERE user_id = ? AND post_id = ?", (bob, post)
+    ).fetchone()[0] == 1
+
+    # Rows that predate the search index are left to backfill(); until then
+    # the sync triggers must not touch them
+    db.execute("UPDATE posts SET content = 'ahoj záhrada' WHERE id = ?", (post,))
+    db.commit()
+    assert _matches(db, "ahoj") == 0
+    search.backfill(db)
+    assert _matches(db, "zahrada") == 1
+    db.execute("INSERT INTO posts_fts(posts_fts) VALUES ('integrity-check')")
+
+    fresh = connect("fresh.db")
+    apply_pending(fresh)
+    migrated_columns, migrated_others = _schema(db)
+    fresh_columns, fresh_others = _schema(fresh)
+    assert migrated_columns == fresh_columns
+    assert fresh_others <= migrated_others
+
+
+def test_concurrent_boot_applies_migrations_once(connect):
+    first = connect("shared.db")
+    second = connect("shared.db")
+    assert apply_pending(first)
+    assert apply_pending(second) == []
+    assert first.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(MIGRATIONS)
@@ -0,0 +1,82 @@
+from urllib.parse import parse_qs, urlparse
+
+from backend.feed import fetch_feed_page
+
+# Many posts share a timestamp (created_at has one-second resolution), so
+# pages must be keyed on (created_at, id), not created_at alone.
+TIMESTAMPS = ["2026-01-01 10:00:00"] * 9 + ["2026-01-01 09:00:00"] * 8 + ["2026-01-01 08:00:00"] * 6
+
+
+def _insert_posts(db, user_id, username):
+    ids = []
+    for n, created_at in enumerate(TIMESTAMPS):
+        post_id = db.execute(
+            "INSERT INTO posts(author_id, author, content, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, username, f"príspevok {n}", created_at),
+        ).lastrowid
+        ids.append(post_id)
+    db.commit()
+    return ids
+
+
+def _all_post_ids(db):
+    return [r[0] for r in db.execute("SELECT id FROM posts ORDER BY created_at DESC, id DESC").fetchall()]
+
+
+def _walk(fetch_page):
+    """Follow next cursors to the end; returns the ids in page order."""
+    seen, cursor = [], None
+    while True:
+        posts, cursor = fetch_page(cursor)
+        seen.extend(p["id"] for p in posts)
+        if not cursor:
+            return seen
+
+
+def test_feed_pages_neither_skip_nor_repeat(db, make_user):
+    _, user_id = make_user()
+    _insert_posts(db, user_id, "autor")
+    expected = _all_post_ids(db)
+    for limit in (1, 4, 9, len(expected)):
+        assert _walk(lambda cursor: fetch_feed_page(db, user_id, cursor, limit=limit)) == expected
+
+
+def test_api_posts_pages_neither_skip_nor_repeat(db, make_user):
+    client, user_id = make_user()
+    _insert_posts(db, user_id, "autor")
+    expected = _all_post_ids(db)
+
+    def paged(cursor):
+        query = {"paged": "1", "limit": "5"}
+        if cursor:
+            query["cursor"] = cursor
+        body = client.get("/api/posts", query_string=query).get_json()
+        return body["posts"], body["next_cursor"]
+
+    assert _walk(paged) == expected
+
+    # Default shape stays a bare list; the next page is linked in the headers
+    seen, url = [], "/api/posts?limit=5"
+    while url:
+        resp = client.get(url)
+        assert isinstance(resp.get_json(), list)
+        seen.extend(p["id"] for p in resp.get_json())
+        link = resp.headers.get("Link")
+        if link:
+            url = link[1:link.index(">")]
+            assert parse_qs(urlparse(url).query)["cursor"] == [resp.headers["X-Next-Cursor"]]
+        else:
+            url = None
+    assert seen == expected
+
+
+def test_new_posts_do_not_shift_later_pages(db, make_user):
+    _, user_id = make_user()
+    _insert_posts(db, user_id, "autor")
+    expected = _all_post_ids(db)
+    first, cursor = fetch_feed_page(db, user_id, None, limit=7)
+    # A post arriving between page loads would push an OFFSET-based page back by one
+    db.execute("INSERT INTO posts(author_id, author, content) VALUES (?, 'autor', 'nový')", (user_id,))
+    db.commit()
+    rest = _walk(lambda c: fetch_feed_page(db, user_id, c or cursor, limit=7))
+    assert [p["id"] for p in first] + rest == expected
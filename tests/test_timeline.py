@@ -0,0 +1,73 @@
+import pytest
+
+from backend import follows, timeline
+
+# Authors post in bursts sharing a timestamp; pages must be keyed on (created_at, post id)
+TIMESTAMPS = ["2026-01-01 10:00:00"] * 9 + ["2026-01-01 09:00:00"] * 8 + ["2026-01-01 08:00:00"] * 6
+
+
+def _publish(db, author_id, username):
+    ids = []
+    for n, created_at in enumerate(TIMESTAMPS):
+        post_id = db.execute(
+            "INSERT INTO posts(author_id, author, content, created_at) VALUES (?, ?, ?, ?)",
+            (author_id, username, f"príspevok {n}", created_at),
+        ).lastrowid
+        timeline.fan_out_post(db, post_id, author_id)
+        ids.append(post_id)
+    db.commit()
+    return ids
+
+
+def _walk(db, user_id, limit):
+    seen, cursor = [], None
+    while True:
+        posts, cursor = timeline.timeline_page(db, user_id, cursor, limit=limit)
+        seen.extend(p["id"] for p in posts)
+        if not cursor:
+            return seen
+
+
+def test_timeline_pages_merge_pushed_and_pulled_posts(db, make_user):
+    _, reader_id = make_user("reader")
+    _, pushed_id = make_user("pushed")
+    _, pulled_id = make_user("pulled")
+    follows.set_following(db, reader_id, pushed_id, True)
+    follows.set_following(db, reader_id, pulled_id, True)
+    # A popular author: their posts are merged in at read time instead of fanned out
+    db.execute("INSERT OR IGNORE INTO timeline_pull_authors(author_id) VALUES (?)", (pulled_id,))
+    db.commit()
+    ids = _publish(db, pushed_id, "pushed") + _publish(db, pulled_id, "pulled")
+    expected = [r[0] for r in db.execute(
+        "SELECT id FROM posts WHERE id IN (SELECT value FROM json_each(?)) ORDER BY created_at DESC, id DESC",
+        (str(ids),),
+    ).fetchall()]
+    for limit in (1, 5, 8):
+        assert _walk(db, reader_id, limit) == expected
+
+
+def _entries(db, user_id):
+    return [r[0] for r in db.execute(
+        "SELECT post_id FROM timeline_entries WHERE user_id = ? ORDER BY created_at DESC, post_id DESC", (user_id,)
+    ).fetchall()]
+
+
+def test_prune_keeps_the_newest_entries(app, db, make_user):
+    _, reader_id = make_user("reader")
+    _, author_id = make_user("author")
+    follows.set_following(db, reader_id, author_id, True)
+    _publish(db, author_id, "author")
+    newest = _entries(db, reader_id)
+
+    assert timeline.prune_user(db, reader_id, keep=10) == len(TIMESTAMPS) - 10
+    db.commit()
+    assert _entries(db, reader_id) == newest[:10]
+    assert timeline.prune_user(db, reader_id, keep=1) == 9
+    db.commit()
+    assert _entries(db, reader_id) == newest[:1]
+
+    with pytest.raises(ValueError):
+        timeline.prune_user(db, reader_id, keep=0)
+    result = app.test_cli_runner().invoke(args=["prune-timelines", "--keep", "0"])
+    assert result.exit_code != 0
+    assert _entries(db, reader_id) == newest[:1]
@@ -0,0 +1,133 @@
+import io
+import os
+import time
+import uuid
+
+from backend import admin_jobs, upload_store
+
+
+def _png():
+    # Unique bytes per call: uploads are content-addressed
+    return b"\x89PNG\r\n\x1a\n" + uuid.uuid4().bytes * 8
+
+
+def _post_image(client, data):
+    resp = client.post(
+        "/api/posts",
+        data={"content": "s obrázkom", "file": (io.BytesIO(data), "a.png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code in (201, 302)
+
+
+def _refcount(db, path):
+    row = db.execute("SELECT refcount FROM upload_blobs WHERE path = ?", (path,)).fetchone()
+    return row[0] if row else None
+
+
+def _age(static_folder, path):
+    """Backdate a file past the collect() grace period."""
+    past = time.time() - 3600
+    os.utime(os.path.join(static_folder, path), (past, past))
+
+
+def _assert_refcounts_exact(db):
+    counted = dict(db.execute(
+        f"SELECT path, COUNT(*) FROM ({upload_store._referenced_paths_sql()}) GROUP BY path"
+    ).fetchall())
+    stored = dict(db.execute("SELECT path, refcount FROM upload_blobs WHERE refcount > 0").fetchall())
+    assert stored == counted
+
+
+def test_post_delete_releases_and_collects_image(db, static_folder, make_user):
+    client, user_id = make_user()
+    data = _png()
+    _post_image(client, data)
+    _post_image(client, data)
+    rows = db.execute("SELECT id, image_path FROM posts WHERE author_id = ? ORDER BY id", (user_id,)).fetchall()
+    (first_id, path), (second_id, same_path) = rows
+    assert path == same_path and path.startswith("uploads/")
+    assert _refcount(db, path) == 2
+    _age(static_folder, path)
+
+    assert client.delete(f"/api/posts/{first_id}").status_code == 204
+    assert _refcount(db, path) == 1
+    assert os.path.exists(os.path.join(static_folder, path))
+
+    assert client.delete(f"/api/posts/{second_id}").status_code == 204
+    assert _refcount(db, path) is None
+    assert not os.path.exists(os.path.join(static_folder, path))
+    _assert_refcounts_exact(db)
+
+
+def test_post_image_update_releases_old_path(db, static_folder, make_user):
+    client, user_id = make_user()
+    _post_image(client, _png())
+    post_id, path = db.execute("SELECT id, image_path FROM posts WHERE author_id = ?", (user_id,)).fetchone()
+    _age(static_folder, path)
+
+    db.execute("UPDATE posts SET image_path = NULL WHERE id = ?", (post_id,))
+    db.commit()
+    assert _refcount(db, path) == 0
+    assert upload_store.collect(db, static_folder) >= 1
+    assert _refcount(db, path) is None
+    assert not os.path.exists(os.path.join(static_folder, path))
+    _assert_refcounts_exact(db)
+
+
+def test_profile_image_change_collects_previous_file(db, static_folder, make_user):
+    client, user_id = make_user()
+
+    def upload_profile_image(data):
+        resp = client.post(
+            "/edit-profile",
+            data={"bio": "", "profile_image_file": (io.BytesIO(data), "me.png")},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 302
+        return db.execute("SELECT profile_image FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+
+    old_path = upload_profile_image(_png())
+    assert _refcount(db, old_path) == 1
+    _age(static_folder, old_path)
+
+    new_path = upload_profile_image(_png())
+    assert new_path != old_path
+    assert _refcount(db, old_path) is None
+    assert not os.path.exists(os.path.join(static_folder, old_path))
+    assert _refcount(db, new_path) == 1
+    assert os.path.exists(os.path.join(static_folder, new_path))
+    _assert_refcounts_exact(db)
+
+
+def test_deleting_user_collects_their_uploads(db, static_folder, make_user):
+    client, user_id = make_user()
+    _post_image(client, _png())
+    path = db.execute("SELECT image_path FROM posts WHERE author_id = ?", (user_id,)).fetchone()[0]
+    _age(static_folder, path)
+
+    job = admin_jobs.submit(db, "delete_user", user_id)
+    admin_jobs.run_pending(db, static_folder)
+    job = admin_jobs.get(db, job["id"])
+    assert job["status"] == "done", job
+    assert db.execute("SELECT COUNT(*) FROM posts WHERE author_id = ?", (user_id,)).fetchone()[0] == 0
+    assert _refcount(db, path) is None
+    assert not os.path.exists(os.path.join(static_folder, path))
+    _assert_refcounts_exact(db)
+
+
+def test_collect_keeps_recent_uploads(db, static_folder, make_user):
+    client, user_id = make_user()
+    _post_image(client, _png())
+    post_id, path = db.execute("SELECT id, image_path FROM posts WHERE author_id = ?", (user_id,)).fetchone()
+    db.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+    db.commit()
+
+    # Just uploaded: another request may still be about to reference it
+    upload_store.collect(db, static_folder)
+    assert _refcount(db, path) == 0
+    assert os.path.exists(os.path.join(static_folder, path))
+
+    assert upload_store.collect(db, static_folder, grace=0) >= 1
+    assert _refcount(db, path) is None
+    assert not os.path.exists(os.path.join(static_folder, path))